@@ -1,624 +1,832 @@
-import streamlit as st
-import pandas as pd
-import itertools
-import altair as alt
-from datetime import datetime
-
-# 1. 頁面設定
-st.set_page_config(page_title="車輛軌跡分析系統", layout="wide")
-
-# 2. CSS 強制修正 (深色極簡 / 強制單行排版 / 戰情風格)
-st.markdown("""
-<style>
-    /* === 全域配色鎖定 (強制深色模式) === */
-    :root { color-scheme: dark; }
-    
-    .stApp, [data-testid="stAppViewContainer"], [data-testid="stHeader"] {
-        background-color: #0E1117 !important;
-        color: #FAFAFA !important;
-    }
-    
-    [data-testid="stSidebar"] { background-color: #262730 !important; }
-
-    /* 強制所有文字顏色 */
-    p, div, span, label, h1, h2, h3, h4, h5, h6, li { color: #E0E0E0 !important; }
-
-    html, body, [class*="css"] {
-        font-family: "Microsoft JhengHei", "Segoe UI", Roboto, sans-serif !important;
-    }
-
-    /* === 手機下拉選單強力修復 === */
-    div[data-baseweb="select"] > div, div[data-baseweb="base-input"] {
-        background-color: #262730 !important;
-        color: #FAFAFA !important;
-        border-color: #444 !important;
-    }
-    div[data-baseweb="popover"], div[data-baseweb="menu"], ul[role="listbox"] {
-        background-color: #262730 !important;
-        border: 1px solid #444 !important;
-    }
-    div[data-baseweb="menu"] li, div[data-baseweb="menu"] div {
-        color: #FAFAFA !important;
-        background-color: #262730 !important;
-    }
-    div[data-baseweb="menu"] li:hover, div[data-baseweb="menu"] li[aria-selected="true"] {
-        background-color: #4DA6FF !important;
-        color: #FFFFFF !important;
-    }
-    div[data-baseweb="tag"] {
-        background-color: #4DA6FF !important;
-        color: white !important;
-    }
-
-    /* === 表格樣式 === */
-    .table-container {
-        width: 100%;
-        overflow-x: auto; 
-        -webkit-overflow-scrolling: touch;
-        margin-bottom: 1rem;
-        background-color: #1E1E1E;
-        border: 1px solid #333;
-        border-radius: 4px;
-    }
-    .custom-table {
-        width: 100%;
-        border-collapse: collapse;
-        background-color: #1E1E1E !important; 
-        min-width: 600px; 
-    }
-    .custom-table th {
-        background-color: #000000 !important;
-        color: #4DA6FF !important;
-        font-weight: 600;
-        text-transform: uppercase;
-        padding: 10px 8px;
-        border-bottom: 2px solid #4DA6FF;
-        border-right: 1px solid #333;
-        white-space: nowrap; 
-        text-align: left;
-        font-size: 14px;
-    }
-    .custom-table td {
-        background-color: #1E1E1E !important;
-        color: #E0E0E0 !important; 
-        padding: 8px 8px;
-        border: 1px solid #333;
-        white-space: nowrap; 
-        vertical-align: middle;
-        font-size: 14px;
-    }
-
-    /* === 狀態標籤 === */
-    .status-red {
-        background-color: #3A0000 !important;
-        color: #FF4D4D !important;
-        font-weight: bold;
-        border: 1px solid #FF4D4D;
-        padding: 2px 6px;
-        border-radius: 4px;
-        white-space: nowrap;
-    }
-    .status-green {
-        background-color: #0d330e !important;
-        color: #4CAF50 !important;
-        font-weight: bold;
-        border: 1px solid #4CAF50;
-        padding: 2px 6px;
-        border-radius: 4px;
-        white-space: nowrap;
-    }
-    /* 機率標籤 */
-    .prob-high { color: #4DA6FF; font-weight: bold; font-size: 16px; }
-    .prob-mid { color: #A0CFFF; }
-    .prob-low { color: #666; }
-    
-    /* === 時間強調樣式 === */
-    .time-highlight {
-        color: #4DA6FF !important;
-        font-weight: bold;
-        font-size: 18px;
-        margin-bottom: 10px;
-        display: block;
-    }
-    
-    .streamlit-expanderHeader {
-        background-color: #262730 !important;
-        color: #FAFAFA !important;
-        border: 1px solid #444 !important;
-        font-weight: 600 !important;
-    }
-    
-    [data-testid="stChart"] { filter: none !important; }
-    
-    /* 時鐘樣式 */
-    #clock { 
-        font-family: "Microsoft JhengHei", sans-serif; 
-        font-size: 15px; 
-        color: #AAAAAA; 
-        font-weight: 600;
-    }
-</style>
-""", unsafe_allow_html=True)
-
-st.title("車輛軌跡分析系統")
-
-# --- JS 強制即時時鐘 ---
-st.components.v1.html("""
-<style>body { background-color: #0E1117; margin: 0; padding: 0; } #clock { font-family: "Microsoft JhengHei", sans-serif; font-size: 15px; color: #AAAAAA; font-weight: 600; }</style>
-<div id="clock">載入時間中...</div>
-<script>
-    function updateTime() {
-        const now = new Date();
-        const year = now.getFullYear();
-        const month = String(now.getMonth() + 1).padStart(2, '0');
-        const day = String(now.getDate()).padStart(2, '0');
-        const hours = String(now.getHours()).padStart(2, '0');
-        const minutes = String(now.getMinutes()).padStart(2, '0');
-        const seconds = String(now.getSeconds()).padStart(2, '0');
-        const timeString = `系統時間：${year}-${month}-${day} ${hours}:${minutes}:${seconds}`;
-        document.getElementById('clock').innerText = timeString;
-    }
-    setInterval(updateTime, 1000);
-    updateTime();
-</script>
-""", height=30)
-
-# --- 側邊欄：多檔案上傳 ---
-st.sidebar.header("資料匯入")
-uploaded_files = st.sidebar.file_uploader(
-    "請上傳 Excel 或 CSV 檔案 (支援多選)", 
-    type=["xlsx", "csv"], 
-    accept_multiple_files=True
-)
-
-if uploaded_files:
-    # --------------------------
-    # 資料讀取與合併處理
-    # --------------------------
-    all_data_frames = []
-    
-    try:
-        for file in uploaded_files:
-            if file.name.endswith('.csv'):
-                try:
-                    temp_df = pd.read_csv(file, encoding='utf-8', dtype=str)
-                except UnicodeDecodeError:
-                    temp_df = pd.read_csv(file, encoding='big5', dtype=str)
-            else:
-                temp_df = pd.read_excel(file, dtype=str)
-            
-            all_data_frames.append(temp_df)
-            
-        if not all_data_frames:
-            st.error("未讀取到有效資料")
-            st.stop()
-            
-        df = pd.concat(all_data_frames, ignore_index=True)
-        
-    except Exception as e:
-        st.error(f"檔案讀取失敗: {e}")
-        st.stop()
-
-    # === 欄位標準化 ===
-    df.columns = df.columns.str.strip()
-    rename_map = {
-        '車號': '車牌', '路口': '地點', '監視器': '地點',
-        'location': '地點', 'plate': '車牌', 'date': '日期', 'time': '時間'
-    }
-    df.rename(columns=rename_map, inplace=True)
-    df = df.loc[:, ~df.columns.duplicated()]
-
-    required_cols = ['車牌', '地點', '日期', '時間']
-    if not set(required_cols).issubset(df.columns):
-        st.error(f"資料格式錯誤，缺少欄位: {required_cols}。")
-        st.stop()
-
-    try:
-        df['車牌'] = df['車牌'].str.strip()
-        df['地點'] = df['地點'].str.strip()
-        
-        df['temp_date'] = pd.to_datetime(df['日期'])
-        df['日期'] = df['temp_date'].dt.strftime('%Y-%m-%d')
-        df['完整時間'] = pd.to_datetime(df['日期'] + ' ' + df['時間'].astype(str))
-        
-        # 去重
-        original_count = len(df)
-        df.drop_duplicates(subset=['車牌', '地點', '完整時間'], keep='first', inplace=True)
-        final_count = len(df)
-        removed_count = original_count - final_count
-        
-        if removed_count > 0:
-            st.sidebar.warning(f"已自動過濾 {removed_count} 筆重複資料")
-        st.sidebar.info(f"有效資料：{final_count} 筆")
-
-        df = df.sort_values(by=['車牌', '完整時間'])
-        
-        # 計算相關欄位
-        df['下筆時間'] = df.groupby('車牌')['完整時間'].shift(-1)
-        df['下筆地點'] = df.groupby('車牌')['地點'].shift(-1)
-        df['停留秒數'] = (df['下筆時間'] - df['完整時間']).dt.total_seconds()
-        
-        # 行程識別 (Trip Identification)
-        df['前站停留'] = df.groupby('車牌')['停留秒數'].shift(1).fillna(0)
-        time_gap = df.groupby('車牌')['完整時間'].diff().dt.total_seconds().fillna(0)
-        df['新行程'] = (df['車牌'] != df['車牌'].shift(1)) | \
-                       (df['前站停留'] >= 1800) | \
-                       (time_gap > 14400) 
-        df['行程ID'] = df['新行程'].cumsum()
-        
-        # 週次資訊
-        df['WeekDay'] = df['完整時間'].dt.day_name()
-        week_map = {
-            'Monday': '週一', 'Tuesday': '週二', 'Wednesday': '週三',
-            'Thursday': '週四', 'Friday': '週五', 'Saturday': '週六', 'Sunday': '週日'
-        }
-        df['週次'] = df['WeekDay'].map(week_map)
-        
-    except Exception as e:
-        st.error(f"資料處理錯誤: {e}")
-        st.stop()
-
-    # --------------------------
-    # 繪圖函式
-    # --------------------------
-    def render_regularity_chart(data, color_hex="#4DA6FF"):
-        chart_data = data.copy()
-        chart_data['Hour'] = chart_data['完整時間'].dt.hour
-        hourly_stats = chart_data.groupby('Hour')['日期'].nunique().reset_index(name='DaysCount')
-        full_hours = pd.DataFrame({'Hour': range(24)})
-        final_data = pd.merge(full_hours, hourly_stats, on='Hour', how='left').fillna(0)
-        
-        chart = alt.Chart(final_data).mark_bar(color=color_hex).encode(
-            x=alt.X('Hour:O', title='時段 (0-23)', scale=alt.Scale(domain=list(range(24)))), 
-            y=alt.Y('DaysCount:Q', title='出現天數', axis=alt.Axis(tickMinStep=1, format='d')),
-            tooltip=[alt.Tooltip('Hour', title='時段'), alt.Tooltip('DaysCount', title='累計天數')]
-        ).properties(height=180, background='#1E1E1E').configure_axis(
-            labelFontSize=11, titleFontSize=13, grid=True, 
-            gridColor='#444', labelColor='#E0E0E0', titleColor='#E0E0E0'
-        ).configure_view(strokeWidth=0).interactive()
-        st.altair_chart(chart, use_container_width=True)
-
-    # 修改：週次分析長條圖 (高度調整為 160px，確保比例適中)
-    def render_weekly_bar_chart(data, color_hex="#4DA6FF"):
-        chart_data = data.copy()
-        weekly_counts = chart_data['週次'].value_counts().reset_index()
-        weekly_counts.columns = ['週次', '次數']
-        week_order = ['週一', '週二', '週三', '週四', '週五', '週六', '週日']
-        all_week = pd.DataFrame({'週次': week_order})
-        final_df = pd.merge(all_week, weekly_counts, on='週次', how='left').fillna(0)
-        
-        chart = alt.Chart(final_df).mark_bar(color=color_hex).encode(
-            x=alt.X('週次:O', sort=week_order, title='星期'),
-            y=alt.Y('次數:Q', title='出現次數', axis=alt.Axis(tickMinStep=1, format='d')),
-            tooltip=['週次', '次數']
-        ).properties(
-            height=160, # 調整高度，解決太扁或佔位問題
-            background='#1E1E1E'
-        ).configure_axis(
-            labelFontSize=11, titleFontSize=13, grid=True, 
-            gridColor='#444', labelColor='#E0E0E0', titleColor='#E0E0E0'
-        ).configure_view(strokeWidth=0).interactive()
-        
-        st.altair_chart(chart, use_container_width=True)
-
-    # --------------------------
-    # HTML 表格渲染
-    # --------------------------
-    def render_html_table(dataframe):
-        if dataframe.empty:
-            st.warning("無資料")
-            return
-        table_html = dataframe.to_html(index=False, classes="custom-table", escape=False)
-        final_html = f'<div class="table-container">{table_html}</div>'
-        st.markdown(final_html, unsafe_allow_html=True)
-
-    # --------------------------
-    # 資料格式化函式
-    # --------------------------
-    def format_full_detail_table(data_chunk):
-        display = data_chunk.copy()
-        display['抵達時間'] = display['完整時間'].dt.strftime('%H:%M:%S')
-        
-        def format_next_info(row):
-            if pd.isna(row['下筆時間']): return "-"
-            if row['下筆時間'].date() == row['完整時間'].date():
-                return row['下筆時間'].strftime('%H:%M:%S')
-            else:
-                days_diff = (row['下筆時間'].date() - row['完整時間'].date()).days
-                return f"{row['下筆時間'].strftime('%H:%M:%S')} (+{days_diff}天)"
-            
-        display['離開時間'] = display.apply(format_next_info, axis=1)
-        display['前往地點'] = display['下筆地點'].fillna("-")
-
-        def format_duration(sec):
-            if pd.isna(sec): return "-"
-            m = int(sec // 60)
-            h = int(m // 60)
-            rem_m = m % 60
-            if h > 0: return f"{h}小時{rem_m}分"
-            else: return f"{m}分"
-
-        display['停留'] = display['停留秒數'].apply(format_duration)
-        return display[['日期', '週次', '抵達時間', '離開時間', '前往地點', '停留']].sort_values(by=['日期', '抵達時間'], ascending=[False, True])
-
-    # --------------------------
-    # 主頁面內容
-    # --------------------------
-    
-    tab1, tab2, tab3, tab4, tab5 = st.tabs(["熱點統計", "居住判讀", "每日行程 & 週次", "同夥比對", "AI 預測"])
-
-    # === 分頁 1: 熱點分析 ===
-    with tab1:
-        st.subheader("地點造訪頻率統計")
-        all_cars = sorted(df['車牌'].unique())
-        selected_car_hot = st.selectbox("選擇車輛", all_cars, key="hot_car")
-
-        if selected_car_hot:
-            st.markdown("---")
-            car_data = df[df['車牌'] == selected_car_hot].copy()
-            place_counts = car_data['地點'].value_counts().reset_index()
-            place_counts.columns = ['地點', '次數']
-            
-            st.info("長條圖顯示該地點「出現的天數」，越高代表越有規律。")
-            for index, row in place_counts.head(20).iterrows():
-                place = row['地點']
-                count = row['次數']
-                rank = index + 1
-                records = car_data[car_data['地點'] == place].copy()
-                formatted_table = format_full_detail_table(records)
-                label = f"#{rank} {place} (共 {count} 次)"
-                with st.expander(label):
-                    st.markdown("##### 規律性分析")
-                    render_regularity_chart(records, color_hex="#4DA6FF")
-                    st.markdown("##### 詳細動線紀錄")
-                    render_html_table(formatted_table)
-
-    # === 分頁 2: 居住地判讀 ===
-    with tab2:
-        st.subheader("長時間停留 / 過夜地點分析")
-        with st.expander("參數設定", expanded=True):
-            c1, c2 = st.columns(2)
-            with c1: min_stay = st.slider("最小停留時數 (小時)", 1, 12, 4)
-            with c2: night_hr = st.selectbox("夜間時段起始 (時)", list(range(18, 25)), index=2)
-            st.markdown(f"邏輯：`{night_hr}:00~06:00` 抵達且停留 > `{min_stay}小時`")
-
-        selected_car_home = st.selectbox("選擇車輛", all_cars, key="home_car")
-
-        if selected_car_home:
-            st.markdown("---")
-            car_data = df[df['車牌'] == selected_car_home].copy()
-            is_night = (car_data['完整時間'].dt.hour >= night_hr) | (car_data['完整時間'].dt.hour < 6)
-            is_long = car_data['停留秒數'].fillna(0) >= (min_stay * 3600)
-            candidates = car_data[is_night & is_long]
-
-            if not candidates.empty:
-                home_stats = candidates['地點'].value_counts().reset_index()
-                home_stats.columns = ['地點', '過夜次數']
-                top_place = home_stats.iloc[0]['地點']
-                st.success(f"推測落腳點： **{top_place}**")
-                st.write("詳細清單：")
-                for idx, row in home_stats.iterrows():
-                    place = row['地點']
-                    count = row['過夜次數']
-                    details = candidates[candidates['地點'] == place].copy()
-                    formatted_table = format_full_detail_table(details)
-                    expand_label = f"{place} (符合條件 {count} 次)"
-                    with st.expander(expand_label, expanded=(idx==0)):
-                        st.markdown("##### 過夜規律分析")
-                        render_regularity_chart(details, color_hex="#FF6B6B")
-                        st.markdown("##### 停留與動線")
-                        render_html_table(formatted_table)
-            else:
-                st.warning("查無符合過夜條件之紀錄")
-
-    # === 分頁 3: 每日行程 & 週次慣性 ===
-    with tab3:
-        st.subheader("每日軌跡詳細列表")
-        car_daily = st.selectbox("選擇車輛", all_cars, key="d_car")
-        
-        if car_daily:
-            st.markdown("---")
-            st.markdown("##### 週次慣性分析")
-            car_data_full = df[df['車牌'] == car_daily].copy()
-            render_weekly_bar_chart(car_data_full, color_hex="#4DA6FF")
-            
-            weekly_stats = car_data_full['週次'].value_counts().reset_index()
-            weekly_stats.columns = ['星期', '出現次數']
-            week_order_map = {'週一':1, '週二':2, '週三':3, '週四':4, '週五':5, '週六':6, '週日':7}
-            weekly_stats['order'] = weekly_stats['星期'].map(week_order_map)
-            weekly_stats = weekly_stats.sort_values('order').drop(columns=['order'])
-            
-            with st.expander("查看週次詳細統計數據"):
-                render_html_table(weekly_stats)
-            
-            st.divider()
-            
-            st.markdown("##### 每日詳細行程")
-            c_date, c_alert = st.columns([1, 1])
-            with c_date:
-                dates = sorted(df[df['車牌'] == car_daily]['日期'].unique())
-                date_daily = st.selectbox("選擇日期", dates, key="d_date")
-            with c_alert:
-                alert_val = st.slider("異常停留警示門檻 (分鐘)", 10, 300, 60, step=10)
-
-            if date_daily:
-                daily_data = df[(df['車牌'] == car_daily) & (df['日期'] == date_daily)].sort_values(by="完整時間").copy()
-                if daily_data.empty:
-                    st.warning("該日期無資料")
-                else:
-                    display_list = []
-                    for idx, row in daily_data.iterrows():
-                        arr_time = row['完整時間'].strftime('%H:%M:%S')
-                        loc = row['地點']
-                        dur = row['停留秒數']
-                        next_time_obj = row['下筆時間']
-                        
-                        if pd.isna(next_time_obj):
-                            leave_time = "-"
-                        elif next_time_obj.date() == row['完整時間'].date():
-                            leave_time = f"{next_time_obj.strftime('%H:%M:%S')}"
-                        else:
-                            days = (next_time_obj.date() - row['完整時間'].date()).days
-                            leave_time = f"{next_time_obj.strftime('%H:%M:%S')} (+{days}天)"
-                        
-                        if pd.isna(dur):
-                            status_html = '<span class="status-green">🟢 正常</span>'
-                            note = "無後續"
-                        else:
-                            m = int(dur // 60)
-                            h = int(m // 60)
-                            rem_m = m % 60
-                            time_txt = f"{m}分" if h == 0 else f"{h}時{rem_m}分"
-                            if m >= alert_val:
-                                status_html = f'<span class="status-red">🔴 異常</span>'
-                                note = f"停留 {time_txt}"
-                            else:
-                                status_html = f'<span class="status-green">🟢 正常</span>'
-                                note = f"間隔 {time_txt}"
-
-                        display_list.append({
-                            "抵達時間": arr_time,
-                            "地點": loc,
-                            "離開時間": leave_time,
-                            "狀態": status_html,
-                            "說明": note
-                        })
-                    st.write(f"日期：{date_daily} ({pd.to_datetime(date_daily).day_name()})")
-                    render_html_table(pd.DataFrame(display_list))
-
-    # === 分頁 4: 同夥比對 ===
-    with tab4:
-        st.subheader("多車接觸關聯分析")
-        selected_cars = st.multiselect("請選擇比對車輛 (至少 2 台)", all_cars, default=all_cars[:2] if len(all_cars)>=2 else None)
-        min_diff = st.number_input("時間容許誤差值 (分鐘)", 1, 60, 5)
-        sec_diff = min_diff * 60
-        
-        if st.button("執行群組比對"):
-            if len(selected_cars) < 2:
-                st.error("請至少選擇兩台車輛")
-            else:
-                results_list = []
-                combinations = list(itertools.combinations(selected_cars, 2))
-                progress_text = st.empty()
-                for idx, (car_a, car_b) in enumerate(combinations):
-                    progress_text.text(f"正在比對：{car_a} vs {car_b} ...")
-                    da = df[df['車牌'] == car_a]
-                    db = df[df['車牌'] == car_b]
-                    merged = pd.merge(da, db, on='地點', suffixes=('_A', '_B'))
-                    if not merged.empty:
-                        merged['秒差'] = (merged['完整時間_A'] - merged['完整時間_B']).abs().dt.total_seconds()
-                        valid = merged[merged['秒差'] <= sec_diff].copy()
-                        if not valid.empty:
-                            for _, row in valid.iterrows():
-                                results_list.append({
-                                    '地點': row['地點'],
-                                    '日期': row['日期_A'],
-                                    '車輛 1': car_a,
-                                    '時間 1': row['完整時間_A'].strftime('%H:%M:%S'),
-                                    '車輛 2': car_b,
-                                    '時間 2': row['完整時間_B'].strftime('%H:%M:%S'),
-                                    '誤差': f"{int(row['秒差'] // 60)}分{int(row['秒差'] % 60)}秒",
-                                    'sort_time': row['完整時間_A'] 
-                                })
-                progress_text.empty()
-                if results_list:
-                    st.warning(f"分析完成！共發現 {len(results_list)} 筆接觸紀錄")
-                    res_df = pd.DataFrame(results_list).sort_values(by='sort_time', ascending=False).drop(columns=['sort_time'])
-                    render_html_table(res_df)
-                else:
-                    st.success("分析完成：無符合條件的接觸紀錄")
-
-    # === 分頁 5: AI 智慧預測 ===
-    with tab5:
-        st.subheader("AI 軌跡預測")
-        current_time = datetime.now()
-        current_hour = current_time.hour
-        week_map_en = {0: '週一', 1: '週二', 2: '週三', 3: '週四', 4: '週五', 5: '週六', 6: '週日'}
-        current_week_zh = week_map_en[current_time.weekday()]
-        
-        c1, c2 = st.columns(2)
-        with c1: car_predict = st.selectbox("1. 選擇預測車輛", all_cars, key="p_car")
-        with c2:
-            current_loc = None
-            if car_predict:
-                visited = sorted(df[df['車牌'] == car_predict]['地點'].unique().astype(str))
-                current_loc = st.selectbox("2. 假設剛經過哪個地點？", visited, index=None, placeholder="打字或貼上...", key="p_loc")
-
-        if car_predict and current_loc:
-            st.markdown("---")
-            history = df[df['車牌'] == car_predict].copy()
-            transitions = history[history['地點'] == current_loc].copy()
-            transitions['Hour'] = transitions['完整時間'].dt.hour
-            
-            f1 = transitions[(transitions['週次'] == current_week_zh) & (transitions['Hour'].between(current_hour-3, current_hour+3))]
-            f2 = transitions[transitions['Hour'].between(current_hour-3, current_hour+3)]
-            
-            if len(f1) > 2:
-                working = f1
-                st.success(f"🎯 精準鎖定：分析「{current_week_zh}」且時段相近 ({current_hour-3}:00~{current_hour+3}:00) 之紀錄")
-            elif len(f2) > 2:
-                working = f2
-                st.success(f"🕒 時段鎖定：分析時段相近 ({current_hour-3}:00~{current_hour+3}:00) 之紀錄")
-            else:
-                working = transitions
-                st.warning("⚠️ 當前時段樣本不足，改採全歷史數據分析。")
-
-            trip_ids = working['行程ID'].unique()
-            
-            if len(trip_ids) == 0:
-                st.warning("無歷史紀錄，無法預測。")
-            else:
-                next_stop, final_dest = [], []
-                
-                for tid in trip_ids:
-                    trip = history[history['行程ID'] == tid].sort_values('完整時間')
-                    indices = trip.index[trip['地點'] == current_loc].tolist()
-                    for i in indices:
-                        curr = trip.loc[i]
-                        future = trip[trip['完整時間'] > curr['完整時間']]
-                        if not future.empty:
-                            nxt = future.iloc[0]
-                            next_stop.append({
-                                '目標地點': nxt['地點'],
-                                '秒數': (nxt['完整時間'] - curr['完整時間']).total_seconds(),
-                                '日期': nxt['日期'], '抵達時間': nxt['完整時間'].strftime('%H:%M:%S'),
-                                'sort_key': nxt['完整時間']
-                            })
-                            final = trip.iloc[-1]
-                            if final['地點'] != current_loc:
-                                final_dest.append({
-                                    '目標地點': final['地點'],
-                                    '秒數': (final['完整時間'] - curr['完整時間']).total_seconds(),
-                                    '日期': final['日期'], '抵達時間': final['完整時間'].strftime('%H:%M:%S'),
-                                    'sort_key': final['完整時間']
-                                })
-
-                def show_pred(data, title):
-                    st.subheader(title)
-                    if not data:
-                        st.info(f"無 {title} 資料")
-                        return
-                    
-                    df_p = pd.DataFrame(data)
-                    stats = df_p.groupby('目標地點').agg(
-                        樣本數=('目標地點', 'count'),
-                        平均秒數=('秒數', 'mean')
-                    ).reset_index()
-                    stats['機率'] = (stats['樣本數'] / stats['樣本數'].sum() * 100).round(1)
-                    stats['預估車程'] = stats['平均秒數'].apply(lambda s: f"約 {int(s//60)} 分鐘")
-                    stats = stats.sort_values(by=['機率', '平均秒數'], ascending=[False, True]).reset_index(drop=True)
-                    
-                    st.markdown("##### 詳細預測清單 (點擊展開)")
-                    for i, row in stats.iterrows():
-                        loc, prob, est = row['目標地點'], row['機率'], row['預估車程']
-                        with st.expander(f"【 {est} 】 {loc} (機率 {prob}%)"):
-                            st.markdown(f'<span class="time-highlight">⏱️ 預估行駛：{est}</span>', unsafe_allow_html=True)
-                            details = df_p[df_p['目標地點'] == loc].sort_values(by='sort_key', ascending=False)
-                            render_html_table(details[['日期', '抵達時間']])
-
-                show_pred(next_stop, "下一站預測 (Next Stop)")
-                st.markdown("---")
-                show_pred(final_dest, "最終目的地預測 (Final Destination)")
-
-else:
-    st.info("請由左側選單匯入資料以開始分析")
+import streamlit as st
+import pandas as pd
+import os
+import altair as alt
+import functools
+import uuid
+from datetime import datetime
+
+from tracker import bulk, engine, formatting as fmt, geo, ingest, jobs, pipeline, profiling
+from tracker.cache import DatasetCache
+from tracker.convoy import discover_convoys
+from tracker.engine import SIDECAR_DIR, STORE_DIR
+from tracker.live import FolderWatcher
+from tracker.predict import FINAL_DEST, NEXT_STOP, TIER_EXACT, TIER_HOUR
+from tracker.store import TrackStore
+from tracker.trips import DWELL_SPLIT_SEC, GAP_SPLIT_SEC
+from tracker.views import MemoryView, StoreView
+
+# 讀檔與衍生欄位快取的記憶體上限 (MB)，所有 session 共用
+CACHE_MAX_MB = int(os.environ.get("TRACKER_CACHE_MB", "2048"))
+# 平行讀檔的行程數 (未設定則依 CPU 核心數)
+INGEST_WORKERS = int(os.environ.get("TRACKER_INGEST_WORKERS", "0")) or None
+# 同行車探勘顯示的名次數
+CONVOY_TOP_N = 50
+# 明細表格每頁筆數
+TABLE_PAGE_ROWS = 100
+# 即時模式檢查監看資料夾的間隔 (秒)
+LIVE_POLL_SEC = 1
+# 鄰近地點預設半徑 (公尺)
+NEARBY_RADIUS_M = 150
+# 背景工作的執行緒數 (所有 session 共用) 與進度更新間隔 (秒)
+JOB_WORKERS = int(os.environ.get("TRACKER_JOB_WORKERS", str(jobs.MAX_WORKERS)))
+JOB_POLL_SEC = 1
+# 送出後先等待的秒數，很快完成的工作 (例如已有快取) 直接顯示結果
+JOB_QUICK_SEC = 0.3
+
+
+@st.cache_resource
+def get_dataset_cache():
+    return DatasetCache(max_bytes=CACHE_MAX_MB * 1024 * 1024,
+                        make_pool=functools.partial(ingest.make_pool, INGEST_WORKERS), sidecar_dir=SIDECAR_DIR)
+
+
+@st.cache_resource
+def get_track_store():
+    return TrackStore(STORE_DIR)
+
+
+@st.cache_resource
+def get_camera_catalog(name, data):
+    # 以內容快取，各半徑的鄰近索引隨位置表一起保留、跨 session 共用
+    return geo.read_catalog(name, data)
+
+
+@st.cache_resource
+def get_folder_watcher(folder):
+    return FolderWatcher(folder, get_track_store(), sidecar_dir=SIDECAR_DIR)
+
+
+@st.fragment(run_every=LIVE_POLL_SEC)
+def render_live_status(watcher):
+    """定期檢查監看資料夾；資料庫有新資料 (含其他 session 匯入) 時重新執行整頁，開啟中的分頁隨之更新。"""
+    watcher.poll()
+    if watcher.store.version != st.session_state.get("live_version"):
+        st.rerun()
+    st.caption(f"監看中，最後檢查 {watcher.last_poll:%H:%M:%S}")
+    if watcher.batches:
+        batch = watcher.batches[-1]
+        st.caption(f"最近一批 {batch['time']:%H:%M:%S}：{len(batch['files'])} 個檔案，新增 {batch['rows']} 筆"
+                   f" ({len(batch['plates'])} 台車)，過濾重複 {batch['removed']} 筆，耗時 {batch['seconds']:.2f} 秒")
+        for name, error in batch['errors']:
+            st.warning(f"{name} 匯入失敗：{error}")
+
+
+@st.cache_resource
+def get_job_pool():
+    return jobs.JobPool(JOB_WORKERS)
+
+
+# --------------------------
+# 背景工作 (耗時的分析在執行緒池中進行，可切換分頁繼續瀏覽)
+# 各 session 以名稱記錄最近送出的工作，結果保存在共用的工作池，重新執行頁面不會遺失
+# --------------------------
+def session_job(name):
+    """本 session 以 name 送出的最近一個工作 (沒有則為 None)。"""
+    job_id = st.session_state.get(f"job_{name}")
+    return get_job_pool().get(job_id) if job_id else None
+
+
+def start_job(name, label, func, *args, params=None, cancellable=True):
+    """送出背景工作 func(job, *args)；同名的前一個工作若未結束則取消。
+
+    func 執行中不會呼叫 job.update() 檢查取消時傳入 cancellable=False，執行中不顯示取消按鈕。
+    """
+    previous = session_job(name)
+    if previous is not None and not previous.done:
+        previous.cancel()
+    owner = st.session_state.setdefault("job_owner", uuid.uuid4().hex)
+    job = get_job_pool().submit(label, func, *args, params=params, owner=owner,
+                                    cancellable=cancellable)
+    st.session_state[f"job_{name}"] = job.id
+    job.wait(JOB_QUICK_SEC)
+    return job
+
+
+@st.fragment(run_every=JOB_POLL_SEC)
+def render_job_progress(job, render_partial=None):
+    """定期更新工作進度；工作結束時重新執行整頁以顯示結果。"""
+    if job.done:
+        st.rerun()
+    st.progress(job.progress, text=f"{job.label}：{job.message or job.state}")
+    if job.cancel_requested:
+        st.caption("取消中 ...")
+    else:
+        st.caption(f"已執行 {job.elapsed:.0f} 秒，可切換其他分頁繼續瀏覽")
+        if job.can_cancel and st.button("取消", key=f"job_cancel_{job.id}"):
+            job.cancel()
+    if render_partial is not None and job.partial is not None:
+        render_partial(job.partial)
+
+
+def data_updated(old_params, params):
+    """兩組工作參數的查詢條件相同，但本地資料庫版本 (view_key 最後一項) 已更新。
+
+    新資料可能延伸資料庫的日期範圍，因此不比較日期。
+    """
+    if not (isinstance(old_params, tuple) and isinstance(params, tuple)):
+        return False
+    old_key, key = old_params[0], params[0]
+    return (old_key is not None and key is not None and old_key[0] == key[0] == 'store'
+            and old_key[-1] != key[-1] and old_params[1:] == params[1:])
+
+
+def job_result(name, params, render_partial=None):
+    """顯示 name 工作的狀態；已完成且 params 與送出時相同時回傳 (True, 結果)，否則為 (False, None)。"""
+    job = session_job(name)
+    if job is None:
+        return False, None
+    if job.params != params:
+        if job.done and data_updated(job.params, params):
+            st.info(f"本地資料庫已有新資料，先前的{job.label}結果已失效，請重新執行")
+        return False, None
+    if not job.done:
+        render_job_progress(job, render_partial)
+    elif job.state == jobs.FAILED:
+        st.error(f"{job.label}失敗: {job.error}")
+    elif job.state == jobs.CANCELLED:
+        st.info(f"{job.label}已取消")
+    else:
+        return True, job.result
+    return False, None
+
+
+def contacts_job(job, view, plates, tolerance_sec):
+    # 先逐一讀取車牌，再依地點分批比對；每一步都是取消的檢查點
+    def progress(done, total):
+        if done <= len(plates):
+            job.update(done / total, f"讀取車牌 {done} / {len(plates)}")
+        else:
+            job.update(done / total, f"比對接觸 {done - len(plates)} / {total - len(plates)} 批")
+    return engine.group_contacts(view, plates, tolerance_sec, on_progress=progress)
+
+
+def convoys_job(job, view, tolerance_sec, target, min_locations):
+    job.update(0.0, "建立 (地點, 時間桶) 索引 ...")
+    ranking = None
+    for done, ranking in discover_convoys(view.frame(), tolerance_sec, target=target, min_locations=min_locations):
+        job.update(done, f"探勘中 ... {done:.0%}", partial=ranking)
+    return ranking if ranking is not None else pd.DataFrame()
+
+
+def fleet_homes_job(job, view, min_stay, night_hr):
+    # 全車隊一次向量化計算，中途沒有檢查點 (以 cancellable=False 送出)；
+    # 被新條件的工作取代時，算完才丟棄結果
+    job.update(message="正在分析全車隊過夜地點 ...")
+    summary = view.fleet_homes(min_stay, night_hr).summary()
+    job.update(1.0)
+    return summary
+
+
+def bulk_job(job, paths, store):
+    # 進度回報只發生在寫入資料庫之前，取消不會留下寫到一半的資料
+    return bulk.ingest_paths(paths, store, sidecar_dir=SIDECAR_DIR,
+                             on_progress=lambda text: job.update(message=text))
+
+
+# 1. 頁面設定
+st.set_page_config(page_title="車輛軌跡分析系統", layout="wide")
+
+# 2. CSS 強制修正 (深色極簡 / 強制單行排版 / 戰情風格)
+st.markdown("""
+<style>
+    /* === 全域配色鎖定 (強制深色模式) === */
+    :root { color-scheme: dark; }
+    
+    .stApp, [data-testid="stAppViewContainer"], [data-testid="stHeader"] {
+        background-color: #0E1117 !important;
+        color: #FAFAFA !important;
+    }
+    
+    [data-testid="stSidebar"] { background-color: #262730 !important; }
+
+    /* 強制所有文字顏色 */
+    p, div, span, label, h1, h2, h3, h4, h5, h6, li { color: #E0E0E0 !important; }
+
+    html, body, [class*="css"] {
+        font-family: "Microsoft JhengHei", "Segoe UI", Roboto, sans-serif !important;
+    }
+
+    /* === 手機下拉選單強力修復 === */
+    div[data-baseweb="select"] > div, div[data-baseweb="base-input"] {
+        background-color: #262730 !important;
+        color: #FAFAFA !important;
+        border-color: #444 !important;
+    }
+    div[data-baseweb="popover"], div[data-baseweb="menu"], ul[role="listbox"] {
+        background-color: #262730 !important;
+        border: 1px solid #444 !important;
+    }
+    div[data-baseweb="menu"] li, div[data-baseweb="menu"] div {
+        color: #FAFAFA !important;
+        background-color: #262730 !important;
+    }
+    div[data-baseweb="menu"] li:hover, div[data-baseweb="menu"] li[aria-selected="true"] {
+        background-color: #4DA6FF !important;
+        color: #FFFFFF !important;
+    }
+    div[data-baseweb="tag"] {
+        background-color: #4DA6FF !important;
+        color: white !important;
+    }
+
+    /* === 表格樣式 === */
+    .table-container {
+        width: 100%;
+        overflow-x: auto; 
+        -webkit-overflow-scrolling: touch;
+        margin-bottom: 1rem;
+        background-color: #1E1E1E;
+        border: 1px solid #333;
+        border-radius: 4px;
+    }
+    .custom-table {
+        width: 100%;
+        border-collapse: collapse;
+        background-color: #1E1E1E !important; 
+        min-width: 600px; 
+    }
+    .custom-table th {
+        background-color: #000000 !important;
+        color: #4DA6FF !important;
+        font-weight: 600;
+        text-transform: uppercase;
+        padding: 10px 8px;
+        border-bottom: 2px solid #4DA6FF;
+        border-right: 1px solid #333;
+        white-space: nowrap; 
+        text-align: left;
+        font-size: 14px;
+    }
+    .custom-table td {
+        background-color: #1E1E1E !important;
+        color: #E0E0E0 !important; 
+        padding: 8px 8px;
+        border: 1px solid #333;
+        white-space: nowrap; 
+        vertical-align: middle;
+        font-size: 14px;
+    }
+
+    /* === 狀態標籤 === */
+    .status-red {
+        background-color: #3A0000 !important;
+        color: #FF4D4D !important;
+        font-weight: bold;
+        border: 1px solid #FF4D4D;
+        padding: 2px 6px;
+        border-radius: 4px;
+        white-space: nowrap;
+    }
+    .status-green {
+        background-color: #0d330e !important;
+        color: #4CAF50 !important;
+        font-weight: bold;
+        border: 1px solid #4CAF50;
+        padding: 2px 6px;
+        border-radius: 4px;
+        white-space: nowrap;
+    }
+    /* 機率標籤 */
+    .prob-high { color: #4DA6FF; font-weight: bold; font-size: 16px; }
+    .prob-mid { color: #A0CFFF; }
+    .prob-low { color: #666; }
+    
+    /* === 時間強調樣式 === */
+    .time-highlight {
+        color: #4DA6FF !important;
+        font-weight: bold;
+        font-size: 18px;
+        margin-bottom: 10px;
+        display: block;
+    }
+    
+    .streamlit-expanderHeader {
+        background-color: #262730 !important;
+        color: #FAFAFA !important;
+        border: 1px solid #444 !important;
+        font-weight: 600 !important;
+    }
+    
+    [data-testid="stChart"] { filter: none !important; }
+    
+    /* 時鐘樣式 */
+    #clock { 
+        font-family: "Microsoft JhengHei", sans-serif; 
+        font-size: 15px; 
+        color: #AAAAAA; 
+        font-weight: 600;
+    }
+</style>
+""", unsafe_allow_html=True)
+
+st.title("車輛軌跡分析系統")
+
+# 各階段效能紀錄 (每個 session 一份，TRACKER_PROFILE=0 時關閉)
+stage_log = None
+if profiling.ENABLED:
+    stage_log = st.session_state.setdefault("stage_log", profiling.StageLog())
+    stage_log.next_run()
+profiling.use(stage_log)
+
+# --- JS 強制即時時鐘 ---
+st.components.v1.html("""
+<style>body { background-color: #0E1117; margin: 0; padding: 0; } #clock { font-family: "Microsoft JhengHei", sans-serif; font-size: 15px; color: #AAAAAA; font-weight: 600; }</style>
+<div id="clock">載入時間中...</div>
+<script>
+    function updateTime() {
+        const now = new Date();
+        const year = now.getFullYear();
+        const month = String(now.getMonth() + 1).padStart(2, '0');
+        const day = String(now.getDate()).padStart(2, '0');
+        const hours = String(now.getHours()).padStart(2, '0');
+        const minutes = String(now.getMinutes()).padStart(2, '0');
+        const seconds = String(now.getSeconds()).padStart(2, '0');
+        const timeString = `系統時間：${year}-${month}-${day} ${hours}:${minutes}:${seconds}`;
+        document.getElementById('clock').innerText = timeString;
+    }
+    setInterval(updateTime, 1000);
+    updateTime();
+</script>
+""", height=30)
+
+# --- 側邊欄：多檔案上傳 ---
+st.sidebar.header("資料匯入")
+uploaded_files = st.sidebar.file_uploader(
+    "請上傳 Excel 或 CSV 檔案 (支援多選)", 
+    type=["xlsx", "csv"], 
+    accept_multiple_files=True
+)
+
+store = get_track_store()
+view = None
+# 目前資料來源的識別，背景工作的結果依此判斷是否仍適用
+view_key = None
+
+if uploaded_files:
+    # --------------------------
+    # 資料讀取與合併處理 (以檔案內容雜湊快取，跨 session 共用)
+    # --------------------------
+    try:
+        files = [(file.name, file.getvalue()) for file in uploaded_files]
+        with profiling.stage("上傳資料載入", detail=f"{len(files)} 個檔案"):
+            upload_index, load_stats = get_dataset_cache().load(files)
+    except ingest.FileReadError as e:
+        st.error(f"檔案讀取失敗: {e}")
+        st.stop()
+    except pipeline.MissingColumnsError as e:
+        st.error(f"資料格式錯誤，{e}。")
+        st.stop()
+    except Exception as e:
+        st.error(f"資料處理錯誤: {e}")
+        st.stop()
+
+    removed_count = load_stats['removed']
+    if removed_count > 0:
+        st.sidebar.warning(f"已自動過濾 {removed_count} 筆重複資料")
+    st.sidebar.info(f"有效資料：{load_stats['rows']} 筆")
+    for report in load_stats['files']:
+        if report['bad_rows'] > 0:
+            st.sidebar.warning(f"{report['name']}：{report['bad_rows']} 筆日期/時間無法解析，已略過")
+            with st.sidebar.expander(f"{report['name']} 無法解析的樣本"):
+                st.caption(f"判斷格式：日期 `{report['date_format']}`，時間 `{report['time_format']}`")
+                st.table(pd.DataFrame(report['bad_samples'], columns=['日期', '時間']))
+        if report['blank_plates'] > 0:
+            st.sidebar.warning(f"{report['name']}：{report['blank_plates']} 筆車牌空白，已略過")
+    st.sidebar.caption(
+        f"記憶體：原始字串表 {load_stats['raw_bytes'] / 1024**2:.1f} MB → "
+        f"精簡後 {load_stats['bytes'] / 1024**2:.1f} MB"
+    )
+
+    # 每個檔案只寫入本地資料庫一次：逐檔與資料庫已知的資料指紋比對，只寫入新資料
+    pending = [(file, digest) for file, digest in zip(files, load_stats['digests'])
+               if not store.has_sources([digest])]
+    if pending:
+        store.write_sources(get_dataset_cache().file_frames(*map(list, zip(*pending))))
+    for (name, _), digest in zip(files, load_stats['digests']):
+        counts = store.source_stats(digest)
+        if counts is not None:
+            st.sidebar.caption(f"{name}：新資料 {counts['new']} 筆，資料庫已有 {counts['known']} 筆")
+    view = MemoryView(upload_index)
+    view_key = ('upload', tuple(load_stats['digests']))
+
+# --- 側邊欄：大型檔案匯入 (本機路徑，分塊處理，不需整批載入記憶體) ---
+with st.sidebar.expander("大型檔案匯入 (本機路徑)"):
+    bulk_entries = st.text_area("檔案或資料夾路徑 (每行一個)", key="bulk_paths")
+    if st.button("匯入本地資料庫", key="bulk_run"):
+        bulk_paths = bulk.expand_paths(bulk_entries.splitlines())
+        if not bulk_paths:
+            st.error("找不到 CSV / Excel 檔案")
+        else:
+            start_job("bulk", "匯入本地資料庫", bulk_job, bulk_paths, store)
+    finished, bulk_stats = job_result("bulk", None)
+    if finished:
+        st.success(f"已寫入 {bulk_stats['rows']} 筆，過濾重複 {bulk_stats['removed']} 筆")
+        if bulk_stats['skipped']:
+            st.info("已匯入過，略過：" + "、".join(bulk_stats['skipped']))
+        for report in bulk_stats['files']:
+            st.caption(f"{report['name']}：新資料 {report['new_rows']} 筆，"
+                       f"資料庫已有 {report['known_rows']} 筆")
+            if report['bad_rows'] > 0:
+                st.warning(f"{report['name']}：{report['bad_rows']} 筆日期/時間無法解析，已略過")
+            if report['blank_plates'] > 0:
+                st.warning(f"{report['name']}：{report['blank_plates']} 筆車牌空白，已略過")
+
+# --- 側邊欄：即時監看資料夾 (新檔案持續匯入本地資料庫，分析改以本地資料庫為來源) ---
+with st.sidebar.expander("即時監看資料夾"):
+    live_dir = st.text_input("資料夾路徑", key="live_dir")
+    live_on = st.toggle("啟用即時模式", key="live_on")
+    if live_on and not os.path.isdir(live_dir):
+        st.error("找不到資料夾")
+        live_on = False
+    if live_on:
+        st.session_state["live_version"] = store.version
+        render_live_status(get_folder_watcher(os.path.abspath(live_dir)))
+
+# --- 側邊欄：本地資料庫 ---
+if not store.is_empty():
+    st.sidebar.header("本地資料庫")
+    source = "本地資料庫"
+    if view is not None and not live_on:
+        source = st.sidebar.radio("資料來源", ["本次上傳", "本地資料庫"], horizontal=True)
+    if source == "本地資料庫":
+        first_day, last_day = (datetime.strptime(d, '%Y-%m-%d').date() for d in store.date_bounds())
+        picked = st.sidebar.date_input("日期範圍", (first_day, last_day),
+                                       min_value=first_day, max_value=last_day)
+        start_day, end_day = (picked[0], picked[-1]) if picked else (first_day, last_day)
+        view = StoreView(store, start_day.isoformat(), end_day.isoformat())
+        # 含資料庫版本：即時模式 / 大型匯入寫入新資料後，先前的背景工作結果不再沿用
+        view_key = ('store', start_day, end_day, store.version)
+        st.sidebar.caption(f"資料庫範圍：{first_day} ~ {last_day}")
+
+# --- 側邊欄：行程切分門檻 (影響每日行程摘要與 AI 預測) ---
+if view is not None:
+    with st.sidebar.expander("行程切分參數"):
+        dwell_minutes = st.slider("停留達此分鐘數即結束行程", 10, 240, DWELL_SPLIT_SEC // 60, step=5,
+                                  key="trip_dwell")
+        gap_hours = st.slider("相隔超過此時數即為新行程", 1, 24, GAP_SPLIT_SEC // 3600, key="trip_gap")
+        st.caption("調整後只重新切分行程摘要，不需重新讀檔")
+    view.trip_rules = (dwell_minutes * 60, gap_hours * 3600)
+
+# --- 側邊欄：監視器位置表 (半徑內的鄰近地點視為同一地點：同夥比對、熱點與居住地判讀) ---
+if view is not None:
+    with st.sidebar.expander("監視器位置 (鄰近比對)"):
+        catalog_file = st.file_uploader("位置表 (地點、緯度、經度)", type=["csv", "xlsx"], key="camera_catalog")
+        radius_m = st.slider("鄰近半徑 (公尺，0 表示地點名稱須相同)", 0, 1000, NEARBY_RADIUS_M, step=25,
+                             key="nearby_radius")
+        if catalog_file is not None:
+            try:
+                catalog = get_camera_catalog(catalog_file.name, catalog_file.getvalue())
+            except geo.CatalogError as e:
+                st.error(f"位置表讀取失敗: {e}")
+            else:
+                if radius_m > 0:
+                    view.proximity = catalog.within(radius_m)
+                    st.caption(f"{len(catalog)} 個地點，半徑內鄰近配對 {view.proximity.pairs} 組")
+                if catalog.skipped:
+                    st.warning(f"{catalog.skipped} 列缺少名稱或座標無效，已略過")
+
+if view is not None:
+    # --------------------------
+    # 繪圖函式
+    # --------------------------
+    def render_regularity_chart(hourly_days, color_hex="#4DA6FF"):
+        final_data = hourly_days.reset_index()
+        
+        chart = alt.Chart(final_data).mark_bar(color=color_hex).encode(
+            x=alt.X('Hour:O', title='時段 (0-23)', scale=alt.Scale(domain=list(range(24)))), 
+            y=alt.Y('DaysCount:Q', title='出現天數', axis=alt.Axis(tickMinStep=1, format='d')),
+            tooltip=[alt.Tooltip('Hour', title='時段'), alt.Tooltip('DaysCount', title='累計天數')]
+        ).properties(height=180, background='#1E1E1E').configure_axis(
+            labelFontSize=11, titleFontSize=13, grid=True, 
+            gridColor='#444', labelColor='#E0E0E0', titleColor='#E0E0E0'
+        ).configure_view(strokeWidth=0).interactive()
+        with profiling.stage("圖表繪製", len(final_data)):
+            st.altair_chart(chart, use_container_width=True)
+
+    # 修改：週次分析長條圖 (高度調整為 160px，確保比例適中)
+    def render_weekly_bar_chart(weekday_counts, color_hex="#4DA6FF"):
+        final_df = weekday_counts.reset_index()
+        week_order = list(weekday_counts.index)
+        
+        chart = alt.Chart(final_df).mark_bar(color=color_hex).encode(
+            x=alt.X('週次:O', sort=week_order, title='星期'),
+            y=alt.Y('次數:Q', title='出現次數', axis=alt.Axis(tickMinStep=1, format='d')),
+            tooltip=['週次', '次數']
+        ).properties(
+            height=160, # 調整高度，解決太扁或佔位問題
+            background='#1E1E1E'
+        ).configure_axis(
+            labelFontSize=11, titleFontSize=13, grid=True, 
+            gridColor='#444', labelColor='#E0E0E0', titleColor='#E0E0E0'
+        ).configure_view(strokeWidth=0).interactive()
+        
+        with profiling.stage("圖表繪製", len(final_df)):
+            st.altair_chart(chart, use_container_width=True)
+
+    # --------------------------
+    # HTML 表格渲染
+    # --------------------------
+    def render_html_table(dataframe):
+        if dataframe.empty:
+            st.warning("無資料")
+            return
+        with profiling.stage("表格輸出", len(dataframe)):
+            table_html = dataframe.to_html(index=False, classes="custom-table", escape=False)
+            final_html = f'<div class="table-container">{table_html}</div>'
+            st.markdown(final_html, unsafe_allow_html=True)
+
+    def render_paged_table(rows, key, formatter=None, page_size=TABLE_PAGE_ROWS):
+        """分頁顯示，只格式化並輸出目前頁次的資料 (rows 需已排序)。"""
+        if rows.empty:
+            st.warning("無資料")
+            return
+        pages = (len(rows) - 1) // page_size + 1
+        page = 1
+        if pages > 1:
+            c_page, c_info = st.columns([1, 3])
+            with c_page: page = st.number_input("頁次", 1, pages, 1, key=f"{key}_page")
+            with c_info: st.caption(f"共 {len(rows)} 筆，第 {page} / {pages} 頁")
+        chunk = rows.iloc[(page - 1) * page_size:page * page_size]
+        render_html_table(formatter(chunk) if formatter else chunk)
+
+    # --------------------------
+    # 主頁面內容
+    # --------------------------
+    
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["熱點統計", "居住判讀", "每日行程 & 週次", "同夥比對", "AI 預測"])
+
+    # === 分頁 1: 熱點分析 ===
+    with tab1, profiling.stage("分頁：熱點統計"):
+        st.subheader("地點造訪頻率統計")
+        all_cars = view.plates()
+        selected_car_hot = st.selectbox("選擇車輛", all_cars, key="hot_car")
+
+        if selected_car_hot:
+            st.markdown("---")
+            place_counts = engine.hotspots(view, selected_car_hot)
+            
+            st.info("長條圖顯示該地點「出現的天數」，越高代表越有規律。")
+            for index, row in place_counts.head(20).iterrows():
+                place = row['地點']
+                count = row['次數']
+                rank = index + 1
+                label = f"#{rank} {place} (共 {count} 次)"
+                panel_key = f"hot_{selected_car_hot}_{place}"
+                # 展開時才查詢、繪製內容
+                panel = st.expander(label, key=panel_key, on_change="rerun")
+                with panel:
+                    if panel.open:
+                        st.markdown("##### 規律性分析")
+                        render_regularity_chart(engine.place_hourly_days(view, selected_car_hot, place),
+                                                color_hex="#4DA6FF")
+                        st.markdown("##### 詳細動線紀錄")
+                        records = fmt.detail_order(engine.place_rows(view, selected_car_hot, place))
+                        render_paged_table(records, panel_key, formatter=fmt.detail_table)
+
+    # === 分頁 2: 居住地判讀 ===
+    with tab2, profiling.stage("分頁：居住判讀"):
+        st.subheader("長時間停留 / 過夜地點分析")
+        with st.expander("參數設定", expanded=True):
+            c1, c2 = st.columns(2)
+            with c1: min_stay = st.slider("最小停留時數 (小時)", 1, 12, 4)
+            with c2: night_hr = st.selectbox("夜間時段起始 (時)", list(range(18, 25)), index=2)
+            st.markdown(f"邏輯：`{night_hr}:00~06:00` 抵達且停留 > `{min_stay}小時`")
+
+        home_mode = st.radio("檢視方式", ["單一車輛", "全車隊報表"], horizontal=True, key="home_mode")
+
+        if home_mode == "全車隊報表":
+            st.markdown("---")
+            home_params = (view_key, min_stay, night_hr, view.proximity)
+            home_job = session_job("home_fleet")
+            # 只在條件改變時自動送出；失敗或取消時保留訊息，由使用者決定是否重試
+            if (home_job is None or home_job.params != home_params
+                    or (home_job.state in (jobs.FAILED, jobs.CANCELLED)
+                        and st.button("重新分析", key="home_fleet_retry"))):
+                start_job("home_fleet", "全車隊過夜分析", fleet_homes_job, view, min_stay, night_hr,
+                          params=home_params, cancellable=False)
+            finished, fleet_summary = job_result("home_fleet", home_params)
+            if finished and fleet_summary.empty:
+                st.warning("查無符合過夜條件之紀錄")
+            elif finished:
+                st.success(f"共 {len(fleet_summary)} 台車輛有符合條件的過夜紀錄")
+                st.download_button("下載報表 (CSV)", fleet_summary.to_csv(index=False).encode('utf-8-sig'),
+                                   file_name=f"落腳點_{night_hr}時_{min_stay}小時.csv", mime="text/csv")
+                render_paged_table(fleet_summary, "home_fleet")
+        else:
+            selected_car_home = st.selectbox("選擇車輛", all_cars, key="home_car")
+
+            if selected_car_home:
+                st.markdown("---")
+                homes = view.homes(selected_car_home, min_stay, night_hr)
+                home_stats = homes.plate_ranking(selected_car_home)
+
+                if not home_stats.empty:
+                    top_place = home_stats.iloc[0]['地點']
+                    st.success(f"推測落腳點： **{top_place}**")
+                    st.write("詳細清單：")
+                    for idx, row in home_stats.iterrows():
+                        place = row['地點']
+                        count = row['過夜次數']
+                        expand_label = f"{place} (符合條件 {count} 次)"
+                        panel_key = f"home_{selected_car_home}_{place}"
+                        panel = st.expander(expand_label, expanded=(idx==0), key=panel_key, on_change="rerun")
+                        with panel:
+                            if panel.open:
+                                st.markdown("##### 過夜規律分析")
+                                render_regularity_chart(homes.cube().hourly_days(selected_car_home, place), color_hex="#FF6B6B")
+                                st.markdown("##### 停留與動線")
+                                details = fmt.detail_order(homes.plate_place(selected_car_home, place))
+                                render_paged_table(details, panel_key, formatter=fmt.detail_table)
+                else:
+                    st.warning("查無符合過夜條件之紀錄")
+
+    # === 分頁 3: 每日行程 & 週次慣性 ===
+    with tab3, profiling.stage("分頁：每日行程 & 週次"):
+        st.subheader("每日軌跡詳細列表")
+        car_daily = st.selectbox("選擇車輛", all_cars, key="d_car")
+        
+        if car_daily:
+            st.markdown("---")
+            st.markdown("##### 週次慣性分析")
+            weekday_counts = view.cube(car_daily).weekday_counts(car_daily)
+            render_weekly_bar_chart(weekday_counts, color_hex="#4DA6FF")
+            
+            weekly_stats = weekday_counts[weekday_counts > 0].reset_index()
+            weekly_stats.columns = ['星期', '出現次數']
+            
+            with st.expander("查看週次詳細統計數據"):
+                render_html_table(weekly_stats)
+            
+            st.divider()
+            
+            st.markdown("##### 每日詳細行程")
+            c_date, c_alert = st.columns([1, 1])
+            with c_date:
+                dates = view.plate_dates(car_daily)
+                date_daily = st.selectbox("選擇日期", dates, key="d_date", format_func=lambda d: d.strftime('%Y-%m-%d'))
+            with c_alert:
+                alert_val = st.slider("異常停留警示門檻 (分鐘)", 10, 300, 60, step=10)
+
+            if date_daily:
+                daily_data = view.plate_date(car_daily, date_daily)
+                if daily_data.empty:
+                    st.warning("該日期無資料")
+                else:
+                    st.write(f"日期：{date_daily:%Y-%m-%d} ({date_daily.day_name()})")
+                    day_trips = engine.day_trips(view, car_daily, date_daily)
+                    if not day_trips.empty:
+                        st.markdown(f"當日出發行程 {len(day_trips)} 趟")
+                        render_html_table(fmt.trip_table(day_trips))
+                    render_html_table(fmt.daily_table(daily_data, alert_val))
+
+    # === 分頁 4: 同夥比對 ===
+    with tab4, profiling.stage("分頁：同夥比對"):
+        st.subheader("多車接觸關聯分析")
+        mode = st.radio("比對模式", ["指定車輛比對", "同行車探勘"], horizontal=True, key="g_mode")
+        min_diff = st.number_input("時間容許誤差值 (分鐘)", 1, 60, 5)
+        sec_diff = min_diff * 60
+
+        if mode == "指定車輛比對":
+            selected_cars = st.multiselect("請選擇比對車輛 (至少 2 台)", all_cars, default=all_cars[:2] if len(all_cars)>=2 else None)
+
+            contact_params = (view_key, tuple(selected_cars), sec_diff, view.proximity)
+            if st.button("執行群組比對"):
+                if len(selected_cars) < 2:
+                    st.error("請至少選擇兩台車輛")
+                else:
+                    start_job("g_contacts", "同夥比對", contacts_job, view, selected_cars, sec_diff,
+                              params=contact_params)
+
+            # 比對結果保存在背景工作中，翻頁重新執行時不需重算
+            finished, contacts = job_result("g_contacts", contact_params)
+            if finished:
+                if not contacts.empty:
+                    st.warning(f"分析完成！共發現 {len(contacts)} 筆接觸紀錄")
+                    render_paged_table(contacts, "g_contacts", formatter=fmt.contact_table)
+                else:
+                    st.success("分析完成：無符合條件的接觸紀錄")
+        else:
+            st.markdown("找出與目標車輛 (未指定則為全車隊) **連續兩站**皆同時出現的車牌，依共同地點數與共同行程數排名。")
+            c1, c2 = st.columns(2)
+            with c1: target_car = st.selectbox("目標車輛", all_cars, index=None, placeholder="全車隊", key="g_target")
+            with c2: min_places = st.number_input("最少共同地點數", 2, 20, 2)
+
+            convoy_params = (view_key, sec_diff, target_car, min_places)
+            if st.button("開始探勘"):
+                start_job("g_convoys", "同行車探勘", convoys_job, view, sec_diff, target_car, min_places,
+                          params=convoy_params)
+
+            def render_convoy_ranking(ranking):
+                st.caption(f"目前找到 {len(ranking)} 組同行車 (顯示前 {CONVOY_TOP_N} 名)")
+                render_html_table(ranking.head(CONVOY_TOP_N))
+
+            finished, ranking = job_result("g_convoys", convoy_params, render_partial=render_convoy_ranking)
+            if finished:
+                if ranking.empty:
+                    st.success("探勘完成：無符合條件的同行車輛")
+                else:
+                    st.warning(f"探勘完成！共發現 {len(ranking)} 組同行車輛")
+                    render_convoy_ranking(ranking)
+
+    # === 分頁 5: AI 智慧預測 ===
+    with tab5, profiling.stage("分頁：AI 預測"):
+        st.subheader("AI 軌跡預測")
+        predict_mode = st.radio("檢視方式", ["單一車輛", "全車隊看板"], horizontal=True, key="p_mode")
+
+        if predict_mode == "單一車輛":
+            current_time = datetime.now()
+            current_hour = current_time.hour
+            week_map_en = {0: '週一', 1: '週二', 2: '週三', 3: '週四', 4: '週五', 5: '週六', 6: '週日'}
+            current_week_zh = week_map_en[current_time.weekday()]
+        
+            c1, c2 = st.columns(2)
+            with c1: car_predict = st.selectbox("1. 選擇預測車輛", all_cars, key="p_car")
+            with c2:
+                current_loc = None
+                if car_predict:
+                    visited = engine.visited_locations(view, car_predict)
+                    current_loc = st.selectbox("2. 假設剛經過哪個地點？", visited, index=None, placeholder="打字或貼上...", key="p_loc")
+
+            if car_predict and current_loc:
+                st.markdown("---")
+                tier, stats, samples = engine.predict(view, car_predict, current_loc, current_time)
+
+                if tier == TIER_EXACT:
+                    st.success(f"🎯 精準鎖定：分析「{current_week_zh}」且時段相近 ({current_hour-3}:00~{current_hour+3}:00) 之紀錄")
+                elif tier == TIER_HOUR:
+                    st.success(f"🕒 時段鎖定：分析時段相近 ({current_hour-3}:00~{current_hour+3}:00) 之紀錄")
+                else:
+                    st.warning("⚠️ 當前時段樣本不足，改採全歷史數據分析。")
+
+                if samples.empty:
+                    st.warning("無歷史紀錄，無法預測。")
+                else:
+                    def show_pred(kind, title):
+                        st.subheader(title)
+                        data = stats[kind]
+                        if data.empty:
+                            st.info(f"無 {title} 資料")
+                            return
+
+                        kind_samples = samples[samples['種類'] == kind].sort_values(by='抵達', ascending=False)
+                        st.markdown("##### 詳細預測清單 (點擊展開)")
+                        for i, row in data.iterrows():
+                            loc, prob = row['目標地點'], row['機率']
+                            est = f"約 {int(row['平均秒數']//60)} 分鐘"
+                            panel_key = f"pred_{kind}_{car_predict}_{current_loc}_{loc}"
+                            panel = st.expander(f"【 {est} 】 {loc} (機率 {prob}%)", key=panel_key, on_change="rerun")
+                            with panel:
+                                if panel.open:
+                                    st.markdown(f'<span class="time-highlight">⏱️ 預估行駛：{est}</span>', unsafe_allow_html=True)
+                                    details = kind_samples[kind_samples['目標地點'] == loc]
+                                    render_paged_table(details, panel_key, formatter=fmt.arrival_table)
+
+                    show_pred(NEXT_STOP, "下一站預測 (Next Stop)")
+                    st.markdown("---")
+                    show_pred(FINAL_DEST, "最終目的地預測 (Final Destination)")
+        else:
+            st.markdown("依各車**最後一筆紀錄**的地點、星期與時段，一次預測所有車輛的下一站與預計抵達時間。")
+            c1, c2, c3 = st.columns(3)
+            with c1: board_kind = st.radio("預測目標", ["下一站", "最終目的地"], horizontal=True, key="b_kind")
+            with c2: board_top = st.slider("每台車顯示前幾名", 1, 5, 3, key="b_top")
+            with c3: board_cars = st.multiselect("車輛 (未選為全部)", all_cars, key="b_cars")
+            board = engine.prediction_board(view, NEXT_STOP if board_kind == "下一站" else FINAL_DEST,
+                                            board_top, board_cars or None)
+            if board.empty:
+                st.warning("無資料")
+            else:
+                # 資料庫或上傳資料更新 (含即時模式) 時頁面重新執行，看板隨之更新
+                st.caption(f"{board['車牌'].nunique()} 台車，最新紀錄 {board['最後時間'].max():%Y-%m-%d %H:%M:%S}；"
+                           f"新資料匯入後自動更新")
+                st.download_button("下載看板 (CSV)", board.to_csv(index=False).encode('utf-8-sig'),
+                                   file_name="預測看板.csv", mime="text/csv")
+                render_paged_table(board, "p_board", formatter=fmt.board_table)
+
+else:
+    st.info("請由左側選單匯入資料以開始分析")
+
+# --- 側邊欄：背景工作 (本 session 送出的工作與狀態) ---
+job_owner = st.session_state.get("job_owner")
+session_jobs = get_job_pool().jobs(job_owner) if job_owner else []
+if session_jobs:
+    with st.sidebar.expander("背景工作"):
+        for job in reversed(session_jobs):
+            progress = f" {job.progress:.0%}" if job.state == jobs.RUNNING else ""
+            st.caption(f"{job.submitted:%H:%M:%S} {job.label}：{job.state}{progress}，{job.elapsed:.1f} 秒")
+            if job.can_cancel and not job.cancel_requested and st.button("取消", key=f"job_list_cancel_{job.id}"):
+                job.cancel()
+
+# --- 側邊欄：效能紀錄 (本次執行各階段的耗時、筆數與記憶體) ---
+if stage_log is not None:
+    with st.sidebar.expander("效能紀錄"):
+        records = pd.DataFrame(stage_log.latest(), columns=profiling.RECORD_COLS)
+        if records.empty:
+            st.caption("本次執行沒有需要計算的階段 (皆使用快取)")
+        else:
+            total = records.loc[records['層級'] == 0, '秒數'].sum()
+            st.caption(f"第 {stage_log.run} 次執行，量測階段合計 {total:.2f} 秒")
+            records['階段'] = ["　" * depth + name for depth, name in zip(records['層級'], records['階段'])]
+            st.dataframe(records.drop(columns=['執行次', '層級']), hide_index=True)
+        st.download_button("下載本 session 紀錄 (JSON)", stage_log.to_json().encode('utf-8'),
+                           file_name="效能紀錄.json", mime="application/json", key="stage_log_json")
@@ -0,0 +1,42 @@
+from tracker import ingest, pipeline
+from tracker.index import PlateIndex
+
+BLANK_PLATES_CSV = """車牌,地點,日期,時間
+AAA-1,L1,2024/03/01,08:00:00
+AAA-1,L2,2024/03/01,09:00:00
+ZZZ-9,L1,2024/03/01,10:00:00
+ ,L3,2024/03/01,11:00:00
+,L4,2024/03/01,12:00:00
+ZZZ-9,,2024/03/01,13:00:00
+""".encode('utf-8')
+
+
+def _index(data):
+    frame, report = ingest.load_file('blank.csv', data)
+    frame, _ = pipeline.dedupe(frame)
+    return PlateIndex(pipeline.derive_columns(frame)), report
+
+
+def test_blank_plates_are_dropped():
+    index, report = _index(BLANK_PLATES_CSV)
+    assert report['blank_plates'] == 2
+    assert index.plates() == ['AAA-1', 'ZZZ-9']
+
+
+def test_blank_plates_do_not_overwrite_last_plate():
+    index, _ = _index(BLANK_PLATES_CSV)
+    rows = index.plate('ZZZ-9')
+    assert rows['車牌'].astype(str).tolist() == ['ZZZ-9', 'ZZZ-9']
+    assert rows['完整時間'].dt.hour.tolist() == [10, 13]
+    assert 'L3' not in index.plate_locations('ZZZ-9')
+    assert 'L4' not in index.plate_locations('ZZZ-9')
+
+
+def test_missing_codes_are_not_indexed():
+    # 未經 normalize_frame 的資料 (車牌 / 地點缺值) 也不能把缺值列算到最後一個車牌 / 地點
+    frame, _ = ingest.load_file('blank.csv', BLANK_PLATES_CSV)
+    frame = pipeline.derive_columns(frame)
+    frame.loc[len(frame) - 1, '車牌'] = None
+    index = PlateIndex(frame)
+    assert len(index.plate('ZZZ-9')) == 1
+    assert index.plate_locations('ZZZ-9') == ['L1']
@@ -0,0 +1 @@
+# 車輛軌跡分析：資料處理核心 (與 Streamlit 介面分離)
@@ -0,0 +1,187 @@
+import gc
+import os
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from . import engine, ingest, pipeline, synth, timeparse
+from .cube import CountCube
+from .home import HomeReport
+from .index import PlateIndex
+from .predict import NEXT_STOP, TransitionModel
+from .trips import TripTable
+from .views import MemoryView
+
+# --------------------------
+# 效能測試：以模擬資料逐一計時各處理階段並記錄峰值記憶體
+# 讀檔 (CSV utf-8 / big5、Excel) → 日期解析 → 標準化 → 去重 → 行程切分 → 索引
+# → 行程摘要 → 熱點查詢 → 居住地判讀 → 同夥比對 (分頁 4) → 軌跡預測 / 預測看板 (分頁 5)
+# --------------------------
+SIZES = {'10k': 10_000, '1m': 1_000_000, '10m': 10_000_000}
+# Excel 產生與讀取都很慢，超過此筆數的規模略過 Excel 讀檔
+XLSX_MAX_ROWS = 1_000_000
+# 查詢類階段抽樣的車牌數 (熱點 / 預測各查這些車牌)
+QUERY_PLATES = 20
+# 同夥比對選取的車牌數與容許誤差 (秒)
+CONTACT_PLATES = 20
+CONTACT_TOLERANCE_SEC = 300
+# 居住地判讀參數
+HOME_MIN_STAY, HOME_NIGHT_HR = 4, 20
+RESULT_COLS = ['規模', '階段', '秒數', '輸入筆數', '輸出筆數', '峰值記憶體 (MB)']
+
+
+def parse_size(text):
+    """'10k' / '1m' / '10m' 或整數字串 → 筆數。"""
+    text = text.strip().lower()
+    if text in SIZES:
+        return SIZES[text]
+    for suffix, unit in (('k', 1_000), ('m', 1_000_000)):
+        if text.endswith(suffix):
+            return int(float(text[:-1]) * unit)
+    return int(text)
+
+
+def dataset_files(rows, data_dir, seed=0):
+    """產生 (或沿用已產生的) 模擬資料檔，回傳 {格式: 路徑}。"""
+    os.makedirs(data_dir, exist_ok=True)
+    paths = {
+        'csv utf-8': os.path.join(data_dir, f"synth_{rows}_{seed}_utf8.csv"),
+        'csv big5': os.path.join(data_dir, f"synth_{rows}_{seed}_big5.csv"),
+    }
+    if rows <= XLSX_MAX_ROWS:
+        paths['xlsx'] = os.path.join(data_dir, f"synth_{rows}_{seed}.xlsx")
+    if all(os.path.exists(path) for path in paths.values()):
+        return paths
+
+    frame = synth.generate(rows, seed=seed)
+    synth.write_csv(frame, paths['csv utf-8'])
+    # big5 匯出檔多半使用民國日期
+    synth.write_csv(frame, paths['csv big5'], encoding='big5', date_style='roc')
+    if 'xlsx' in paths:
+        synth.write_xlsx(frame, paths['xlsx'])
+    return paths
+
+
+def _traced_peak(func, args):
+    # tracemalloc 會拖慢 Python 層的配置，因此另外執行一次只量記憶體
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = func(*args)
+        return result, tracemalloc.get_traced_memory()[1] / 1024 ** 2
+    finally:
+        tracemalloc.stop()
+
+
+class _Recorder:
+    def __init__(self, label, trace_memory):
+        self.label = label
+        self.trace_memory = trace_memory
+        self.results = []
+
+    def run(self, stage, rows_in, func, *args, rows_out=len):
+        """執行一個階段並記錄耗時、輸出筆數與峰值記憶體，回傳 func 的結果。
+
+        rows_out 由結果 (回傳 tuple 時取第一項) 算出輸出筆數。
+        """
+        gc.collect()
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        peak = np.nan
+        if self.trace_memory:
+            del result
+            result, peak = _traced_peak(func, args)
+        first = result[0] if isinstance(result, tuple) else result
+        self.results.append([self.label, stage, round(elapsed, 3), rows_in, rows_out(first), round(peak, 1)])
+        return result
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return ingest.read_upload(os.path.basename(path), f.read())
+
+
+def _hotspot_queries(df, plates):
+    cube = CountCube(df)
+    for plate in plates:
+        cube.place_counts(plate)
+        cube.hourly_days(plate)
+    return cube.cube
+
+
+def _trip_table(index):
+    return TripTable(index.df, index._plate_ranges).trips
+
+
+def _home_report(index):
+    return HomeReport(index.df, HOME_MIN_STAY, HOME_NIGHT_HR).summary()
+
+
+def _predictions(index, queries):
+    model = TransitionModel(index.df, index.trips())
+    for plate, location, weekday, hour in queries:
+        model.predict(plate, location, weekday, hour)
+    return queries
+
+
+def _board(index):
+    return engine._board(index.latest(), index.transitions(), NEXT_STOP, 3)
+
+
+def run_size(rows, data_dir, trace_memory=True, seed=0, on_progress=None):
+    """以 rows 筆模擬資料執行所有階段，回傳結果表 (RESULT_COLS)。"""
+    label = f"{rows:,}"
+    if on_progress is not None:
+        on_progress(f"{label}：準備模擬資料 ...")
+    paths = dataset_files(rows, data_dir, seed)
+    recorder = _Recorder(label, trace_memory)
+
+    def stage(name, rows_in, func, *args, **kwargs):
+        if on_progress is not None:
+            on_progress(f"{label}：{name} ...")
+        return recorder.run(name, rows_in, func, *args, **kwargs)
+
+    for fmt in ('csv big5', 'xlsx'):
+        if fmt in paths:
+            raw = stage(f"讀檔 ({fmt})", np.nan, _read, paths[fmt])
+            del raw
+    raw = stage("讀檔 (csv utf-8)", np.nan, _read, paths['csv utf-8'])
+    stage("日期解析", len(raw), timeparse.parse_timestamps, raw['日期'], raw['時間'])
+    frame, _ = stage("標準化", len(raw), pipeline.normalize_frame, raw, 'bench')
+    del raw
+    frame, _ = stage("去重", len(frame), pipeline.dedupe, frame)
+    df = stage("行程切分", len(frame), pipeline.derive_columns, frame)
+    del frame
+    index = stage("建立索引", len(df), PlateIndex, df, rows_out=lambda index: len(index.df))
+    stage("行程摘要", len(df), _trip_table, index)
+    # 預測階段只計自身，行程摘要先建好
+    index.trips()
+
+    rng = np.random.default_rng(seed)
+    plates = rng.choice(index.plates(), size=min(QUERY_PLATES, len(index.plates())), replace=False)
+    stage("熱點查詢", len(df), _hotspot_queries, df, plates)
+    stage("居住地判讀", len(df), _home_report, index)
+    picked = list(plates[:CONTACT_PLATES])
+    stage("同夥比對", len(df), engine.group_contacts, MemoryView(index), picked, CONTACT_TOLERANCE_SEC)
+    queries = []
+    for plate in plates:
+        rows_of_plate = index.plate(plate)
+        sighting = rows_of_plate.iloc[rng.integers(len(rows_of_plate))]
+        queries.append((plate, sighting['地點'], sighting['完整時間'].weekday(), sighting['Hour']))
+    stage("軌跡預測", len(df), _predictions, index, queries)
+    # 看板含建立轉移模型 (全部車牌的最後一筆一次查詢)
+    stage("預測看板", len(df), _board, index)
+    return pd.DataFrame(recorder.results, columns=RESULT_COLS).astype({'輸入筆數': 'Int64'})
+
+
+def run(sizes, data_dir, trace_memory=True, seed=0, on_progress=None):
+    """依序執行各規模的效能測試，回傳合併的結果表。
+
+    耗時為未追蹤記憶體時的執行時間；trace_memory 為 True 時每個階段另以 tracemalloc
+    再執行一次量測峰值記憶體 (含 numpy / pandas 配置，不含 Arrow 緩衝區)。
+    """
+    return pd.concat([run_size(rows, data_dir, trace_memory, seed, on_progress) for rows in sizes],
+                     ignore_index=True)
@@ -0,0 +1,283 @@
+import codecs
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+from . import ingest, pipeline, profiling
+from .fingerprints import FingerprintSet
+
+# --------------------------
+# 大型檔案匯入 (超過記憶體)
+# 1. 分塊讀檔、標準化，先以資料指紋濾掉資料庫已有 / 本次已讀過的列，
+#    每塊依 (車牌, 完整時間, 雜湊) 排序、塊內去重後寫成暫存 run 檔
+# 2. 所有 run 以向量化的多路合併輸出全域 (車牌, 完整時間) 順序，合併時以雜湊去除跨塊重複
+# 3. 合併結果逐車牌寫入本地資料庫，衍生欄位由資料庫讀取時逐車牌計算
+# 任何時刻記憶體內只有一個分塊、各 run 的一個 batch 與一個車牌的資料
+# --------------------------
+# run 檔的 record batch 列數 (合併時每個 run 一次讀入一個 batch)
+RUN_BATCH_ROWS = 64 * 1024
+# 計算檔案雜湊 / 檢查編碼時每次讀取的位元組數
+SCAN_BLOCK_BYTES = 4 * 1024 * 1024
+RUN_SCHEMA = pa.schema([
+    ('車牌', pa.string()),
+    ('地點', pa.string()),
+    ('完整時間', pa.timestamp('ns')),
+    ('雜湊', pa.uint64()),
+])
+
+
+def expand_paths(entries):
+    """將檔案 / 資料夾路徑展開為 CSV 與 Excel 檔案清單 (資料夾不含子資料夾)。"""
+    paths = []
+    for entry in entries:
+        entry = entry.strip()
+        if os.path.isdir(entry):
+            paths += sorted(os.path.join(entry, name) for name in os.listdir(entry)
+                            if name.endswith(ingest.SUPPORTED_EXTENSIONS))
+        elif os.path.isfile(entry) and entry.endswith(ingest.SUPPORTED_EXTENSIONS):
+            paths.append(entry)
+    return paths
+
+
+def scan_file(path):
+    """讀過整個檔案一次，回傳 (內容雜湊, CSV 編碼)。
+
+    雜湊與上傳檔案的 content_hash 相同，可用來判斷資料庫是否已匯入；
+    編碼以整檔 (而非檔頭樣本) 檢查 UTF-8，避免分塊讀到一半才發現編碼錯誤。
+    """
+    digest = hashlib.sha1()
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    encoding = 'utf-8'
+    with open(path, 'rb') as f:
+        head = f.read(len(codecs.BOM_UTF8))
+        if head == codecs.BOM_UTF8:
+            encoding = 'utf-8-sig'
+        block = head
+        while block:
+            digest.update(block)
+            if encoding == 'utf-8':
+                try:
+                    decoder.decode(block, final=False)
+                except UnicodeDecodeError:
+                    encoding = ingest.FALLBACK_ENCODING
+            block = f.read(SCAN_BLOCK_BYTES)
+    return digest.hexdigest(), encoding
+
+
+def _sort_dedupe(plate_codes, micros, hashes):
+    """依 (車牌, 時間, 雜湊) 排序並去除相鄰重複，回傳 (保留列的排序位置, 移除筆數)。"""
+    order = np.lexsort((hashes, micros, plate_codes))
+    p, t, h = plate_codes[order], micros[order], hashes[order]
+    dup = np.r_[False, (p[1:] == p[:-1]) & (t[1:] == t[:-1]) & (h[1:] == h[:-1])]
+    return order[~dup], int(dup.sum())
+
+
+class ExternalSorter:
+    """外部合併排序：分塊寫入排序好的 run 檔，再合併成全域有序、去重的資料流。"""
+
+    def __init__(self, tmp_dir):
+        self.tmp_dir = tmp_dir
+        self.runs = []
+        self.plates = set()
+        self.removed = 0
+
+    def add(self, frame, hashes=None):
+        """加入一塊已標準化的資料 (車牌 / 地點 / 完整時間)，hashes 為已算好的資料列指紋。"""
+        if frame.empty:
+            return
+        if hashes is None:
+            hashes = pipeline.row_hashes(frame)
+        micros = frame['完整時間'].to_numpy().astype(np.int64)
+        codes = frame['車牌'].cat.codes.to_numpy()
+        keep, removed = _sort_dedupe(codes, micros, hashes)
+        self.removed += removed
+        self.plates.update(frame['車牌'].cat.categories)
+
+        table = pa.table({
+            '車牌': pa.array(frame['車牌'].astype(str).to_numpy()[keep]),
+            '地點': pa.array(frame['地點'].astype(str).to_numpy()[keep]),
+            '完整時間': pa.array(frame['完整時間'].to_numpy()[keep], type=pa.timestamp('ns')),
+            '雜湊': pa.array(hashes[keep], type=pa.uint64()),
+        }, schema=RUN_SCHEMA)
+        path = os.path.join(self.tmp_dir, f"run{len(self.runs):05d}.arrow")
+        with ipc.new_file(path, RUN_SCHEMA) as writer:
+            writer.write_table(table, max_chunksize=RUN_BATCH_ROWS)
+        self.runs.append(path)
+
+    def merged(self):
+        """依全域 (車牌, 完整時間) 順序逐塊產生去重後的資料。"""
+        plates = pd.Index(sorted(self.plates))
+        cursors = [_RunCursor(path, plates) for path in self.runs]
+        while True:
+            cursors = [c for c in cursors if not c.done]
+            if not cursors:
+                return
+            pending = [c for c in cursors if not c.exhausted]
+            if pending:
+                # 尚有未讀 batch 的 run 中，緩衝區最後一筆的最小鍵值為本輪上限；
+                # 只輸出嚴格小於上限的列，確保同一 (車牌, 時間) 的列都在同一塊
+                cutoff = min(c.last_key() for c in pending)
+                parts = [c.take_before(cutoff) for c in cursors]
+                if not any(len(p[0]) for p in parts):
+                    for c in pending:
+                        if c.last_key() == cutoff:
+                            c.extend()
+                    continue
+            else:
+                parts = [c.take_all() for c in cursors]
+
+            codes, micros, hashes, locs = (np.concatenate(col) for col in zip(*parts))
+            keep, removed = _sort_dedupe(codes, micros, hashes)
+            self.removed += removed
+            yield pd.DataFrame({
+                '車牌': pd.Categorical.from_codes(codes[keep], categories=plates),
+                '地點': pd.Categorical(locs[keep]),
+                '完整時間': micros[keep].astype('datetime64[ns]'),
+            })
+
+
+class _RunCursor:
+    """逐 batch 讀取單一 run 檔，緩衝區內保持 (車牌, 時間) 遞增。"""
+
+    def __init__(self, path, plates):
+        self._source = pa.memory_map(path)
+        self._reader = ipc.open_file(self._source)
+        self._plates = plates
+        self._next = 0
+        self._buffer = [np.array([], dtype=np.int64)] * 3 + [np.array([], dtype=object)]
+        self.extend()
+
+    @property
+    def exhausted(self):
+        return self._next >= self._reader.num_record_batches
+
+    @property
+    def done(self):
+        return self.exhausted and not len(self._buffer[0])
+
+    def extend(self):
+        if self.exhausted:
+            return
+        batch = self._reader.get_batch(self._next)
+        self._next += 1
+        plates = self._plates.get_indexer(batch.column('車牌').to_numpy(zero_copy_only=False))
+        micros = batch.column('完整時間').to_numpy().astype(np.int64)
+        hashes = batch.column('雜湊').to_numpy()
+        locs = batch.column('地點').to_numpy(zero_copy_only=False)
+        self._buffer = [np.concatenate([old, new]) for old, new in
+                        zip(self._buffer, (plates.astype(np.int64), micros, hashes.view(np.int64), locs))]
+        if self.exhausted:
+            self._source.close()
+
+    def last_key(self):
+        if not len(self._buffer[0]):
+            self.extend()
+        return self._buffer[0][-1], self._buffer[1][-1]
+
+    def _take(self, n):
+        taken = [col[:n] for col in self._buffer]
+        self._buffer = [col[n:] for col in self._buffer]
+        if not len(self._buffer[0]):
+            self.extend()
+        return taken
+
+    def take_before(self, cutoff):
+        codes, micros = self._buffer[0], self._buffer[1]
+        before = (codes < cutoff[0]) | ((codes == cutoff[0]) & (micros < cutoff[1]))
+        return self._take(int(before.sum()))
+
+    def take_all(self):
+        return self._take(len(self._buffer[0]))
+
+
+def iter_plates(blocks):
+    """將依 (車牌, 完整時間) 排序的資料塊切成 (車牌, 該車牌全部資料)。"""
+    carry = None
+    for block in blocks:
+        if carry is not None:
+            block = pipeline.concat_frames([carry, block])
+        codes = block['車牌'].cat.codes.to_numpy()
+        starts = np.r_[0, np.flatnonzero(codes[1:] != codes[:-1]) + 1]
+        # 最後一個車牌可能延續到下一塊，先保留
+        for s, e in zip(starts[:-1], starts[1:]):
+            yield block['車牌'].iat[s], block.iloc[s:e]
+        carry = block.iloc[starts[-1]:]
+    if carry is not None and len(carry):
+        yield carry['車牌'].iat[0], carry
+
+
+@profiling.measured("大型檔案匯入", rows_in=lambda paths, *args, **kwargs: None, rows_out=None)
+def ingest_paths(paths, store, chunk_rows=ingest.CHUNK_ROWS, tmp_dir=None, on_progress=None,
+                 sidecar_dir=None):
+    """分塊匯入本機檔案至本地資料庫，回傳匯入統計。
+
+    已匯入過 (內容雜湊相同) 的檔案會略過；Excel 的解析結果存於 sidecar_dir。統計欄位：files (各檔解析報告，
+    含 new_rows / known_rows：新資料與資料庫已有或先前檔案已出現的筆數)、skipped (略過的檔名)、
+    rows (新增後資料庫寫入的列數)、removed (重複而略過的筆數)。
+    """
+    def progress(text):
+        if on_progress is not None:
+            on_progress(text)
+
+    stats = {'files': [], 'skipped': [], 'rows': 0, 'removed': 0}
+    sources, source_stats = [], {}
+    stored_removed = 0
+    # 本次已讀入的資料列指紋，先出現的檔案優先
+    seen = FingerprintSet()
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as work_dir:
+        sorter = ExternalSorter(work_dir)
+        for path in paths:
+            name = os.path.basename(path)
+            progress(f"檢查 {name} ...")
+            digest, encoding = scan_file(path)
+            if store.has_sources([digest]) or digest in sources:
+                stats['skipped'].append(name)
+                continue
+            sources.append(digest)
+
+            report = {'name': name, 'rows': 0, 'bad_rows': 0, 'bad_samples': [], 'blank_plates': 0,
+                      'new_rows': 0, 'known_rows': 0}
+            formats = None
+            chunks = ingest.read_chunks(path, encoding, chunk_rows, ingest.sidecar_path(sidecar_dir, digest))
+            for n, raw in enumerate(chunks, start=1):
+                progress(f"讀取 {name} 第 {n} 塊 ...")
+                frame, chunk_report = pipeline.normalize_frame(raw, name, formats)
+                # 同一檔案沿用第一塊判斷出的日期 / 時間格式
+                formats = {'date': chunk_report['date_format'], 'time': chunk_report['time_format']}
+                report.update(date_format=formats['date'], time_format=formats['time'])
+                report['rows'] += len(frame)
+                report['bad_rows'] += chunk_report['bad_rows']
+                room = pipeline.BAD_SAMPLE_ROWS - len(report['bad_samples'])
+                report['bad_samples'] += chunk_report['bad_samples'][:room]
+                report['blank_plates'] += chunk_report['blank_plates']
+
+                hashes = pipeline.row_hashes(frame)
+                fresh = store.fingerprints.fresh_mask(hashes) & ~seen.contains(hashes)
+                seen.add(hashes[fresh])
+                report['new_rows'] += int(fresh.sum())
+                report['known_rows'] += len(frame) - int(fresh.sum())
+                sorter.add(frame[fresh], hashes[fresh])
+            stats['files'].append(report)
+            source_stats[digest] = {'rows': report['rows'], 'new': report['new_rows'],
+                                    'known': report['known_rows']}
+
+        if sorter.runs:
+            progress("合併排序並寫入本地資料庫 ...")
+
+            def counted(parts):
+                for plate, part in parts:
+                    stats['rows'] += len(part)
+                    yield plate, part
+
+            stored_removed = store.write_plates(counted(iter_plates(sorter.merged())), sources, source_stats)
+            stats['rows'] -= stored_removed
+        elif sources:
+            stored_removed = store.write_plates([], sources, source_stats)
+        known = sum(report['known_rows'] for report in stats['files'])
+        stats['removed'] = known + sorter.removed + stored_removed
+    return stats
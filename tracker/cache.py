@@ -0,0 +1,192 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures.process import BrokenProcessPool
+
+from . import ingest, pipeline, profiling
+from .index import PlateIndex
+
+
+def content_hash(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def frame_nbytes(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class LRUFrameCache:
+    """依記憶體用量 (bytes) 淘汰最久未使用項目的快取，可跨 session 共用。
+
+    nbytes 可為函式 (例如 PlateIndex.nbytes)：項目取出後可能再建立衍生結果而變大，
+    取出過的項目在下一次 put() 或 refresh() 時重新量測，超過上限則淘汰。
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._items = OrderedDict()
+        self._sizers = {}
+        self._touched = set()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            if key in self._sizers:
+                self._touched.add(key)
+            return self._items[key][0]
+
+    def put(self, key, value, nbytes):
+        with self._lock:
+            self._remeasure()
+            if key in self._items:
+                self.total_bytes -= self._items.pop(key)[1]
+                self._sizers.pop(key, None)
+            sizer = nbytes if callable(nbytes) else None
+            nbytes = sizer() if sizer is not None else nbytes
+            if nbytes > self.max_bytes:
+                self._evict()
+                return
+            self._items[key] = (value, nbytes)
+            if sizer is not None:
+                self._sizers[key] = sizer
+            self.total_bytes += nbytes
+            self._evict()
+
+    def refresh(self):
+        """重新量測取出過的項目並淘汰至上限內。"""
+        with self._lock:
+            self._remeasure()
+            self._evict()
+
+    def _remeasure(self):
+        for key in self._touched:
+            if key in self._items:
+                value, old = self._items[key]
+                new = self._sizers[key]()
+                self._items[key] = (value, new)
+                self.total_bytes += new - old
+        self._touched.clear()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self._items:
+            key, (_, evicted) = self._items.popitem(last=False)
+            self._sizers.pop(key, None)
+            self.total_bytes -= evicted
+
+    def keys(self):
+        with self._lock:
+            return list(self._items.keys())
+
+    def __len__(self):
+        return len(self._items)
+
+
+class DatasetCache:
+    """以上傳檔案內容雜湊為鍵，快取讀檔結果與衍生完成的資料集。
+
+    新增檔案時，若已有其子集合的資料集在快取中，只讀取並併入新檔案，
+    行程摘要也只重新切分有新資料的車牌。
+    make_pool 為建立讀檔行程池的函式 (None 則在本行程讀檔)，子行程異常結束 (例如記憶體不足) 時據此重建；
+    sidecar_dir 為 Excel 解析結果附檔的目錄 (跨重新啟動保留)。
+    """
+
+    def __init__(self, max_bytes, make_pool=None, sidecar_dir=None):
+        self.store = LRUFrameCache(max_bytes)
+        self.make_pool = make_pool
+        self.pool = make_pool() if make_pool is not None else None
+        self.sidecar_dir = sidecar_dir
+        self._pool_lock = threading.Lock()
+
+    def _replace_pool(self, broken):
+        # 行程池一旦有子行程異常結束就無法再使用，換一個新的 (其他 session 可能已先換過)
+        with self._pool_lock:
+            if self.pool is broken:
+                broken.shutdown(wait=False, cancel_futures=True)
+                self.pool = self.make_pool()
+
+    def _parse(self, files):
+        pool = self.pool
+        try:
+            return ingest.load_files(files, pool=pool, sidecar_dir=self.sidecar_dir)
+        except BrokenProcessPool:
+            self._replace_pool(pool)
+        # 重試一次；同一批檔案再次讓子行程異常結束時，換上新的行程池後回報錯誤，不影響之後的上傳
+        pool = self.pool
+        try:
+            return ingest.load_files(files, pool=pool, sidecar_dir=self.sidecar_dir)
+        except BrokenProcessPool as e:
+            self._replace_pool(pool)
+            names = "、".join(name for name, _ in files)
+            raise ingest.FileReadError(f"{names}: 讀檔子行程異常結束 (可能記憶體不足)") from e
+
+    def _load_files(self, files, digests):
+        """讀取尚未快取的檔案 (平行處理)，依原順序回傳各檔 (資料, 讀檔報告)。"""
+        frames = {digest: self.store.get(('file', digest)) for digest in digests}
+        missing = {digest: (name, data) for (name, data), digest in zip(files, digests)
+                   if frames[digest] is None}
+        if missing:
+            with profiling.stage("平行讀檔", detail=f"{len(missing)} 個檔案") as record:
+                parsed = self._parse(list(missing.values()))
+                for _, report in parsed:
+                    profiling.extend(report['stages'])
+                record['輸出筆數'] = sum(len(frame) for frame, _ in parsed)
+            for digest, (frame, report) in zip(missing, parsed):
+                self.store.put(('file', digest), (frame, report), frame_nbytes(frame))
+                frames[digest] = (frame, report)
+        return [frames[digest] for digest in dict.fromkeys(digests)]
+
+    def file_frames(self, files, digests):
+        """各檔 (內容雜湊, 標準化資料)，依 files 順序且不重複 (讀檔結果取自快取)。"""
+        loaded = self._load_files(files, digests)
+        return [(digest, frame) for digest, (frame, _) in zip(dict.fromkeys(digests), loaded)]
+
+    def _best_base(self, digests):
+        wanted = set(digests)
+        best = None
+        for key in self.store.keys():
+            if key[0] != 'dataset':
+                continue
+            keyset = set(key[1])
+            if keyset < wanted and (best is None or len(keyset) > len(best[1])):
+                best = key
+        return best
+
+    def load(self, files):
+        """files 為 [(檔名, 位元組內容)]，回傳 (資料集索引, 統計資訊)。"""
+        digests = tuple(content_hash(data) for _, data in files)
+        key = ('dataset', digests)
+        # 上一次取出的資料集可能已建立行程摘要、轉移模型等衍生結果，先重新計入用量
+        self.store.refresh()
+        cached = self.store.get(key)
+        if cached is not None:
+            return cached
+
+        base_key = self._best_base(digests)
+        base = self.store.get(base_key) if base_key else None
+        changed = None
+        if base is not None:
+            base_index, base_stats = base
+            known = set(base_key[1])
+            new_files = [(f, d) for f, d in zip(files, digests) if d not in known]
+            loaded = self._load_files(*zip(*new_files))
+            new_rows = pipeline.concat_frames(frame for frame, _ in loaded)
+            df, removed = pipeline.merge_new_rows(base_index.df, new_rows)
+            changed = new_rows['車牌'].unique()
+            removed += base_stats['removed']
+            reports = base_stats['files'] + [report for _, report in loaded]
+        else:
+            loaded = self._load_files(files, digests)
+            df, removed = pipeline.build_dataset(frame for frame, _ in loaded)
+            reports = [report for _, report in loaded]
+
+        stats = {'removed': removed, 'rows': len(df), 'digests': digests, 'files': reports,
+                 'raw_bytes': sum(r['raw_bytes'] for r in reports), 'bytes': frame_nbytes(df)}
+        index = PlateIndex(df)
+        if changed is not None:
+            index.inherit(base_index, changed)
+        self.store.put(key, (index, stats), index.nbytes)
+        return index, stats
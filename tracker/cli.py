@@ -0,0 +1,214 @@
+import argparse
+import os
+import sys
+import tempfile
+
+from . import bench, bulk, engine, geo, ingest, pipeline, synth
+from .predict import FINAL_DEST, NEXT_STOP
+from .store import TrackStore
+from .trips import DWELL_SPLIT_SEC, GAP_SPLIT_SEC
+
+# --------------------------
+# 命令列介面 (批次作業，不需開啟網頁)
+#   python -m tracker ingest 路徑 ...               匯入本地資料庫
+#   python -m tracker hotspots -o 熱點.csv          各車牌地點排名
+#   python -m tracker trips -o 行程.csv             行程切分結果
+#   python -m tracker homes -o 落腳點.csv           全車隊過夜地點
+#   python -m tracker transitions -o 轉移.csv       各地點下一站 / 最終目的地機率
+#   python -m tracker contacts -o 接觸.csv          車牌之間的接觸紀錄
+#       (hotspots / homes / contacts 加上 --catalog 位置表.csv --radius 150 則鄰近地點視為同一地點)
+#   python -m tracker convoys -o 同行車.csv         同行車探勘排名
+#   python -m tracker board -o 看板.csv             各車牌最後一筆的下一站預測看板
+#   python -m tracker synth -o 模擬.csv --rows 1m   產生模擬資料
+#   python -m tracker bench --sizes 10k 1m 10m      各處理階段效能測試
+# --------------------------
+
+
+def _progress(text):
+    print(text, file=sys.stderr, flush=True)
+
+
+def _plate_progress(kind):
+    def report(done, total):
+        _progress(f"{kind}: {done} / {total} 車牌")
+    return report
+
+
+def _run_ingest(args):
+    paths = bulk.expand_paths(args.paths)
+    if not paths:
+        raise SystemExit("找不到 CSV / Excel 檔案")
+    stats = bulk.ingest_paths(paths, TrackStore(args.store), sidecar_dir=args.sidecar_dir,
+                              on_progress=_progress)
+    for report in stats['files']:
+        _progress(f"{report['name']}：新資料 {report['new_rows']} 筆，資料庫已有 {report['known_rows']} 筆")
+        if report['bad_rows'] > 0:
+            _progress(f"{report['name']}：{report['bad_rows']} 筆日期/時間無法解析，已略過")
+        if report['blank_plates'] > 0:
+            _progress(f"{report['name']}：{report['blank_plates']} 筆車牌空白，已略過")
+    if stats['skipped']:
+        _progress("已匯入過，略過：" + "、".join(stats['skipped']))
+    print(f"已寫入 {stats['rows']} 筆，過濾重複 {stats['removed']} 筆")
+
+
+def _proximity(args):
+    # 未指定位置表或半徑為 0 時，地點名稱須完全相同
+    if not args.catalog or args.radius <= 0:
+        return None
+    return geo.load_catalog(args.catalog).within(args.radius)
+
+
+def _run_plate_report(args):
+    params = {}
+    if args.command in ('trips', 'transitions'):
+        params['rules'] = (args.dwell_minutes * 60, args.gap_hours * 3600)
+    if args.command in ('hotspots', 'homes'):
+        params['proximity'] = _proximity(args)
+    if args.command == 'homes':
+        params.update(min_stay=args.min_stay, night_hr=args.night_hour)
+    report = engine.plate_report(args.store, args.command, params, plates=args.plates,
+                                 start=args.start, end=args.end, pool=engine.make_pool(args.workers),
+                                 on_progress=_plate_progress(args.command))
+    engine.write_table(report, args.output)
+    print(f"{args.output}：{len(report)} 筆")
+
+
+def _run_contacts(args):
+    contacts = engine.fleet_contacts(args.store, args.tolerance * 60, plates=args.plates,
+                                     start=args.start, end=args.end, pool=engine.make_pool(args.workers),
+                                     proximity=_proximity(args))
+    engine.write_table(contacts, args.output)
+    print(f"{args.output}：{len(contacts)} 筆")
+
+
+def _run_convoys(args):
+    ranking = engine.fleet_convoys(args.store, args.tolerance * 60, target=args.target,
+                                   min_locations=args.min_locations, start=args.start, end=args.end,
+                                   on_progress=lambda done: _progress(f"convoys: {done:.0%}"))
+    engine.write_table(ranking, args.output)
+    print(f"{args.output}：{len(ranking)} 組")
+
+
+def _run_board(args):
+    board = engine.fleet_board(args.store, args.kind, args.top, plates=args.plates, start=args.start,
+                               end=args.end, rules=(args.dwell_minutes * 60, args.gap_hours * 3600))
+    engine.write_table(board, args.output)
+    print(f"{args.output}：{board['車牌'].nunique()} 台車，{len(board)} 筆")
+
+
+def _run_synth(args):
+    frame = synth.generate(bench.parse_size(args.rows), plates=args.plates, locations=args.locations,
+                           days=args.days, start=args.start, commuter_share=args.commuter_share,
+                           overnight_share=args.overnight_share, duplicate_rate=args.duplicate_rate,
+                           seed=args.seed)
+    if args.output.endswith('.xlsx'):
+        synth.write_xlsx(frame, args.output, date_style=args.date_style)
+    else:
+        synth.write_csv(frame, args.output, encoding=args.encoding, date_style=args.date_style)
+    print(f"{args.output}：{len(frame)} 筆")
+
+
+def _run_bench(args):
+    results = bench.run([bench.parse_size(size) for size in args.sizes], args.data_dir,
+                        trace_memory=not args.no_memory, seed=args.seed, on_progress=_progress)
+    print(results.to_string(index=False))
+    if args.json:
+        results.to_json(args.json, orient='records', force_ascii=False, indent=2)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m tracker", description="車輛軌跡分析 (批次作業)")
+    parser.add_argument("--store", default=engine.STORE_DIR, help="本地資料庫目錄 (預設 %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("ingest", help="分塊匯入 CSV / Excel 檔案或資料夾至本地資料庫")
+    p.add_argument("paths", nargs="+", help="檔案或資料夾路徑")
+    p.add_argument("--sidecar-dir", default=engine.SIDECAR_DIR, help="Excel 解析結果附檔目錄")
+    p.set_defaults(run=_run_ingest)
+
+    # 查詢類指令的共同參數
+    query = argparse.ArgumentParser(add_help=False)
+    query.add_argument("-o", "--output", required=True, help="輸出檔案 (.csv 或 .parquet)")
+    query.add_argument("--start", help="起始日期 YYYY-MM-DD")
+    query.add_argument("--end", help="結束日期 YYYY-MM-DD")
+    query.add_argument("--workers", type=int, default=None, help="平行行程數 (預設為 CPU 核心數，1 為不平行)")
+
+    plates = argparse.ArgumentParser(add_help=False)
+    plates.add_argument("--plates", nargs="+", help="只處理這些車牌 (預設為全部)")
+
+    # 行程切分門檻
+    rules = argparse.ArgumentParser(add_help=False)
+    rules.add_argument("--dwell-minutes", type=float, default=DWELL_SPLIT_SEC / 60,
+                       help="停留達此分鐘數即切為新行程 (預設 %(default)g)")
+    rules.add_argument("--gap-hours", type=float, default=GAP_SPLIT_SEC / 3600,
+                       help="相隔超過此時數即切為新行程 (預設 %(default)g)")
+
+    # 監視器位置表：半徑內的鄰近地點視為同一地點
+    nearby = argparse.ArgumentParser(add_help=False)
+    nearby.add_argument("--catalog", help="監視器位置表 (CSV / Excel，欄位 地點、緯度、經度)")
+    nearby.add_argument("--radius", type=float, default=150, help="鄰近半徑 (公尺，預設 %(default)g)")
+
+    p = commands.add_parser("hotspots", parents=[query, plates, nearby], help="各車牌地點造訪次數排名")
+    p.set_defaults(run=_run_plate_report)
+
+    for name, text in [("trips", "各車牌行程 (出發 / 抵達地點與時間)"),
+                       ("transitions", "各車牌、地點的下一站與最終目的地機率 (全歷史)")]:
+        p = commands.add_parser(name, parents=[query, plates, rules], help=text)
+        p.set_defaults(run=_run_plate_report)
+
+    p = commands.add_parser("homes", parents=[query, plates, nearby],
+                            help="全車隊過夜地點 (推測落腳點)")
+    p.add_argument("--min-stay", type=int, default=4, help="最小停留時數 (預設 %(default)s)")
+    p.add_argument("--night-hour", type=int, default=20, help="夜間時段起始 (時，預設 %(default)s)")
+    p.set_defaults(run=_run_plate_report)
+
+    p = commands.add_parser("contacts", parents=[query, plates, nearby], help="車牌之間的接觸紀錄")
+    p.add_argument("--tolerance", type=int, default=5, help="時間容許誤差 (分鐘，預設 %(default)s)")
+    p.set_defaults(run=_run_contacts)
+
+    p = commands.add_parser("convoys", parents=[query], help="同行車探勘 (連續兩站同時出現)")
+    p.add_argument("--tolerance", type=int, default=5, help="時間容許誤差 (分鐘，預設 %(default)s)")
+    p.add_argument("--target", help="目標車牌 (預設為全車隊)")
+    p.add_argument("--min-locations", type=int, default=2, help="最少共同地點數 (預設 %(default)s)")
+    p.set_defaults(run=_run_convoys)
+
+    p = commands.add_parser("board", parents=[query, plates, rules],
+                            help="預測看板 (各車牌依最後一筆紀錄預測前幾名下一站與預計抵達)")
+    p.add_argument("--top", type=int, default=3, help="每台車列出前幾名 (預設 %(default)s)")
+    p.add_argument("--kind", default=NEXT_STOP, choices=[NEXT_STOP, FINAL_DEST], help="預測目標 (預設 %(default)s)")
+    p.set_defaults(run=_run_board)
+
+    p = commands.add_parser("synth", help="產生模擬車牌辨識資料 (CSV 或 Excel)")
+    p.add_argument("-o", "--output", required=True, help="輸出檔案 (.csv 或 .xlsx)")
+    p.add_argument("--rows", default="10k", help="筆數，可用 10k / 1m 等寫法 (預設 %(default)s)")
+    p.add_argument("--plates", type=int, default=None, help="車牌數 (預設依筆數推算)")
+    p.add_argument("--locations", type=int, default=200, help="地點數 (預設 %(default)s)")
+    p.add_argument("--days", type=int, default=30, help="天數 (預設 %(default)s)")
+    p.add_argument("--start", default="2024-03-01", help="起始日期 (預設 %(default)s)")
+    p.add_argument("--commuter-share", type=float, default=0.5, help="通勤車輛比例 (預設 %(default)s)")
+    p.add_argument("--overnight-share", type=float, default=0.3, help="固定過夜車輛比例 (預設 %(default)s)")
+    p.add_argument("--duplicate-rate", type=float, default=0.01, help="重複列比例 (預設 %(default)s)")
+    p.add_argument("--encoding", default="utf-8", choices=["utf-8", "utf-8-sig", "big5"], help="CSV 編碼")
+    p.add_argument("--date-style", default="slash", choices=["slash", "iso", "roc"], help="日期寫法")
+    p.add_argument("--seed", type=int, default=0, help="亂數種子")
+    p.set_defaults(run=_run_synth)
+
+    p = commands.add_parser("bench", help="以模擬資料測試各處理階段的耗時與記憶體")
+    p.add_argument("--sizes", nargs="+", default=["10k", "1m"], help="資料規模 (預設 %(default)s)")
+    p.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "tracker_bench"),
+                   help="模擬資料存放目錄，已產生的檔案會沿用 (預設 %(default)s)")
+    p.add_argument("--json", help="另存結果為 JSON")
+    p.add_argument("--no-memory", action="store_true", help="不量測記憶體 (每個階段只執行一次)")
+    p.add_argument("--seed", type=int, default=0, help="亂數種子")
+    p.set_defaults(run=_run_bench)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        args.run(args)
+    except (ingest.FileReadError, pipeline.MissingColumnsError) as e:
+        raise SystemExit(f"匯入失敗: {e}")
+    except geo.CatalogError as e:
+        raise SystemExit(f"位置表讀取失敗: {e}")
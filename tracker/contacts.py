@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+from .profiling import measured
+
+# --------------------------
+# 同夥比對：依 (地點, 完整時間) 排序後以時間窗掃描
+# 所有車輛一次處理，成本與窗內配對數成正比，不做兩兩車輛的笛卡兒合併
+# 指定鄰近索引 (geo.Proximity) 時，每筆另複製到序號較小的鄰近地點時間軸上，
+# 同一次掃描即可找出相鄰監視器之間的接觸
+# --------------------------
+CONTACT_COLS = ['地點', '車輛 1', '完整時間 1', '車輛 2', '完整時間 2', '秒差']
+# 鄰近比對另加的欄位
+NEARBY_COLS = ['地點 2', '距離 (公尺)']
+
+
+def _expand_ranges(lo, hi):
+    """將每個 i 展開為 (i, lo[i]) ... (i, hi[i] - 1) 的配對，回傳 (左索引, 右索引)。"""
+    counts = hi - lo
+    left = np.repeat(np.arange(len(lo)), counts)
+    step = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+    return left, lo[left] + step
+
+
+def _window_pairs(key, width):
+    """key 已遞增排序；回傳所有 i < j 且 key[j] - key[i] <= width 的 (i, j)。"""
+    idx = np.arange(len(key))
+    return _expand_ranges(idx + 1, np.searchsorted(key, key + width, side='right'))
+
+
+@measured("同夥比對")
+def find_contacts(rows, plates, tolerance_sec, proximity=None):
+    """找出 plates 之間於同一地點、時間差不超過 tolerance_sec 秒的所有接觸。
+
+    rows 需包含 車牌 / 地點 / 完整時間；車輛 1 / 車輛 2 依 plates 的順序排列。
+    指定 proximity 時半徑內的鄰近地點也算同一地點，結果另含 地點 2 (車輛 2 所在) 與距離。
+    """
+    columns = CONTACT_COLS + (NEARBY_COLS if proximity is not None else [])
+    rank = {plate: i for i, plate in enumerate(plates)}
+    rows = rows[rows['車牌'].isin(list(rank))]
+    if rows.empty:
+        return pd.DataFrame(columns=columns)
+
+    loc_codes, loc_names = pd.factorize(rows['地點'])
+    plate_rank = rows['車牌'].map(rank).to_numpy(dtype=np.int64)
+    micros = rows['完整時間'].to_numpy().astype('datetime64[us]').astype(np.int64)
+    source = np.arange(len(rows))
+    dist = np.zeros(len(rows))
+    copied = np.zeros(len(rows), dtype=bool)
+
+    if proximity is not None:
+        # 時間軸代號：位置表內的地點用其序號，其餘地點排在後面
+        catalog_codes = proximity.catalog.codes(loc_names)
+        n = len(proximity.catalog)
+        place_of = np.where(catalog_codes >= 0, catalog_codes, n + np.arange(len(loc_names)))
+        places = place_of[loc_codes]
+        ptr, nbr, nbr_dist = proximity.lower
+        in_catalog = catalog_codes[loc_codes] >= 0
+        at = np.flatnonzero(in_catalog)
+        code = catalog_codes[loc_codes[at]]
+        row, k = _expand_ranges(ptr[code], ptr[code + 1])
+        row = at[row]
+        places = np.r_[places, nbr[k]]
+        source = np.r_[source, row]
+        dist = np.r_[dist, nbr_dist[k]]
+        copied = np.r_[copied, np.ones(len(row), dtype=bool)]
+        plate_rank, micros = plate_rank[source], micros[source]
+    else:
+        places = loc_codes
+
+    order = np.lexsort((micros, places))
+    places, plate_rank, micros = places[order], plate_rank[order], micros[order]
+    source, dist, copied = source[order], dist[order], copied[order]
+
+    # 各地點的時間軸依序接成一條遞增的 key，地點之間留出大於容許值的間隔，
+    # 使時間窗不會跨到下一個地點
+    width = int(tolerance_sec * 1_000_000)
+    starts = np.r_[0, np.flatnonzero(np.diff(places)) + 1]
+    group_min = micros[starts]
+    group_span = np.r_[micros[starts[1:] - 1], micros[-1]] - group_min
+    group_offset = np.r_[0, np.cumsum(group_span + width + 1)[:-1]]
+    sizes = np.diff(np.r_[starts, len(micros)])
+    key = micros - np.repeat(group_min - group_offset, sizes)
+
+    left, right = _window_pairs(key, width)
+    # 兩筆都是複製列的配對會在其中一筆的原地點另外找到
+    keep = (plate_rank[left] != plate_rank[right]) & ~(copied[left] & copied[right])
+    left, right = left[keep], right[keep]
+
+    # 讓 車輛 1 為選取順序在前者
+    swap = plate_rank[left] > plate_rank[right]
+    a = np.where(swap, right, left)
+    b = np.where(swap, left, right)
+
+    times = rows['完整時間'].to_numpy()[source]
+    actual = loc_codes[source]
+    plate_names = np.asarray(plates, dtype=object)
+    contacts = pd.DataFrame({
+        '地點': loc_names[actual[a]],
+        '車輛 1': plate_names[plate_rank[a]],
+        '完整時間 1': times[a],
+        '車輛 2': plate_names[plate_rank[b]],
+        '完整時間 2': times[b],
+        '秒差': np.abs(micros[a] - micros[b]) / 1_000_000,
+    })
+    if proximity is not None:
+        contacts['地點 2'] = loc_names[actual[b]]
+        contacts['距離 (公尺)'] = (dist[a] + dist[b]).round(1)
+    return contacts
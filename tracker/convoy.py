@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+
+from .contacts import _expand_ranges
+
+# --------------------------
+# 同行車探勘：不需事先指定嫌疑車輛，從整個資料表找出結伴移動的車牌
+# 只計算「連續共現」：兩車在同一地點時間相近，且下一站也是同一地點、時間相近，
+# 排除熱門路口的單次巧遇
+# --------------------------
+# 每批展開的候選配對上限，控制記憶體用量
+PAIR_BUDGET = 2_000_000
+# 累計結果的彙總鍵 (車輛 1, 車輛 2, 地點, 下一站, 車輛 1 的行程)
+LINK_KEYS = ['p1', 'p2', 'loc', 'next_loc', 'trip']
+RANKING_COLS = ['車輛 1', '車輛 2', '共同地點數', '共同行程數', '連續共現次數']
+
+
+def _micros(values):
+    return values.to_numpy().astype('datetime64[us]').astype(np.int64)
+
+
+class SightingIndex:
+    """(地點, 時間桶) 倒排索引。
+
+    列依 (地點, 完整時間) 排序，同一地點、同一時間桶的列連續存放，
+    以遞增的桶鍵做 searchsorted 即可取得桶內列範圍。桶寬等於容許誤差，
+    任一列可能的接觸只會落在同地點的前、本、後三個桶內。
+    """
+
+    def __init__(self, df, bucket_sec):
+        loc = df['地點'].cat.codes.to_numpy(dtype=np.int64)
+        micros = _micros(df['完整時間'])
+        order = np.lexsort((micros, loc))
+
+        self.width = max(int(bucket_sec * 1_000_000), 1)
+        self.plate_names = df['車牌'].cat.categories
+        self.loc = loc[order]
+        self.micros = micros[order]
+        self.plate = df['車牌'].cat.codes.to_numpy(dtype=np.int64)[order]
+        self.trip = df['行程ID'].to_numpy()[order]
+        self.next_loc = df['下筆地點'].cat.set_categories(df['地點'].cat.categories) \
+            .cat.codes.to_numpy(dtype=np.int64)[order]
+        self.next_micros = _micros(df['下筆時間'])[order]
+
+        if len(order):
+            bucket = (self.micros - self.micros.min()) // self.width
+            # 桶數 + 2 為地點間距，相鄰桶 (±1) 不會跨到其他地點
+            self.key = self.loc * (int(bucket.max()) + 2) + bucket
+        else:
+            self.key = np.array([], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.key)
+
+    def plate_rows(self, plate):
+        """該車牌所有列在索引中的位置。"""
+        code = self.plate_names.get_indexer([plate])[0]
+        return np.flatnonzero(self.plate == code)
+
+    def neighbours(self, rows):
+        """各列前後相鄰桶 (同地點) 的列範圍 (lo, hi)。"""
+        key = self.key[rows]
+        return (np.searchsorted(self.key, key - 1, side='left'),
+                np.searchsorted(self.key, key + 1, side='right'))
+
+
+def _batches(counts, budget):
+    """依累計配對數切批，每批約 budget 個配對 (單列超過上限時自成一批)。"""
+    total = np.cumsum(counts)
+    if not len(total) or total[-1] == 0:
+        return []
+    cuts = np.searchsorted(total, np.arange(budget, total[-1], budget), side='right')
+    bounds = np.unique(np.r_[0, cuts, len(counts)])
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _rank(index, links, min_locations):
+    if links is None:
+        return pd.DataFrame(columns=RANKING_COLS)
+    locs = pd.concat([links[['p1', 'p2', 'loc']],
+                      links[['p1', 'p2', 'next_loc']].rename(columns={'next_loc': 'loc'})])
+    by_pair = links.groupby(['p1', 'p2'])
+    ranking = pd.DataFrame({
+        '共同地點數': locs.groupby(['p1', 'p2'])['loc'].nunique(),
+        '共同行程數': by_pair['trip'].nunique(),
+        '連續共現次數': by_pair['count'].sum(),
+    }).reset_index()
+    ranking = ranking[ranking['共同地點數'] >= min_locations]
+    ranking = ranking.sort_values(by=['共同地點數', '共同行程數', '連續共現次數'],
+                                  ascending=False, kind='stable')
+    names = np.asarray(index.plate_names, dtype=object)
+    ranking.insert(0, '車輛 1', names[ranking.pop('p1')])
+    ranking.insert(1, '車輛 2', names[ranking.pop('p2')])
+    return ranking.reset_index(drop=True)
+
+
+def discover_convoys(df, tolerance_sec, target=None, min_locations=2, pair_budget=PAIR_BUDGET):
+    """找出結伴移動的車牌，逐批產生 (進度 0~1, 目前排名)。
+
+    target 為 None 時比對全車隊所有車牌組合，否則只找與 target 同行的車牌
+    (車輛 1 固定為 target)。排名依共同地點數、共同行程數 (車輛 1 的行程) 排序。
+    """
+    index = SightingIndex(df, tolerance_sec)
+    if target is None:
+        rows = np.arange(len(index))
+        # 全車隊：每列只與排序在後的列配對，避免重複
+        lo, hi = rows + 1, index.neighbours(rows)[1]
+    else:
+        rows = index.plate_rows(target)
+        lo, hi = index.neighbours(rows)
+
+    batches = _batches(hi - lo, pair_budget)
+    if not batches:
+        yield 1.0, _rank(index, None, min_locations)
+        return
+
+    # 每批併入後即彙總，累計大小只與不同組合數有關
+    links = None
+    for n, (s, e) in enumerate(batches, start=1):
+        local, right = _expand_ranges(lo[s:e], hi[s:e])
+        left = rows[s:e][local]
+
+        keep = (index.plate[left] != index.plate[right]) & \
+               (np.abs(index.micros[left] - index.micros[right]) <= index.width) & \
+               (index.next_loc[left] >= 0) & \
+               (index.next_loc[left] == index.next_loc[right]) & \
+               (np.abs(index.next_micros[left] - index.next_micros[right]) <= index.width)
+        left, right = left[keep], right[keep]
+
+        if target is None:
+            # 車輛 1 取編碼較小者，同一組車牌只計一次
+            swap = index.plate[left] > index.plate[right]
+            left, right = np.where(swap, right, left), np.where(swap, left, right)
+
+        link = pd.DataFrame({
+            'p1': index.plate[left], 'p2': index.plate[right],
+            'loc': index.loc[left], 'next_loc': index.next_loc[left], 'trip': index.trip[left],
+            'count': 1,
+        })
+        if len(link):
+            if links is not None:
+                link = pd.concat([links, link], ignore_index=True)
+            links = link.groupby(LINK_KEYS, as_index=False)['count'].sum()
+        yield n / len(batches), _rank(index, links, min_locations)
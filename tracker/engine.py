@@ -0,0 +1,277 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from . import ingest, pipeline
+from .contacts import CONTACT_COLS, NEARBY_COLS, find_contacts
+from .convoy import discover_convoys
+from .predict import NEXT_STOP
+from .store import TrackStore
+from .trips import TRIP_COLS, TRIP_RULES
+
+# --------------------------
+# 無介面分析引擎
+# 網頁介面與命令列共用：單一車牌的查詢 (傳入 MemoryView / StoreView)，
+# 以及針對本地資料庫、逐車牌平行計算的全車隊批次報表
+# --------------------------
+# 本地欄式資料庫位置
+STORE_DIR = os.environ.get("TRACKER_STORE_DIR", "track_store")
+# Excel 解析結果附檔位置 (同一工作簿再次匯入時略過解析)
+SIDECAR_DIR = os.path.join(STORE_DIR, "xlsx_sidecar")
+# 批次報表每個工作單位處理的車牌數
+PLATE_BATCH = 64
+# 預測看板欄位
+BOARD_COLS = ['車牌', '最後時間', '最後地點', '層級', '名次', '目標地點', '機率', '平均秒數', '預計抵達']
+
+
+# --------------------------
+# 單一車牌查詢
+# --------------------------
+def _group_counts(counts, proximity):
+    # 依鄰近地點群組加總，維持次數由多到少 (同次數依群組名稱)
+    if proximity is None:
+        return counts
+    counts = counts.groupby(proximity.group(counts.index.astype(object)), sort=True).sum()
+    return counts.sort_values(ascending=False, kind='stable')
+
+
+def hotspots(view, plate):
+    """各地點 (指定鄰近索引時為地點群組) 出現次數 (地點, 次數)，依次數由多到少排列。"""
+    counts = _group_counts(view.cube(plate).place_counts(plate), view.proximity).reset_index()
+    counts.columns = ['地點', '次數']
+    return counts
+
+
+def place_locations(view, place):
+    """hotspots 的一個地點 (群組) 所含的地點。"""
+    return [place] if view.proximity is None else view.proximity.members(place)
+
+
+def place_hourly_days(view, plate, place):
+    """該地點 (群組) 0~23 各時段出現過的天數。"""
+    return view.cube(plate).hourly_days(plate, place_locations(view, place))
+
+
+def place_rows(view, plate, place):
+    """該車牌在該地點的所有列；地點群組另以 監視器 欄標示各列的實際地點。"""
+    locations = place_locations(view, place)
+    if len(locations) == 1:
+        return view.plate_location(plate, locations[0])
+    rows = pipeline.concat_frames(view.plate_location(plate, location) for location in locations)
+    return rows.assign(監視器=rows['地點'].astype(object))
+
+
+def visited_locations(view, plate):
+    """該車牌到過的地點 (依名稱排序)。"""
+    return sorted(view.plate(plate)['地點'].unique().astype(str))
+
+
+def group_contacts(view, plates, tolerance_sec, on_progress=None, parts=16):
+    """所選車牌之間的接觸紀錄，依 車輛 1 的時間由新到舊排列。
+
+    先逐一讀取車牌，再依地點切成至多 parts 批比對；on_progress(已完成步數, 總步數)
+    於每讀取一個車牌及每比對完一批後呼叫，總步數為 車牌數 + 批數。
+    """
+    frames = []
+    for n, plate in enumerate(plates, start=1):
+        frames.append(view.plate(plate)[['車牌', '地點', '完整時間']])
+        if on_progress is not None:
+            on_progress(n, len(plates) + parts)
+    rows = pipeline.concat_frames(frames)
+    share = _location_shares(rows, parts, view.proximity)
+    batches = [rows[share == i] for i in range(parts) if (share == i).any()]
+    total = len(plates) + len(batches)
+    results = []
+    for n, batch in enumerate(batches, start=len(plates) + 1):
+        results.append(_plain(find_contacts(batch, plates, tolerance_sec, view.proximity)))
+        if on_progress is not None:
+            on_progress(n, total)
+    if not results:
+        return pd.DataFrame(columns=CONTACT_COLS + (NEARBY_COLS if view.proximity is not None else []))
+    contacts = pd.concat(results, ignore_index=True)
+    return contacts.sort_values(by='完整時間 1', ascending=False)
+
+
+def predict(view, plate, location, when):
+    """以 when 的星期與時段預測下一站 / 最終目的地，回傳 (層級, {種類: 統計表}, 樣本表)。"""
+    return view.transitions(plate).predict(plate, location, when.weekday(), when.hour)
+
+
+def _board(latest, model, kind, k):
+    # 各車牌最後一筆為一筆查詢，整批交給轉移模型；沒有歷史轉移的車牌保留一列 (預測欄位為缺值)
+    queries = pd.DataFrame({
+        '車牌': latest['車牌'].astype(object).to_numpy(),
+        '地點': latest['地點'].astype(object).to_numpy(),
+        '星期': latest['週次'].cat.codes.to_numpy(),
+        '時段': latest['Hour'].to_numpy(),
+    })
+    preds = model.predict_many(queries, k, kinds=(kind,))
+    board = pd.DataFrame({
+        '車牌': queries['車牌'],
+        '最後時間': latest['完整時間'].to_numpy(),
+        '最後地點': queries['地點'],
+    }).join(preds.drop(columns='種類').set_index('查詢'))
+    board['預計抵達'] = board['最後時間'] + pd.to_timedelta(board['平均秒數'], unit='s')
+    board['名次'] = board['名次'].astype('Int64')
+    board = board.sort_values(by=['最後時間', '車牌', '名次'], ascending=[False, True, True], kind='stable')
+    return board[BOARD_COLS].reset_index(drop=True)
+
+
+def prediction_board(view, kind=NEXT_STOP, k=3, plates=None):
+    """各車牌 (未指定則為全部) 依最後一筆紀錄預測的前 k 名下一站 / 最終目的地與預計抵達時間。
+
+    所有車牌一次向量化查詢 (TransitionModel.predict_many)；依最後時間由新到舊排列。
+    """
+    return _board(view.latest(plates), view.fleet_transitions(), kind, k)
+
+
+def day_trips(view, plate, date):
+    """該車牌在 date 當天出發的行程 (TRIP_COLS，依出發時間排列)。"""
+    return view.trips(plate).plate_day(plate, date)[TRIP_COLS]
+
+
+# --------------------------
+# 全車隊批次報表 (逐車牌)
+# 每個子行程自行開啟資料庫、只讀取分配到的車牌分區，結果依車牌順序合併
+# --------------------------
+def _hotspot_rows(index, plate, proximity=None):
+    counts = _group_counts(index.cube().place_counts(plate), proximity)
+    return pd.DataFrame({
+        '車牌': plate,
+        '排名': np.arange(1, len(counts) + 1),
+        '地點': counts.index.astype(object),
+        '次數': counts.to_numpy(),
+    })
+
+
+def _trip_rows(index, plate, rules=TRIP_RULES):
+    return index.trips(rules).plate_trips(plate)[TRIP_COLS]
+
+
+def _home_rows(index, plate, min_stay, night_hr, proximity=None):
+    return index.homes(min_stay, night_hr, proximity).summary()
+
+
+def _transition_rows(index, plate, rules=TRIP_RULES):
+    return index.transitions(rules).table()
+
+
+# 報表名稱 → (單車計算函式, 合併後的排序 (欄位, 遞增))
+PLATE_REPORTS = {
+    'hotspots': (_hotspot_rows, None),
+    'trips': (_trip_rows, None),
+    'homes': (_home_rows, (['過夜次數', '總過夜次數'], False)),
+    'transitions': (_transition_rows, None),
+}
+
+def _open_store(root):
+    # 批次處理每個車牌只讀一次，不保留單車快取；每次重新讀取 manifest 以取得最新內容
+    return TrackStore(root, cache_bytes=0)
+
+
+def _plain(frame):
+    # 各車牌的類別清單不同，先轉為一般物件欄位再合併
+    categorical = [col for col in frame.columns if isinstance(frame[col].dtype, pd.CategoricalDtype)]
+    return frame.astype({col: object for col in categorical})
+
+
+def _location_shares(rows, parts, proximity=None):
+    # 接觸只發生在同一地點 (或同一鄰近連通分量)，依此把各列分到 0 .. parts-1 份
+    codes = rows['地點'].cat.codes.to_numpy()
+    if proximity is not None:
+        codes = proximity.shares(rows['地點'].cat.categories)[codes]
+    return codes % parts
+
+
+def _plate_batch(args):
+    root, kind, params, plates, start, end = args
+    store = _open_store(root)
+    report = PLATE_REPORTS[kind][0]
+    parts = [_plain(report(store.plate_index(plate, start, end), plate, **params)) for plate in plates]
+    parts = [part for part in parts if len(part)]
+    return pd.concat(parts, ignore_index=True) if parts else None
+
+
+def plate_report(root, kind, params=None, plates=None, start=None, end=None, pool=None, on_progress=None):
+    """對資料庫中 (日期範圍內) 的車牌逐一計算 kind 報表並合併。
+
+    kind 為 PLATE_REPORTS 的鍵，params 為該報表的參數；pool 為行程池 (None 則在本行程計算)。
+    on_progress(已完成車牌數, 總車牌數) 於每批車牌完成時呼叫。
+    """
+    report, order = PLATE_REPORTS[kind]
+    if plates is None:
+        plates = _open_store(root).plates(start, end)
+    batches = [plates[i:i + PLATE_BATCH] for i in range(0, len(plates), PLATE_BATCH)]
+    tasks = [(root, kind, params or {}, batch, start, end) for batch in batches]
+    results = pool.map(_plate_batch, tasks) if pool is not None else map(_plate_batch, tasks)
+
+    parts, done = [], 0
+    for batch, part in zip(batches, results):
+        if part is not None:
+            parts.append(part)
+        done += len(batch)
+        if on_progress is not None:
+            on_progress(done, len(plates))
+    if not parts:
+        return pd.DataFrame()
+    merged = pd.concat(parts, ignore_index=True)
+    if order is not None:
+        merged = merged.sort_values(by=order[0], ascending=order[1], kind='stable', ignore_index=True)
+    return merged
+
+
+# --------------------------
+# 全車隊批次報表 (跨車牌)
+# --------------------------
+def _contact_batch(args):
+    rows, plates, tolerance_sec, proximity = args
+    return find_contacts(rows, plates, tolerance_sec, proximity)
+
+
+def fleet_contacts(root, tolerance_sec, plates=None, start=None, end=None, pool=None, parts=16,
+                   proximity=None):
+    """車牌之間 (未指定則為全車隊) 的所有接觸紀錄。
+
+    接觸只發生在同一地點 (或同一鄰近連通分量)，依此切成 parts 份分給行程池平行比對。
+    """
+    frame = _open_store(root).frame(start, end)
+    if plates is None:
+        plates = sorted(frame['車牌'].cat.categories)
+    rows = frame.loc[frame['車牌'].isin(plates), ['車牌', '地點', '完整時間']]
+    if rows.empty:
+        return pd.DataFrame(columns=CONTACT_COLS + (NEARBY_COLS if proximity is not None else []))
+    share = _location_shares(rows, parts, proximity)
+    tasks = [(rows[share == i], plates, tolerance_sec, proximity) for i in range(parts) if (share == i).any()]
+    results = pool.map(_contact_batch, tasks) if pool is not None else map(_contact_batch, tasks)
+    contacts = pd.concat([_plain(part) for part in results], ignore_index=True)
+    return contacts.sort_values(by=['地點', '完整時間 1', '車輛 1', '車輛 2'], kind='stable', ignore_index=True)
+
+
+def fleet_board(root, kind=NEXT_STOP, k=3, plates=None, start=None, end=None, rules=TRIP_RULES):
+    """本地資料庫 (日期範圍內) 的預測看板 (BOARD_COLS)。"""
+    index = _open_store(root).index(start, end)
+    return _board(index.latest(plates), index.transitions(rules), kind, k)
+
+
+def fleet_convoys(root, tolerance_sec, target=None, min_locations=2, start=None, end=None, on_progress=None):
+    """同行車探勘的最終排名 (discover_convoys 的最後一批結果)。"""
+    ranking = None
+    for done, ranking in discover_convoys(_open_store(root).frame(start, end), tolerance_sec,
+                                          target=target, min_locations=min_locations):
+        if on_progress is not None:
+            on_progress(done)
+    return ranking
+
+
+def write_table(df, path):
+    """依副檔名輸出 CSV (UTF-8 BOM，Excel 可直接開啟) 或 Parquet。"""
+    if path.endswith('.parquet'):
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False, encoding='utf-8-sig')
+
+
+def make_pool(workers=None):
+    """批次報表用的行程池 (workers 為 1 時不建立，在本行程計算)。"""
+    return None if workers == 1 else ingest.make_pool(workers)
@@ -0,0 +1,75 @@
+import os
+
+import numpy as np
+
+# --------------------------
+# 資料列指紋：(車牌, 地點, 完整時間) 的 64 位元雜湊 (pipeline.row_hashes)
+# 以排序、不重複的 uint64 陣列保存，比對與加入皆為向量化的二分搜尋，
+# 每筆只佔 8 bytes；雜湊碰撞 (機率約 n² / 2⁶⁵) 時新資料會被視為已存在
+# --------------------------
+
+
+class FingerprintSet:
+    """已知資料列的指紋集合。
+
+    主陣列之外另有一個較小的近期陣列：加入只合併到近期陣列，近期陣列超過主陣列的
+    1/8 時才併入主陣列，大集合逐批加入少量指紋時不必每次搬動整個主陣列。
+    """
+
+    def __init__(self, values=None):
+        self.values = np.array([], dtype=np.uint64) if values is None else values
+        self._recent = np.array([], dtype=np.uint64)
+
+    @classmethod
+    def load(cls, path=None, shards=()):
+        """讀取主檔 (path，可為 None) 與增量分片 (每批寫入新增的指紋)。"""
+        fingerprints = cls(np.load(path) if path is not None else None)
+        for shard in shards:
+            fingerprints.add(np.load(shard))
+        return fingerprints
+
+    def save(self, path):
+        self._flush()
+        save_array(path, self.values)
+
+    def __len__(self):
+        return len(self.values) + len(self._recent)
+
+    @staticmethod
+    def _contains(values, hashes):
+        if not len(values):
+            return np.zeros(len(hashes), dtype=bool)
+        pos = np.searchsorted(values, hashes).clip(max=len(values) - 1)
+        return values[pos] == hashes
+
+    def contains(self, hashes):
+        """各指紋是否已在集合內 (布林陣列)。"""
+        return self._contains(self.values, hashes) | self._contains(self._recent, hashes)
+
+    def fresh_mask(self, hashes):
+        """不在集合內、且為本批第一次出現的位置 (布林陣列)。"""
+        _, first = np.unique(hashes, return_index=True)
+        fresh = np.zeros(len(hashes), dtype=bool)
+        fresh[first] = True
+        return fresh & ~self.contains(hashes)
+
+    def add(self, hashes):
+        # 兩邊都已排序，以插入位置合併 (線性時間)，不必整個重新排序
+        new = np.unique(hashes)
+        new = new[~self.contains(new)]
+        if len(new):
+            self._recent = np.insert(self._recent, np.searchsorted(self._recent, new), new)
+            if len(self._recent) > len(self.values) // 8:
+                self._flush()
+
+    def _flush(self):
+        if len(self._recent):
+            self.values = np.insert(self.values, np.searchsorted(self.values, self._recent), self._recent)
+            self._recent = np.array([], dtype=np.uint64)
+
+
+def save_array(path, values):
+    """以暫存檔寫完後換上的方式儲存指紋陣列。"""
+    tmp = path + '.tmp.npy'
+    np.save(tmp, values)
+    os.replace(tmp, path)
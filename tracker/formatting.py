@@ -0,0 +1,171 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .predict import TIER_LABELS
+
+# --------------------------
+# 表格顯示用的欄位格式化 (各分頁共用)
+# 整欄以 Arrow 運算一次轉成字串，不逐列呼叫 Python；缺值顯示為 "-"
+# --------------------------
+MISSING = "-"
+STATUS_NORMAL = '<span class="status-green">🟢 正常</span>'
+STATUS_ALERT = '<span class="status-red">🔴 異常</span>'
+
+
+def _series(array, index):
+    return pd.Series(array.to_numpy(zero_copy_only=False), index=index)
+
+
+def _strftime(stamps, fmt):
+    # 轉為秒精度，避免 %S 帶出小數
+    seconds = pa.array(stamps, from_pandas=True).cast(pa.timestamp('s'), safe=False)
+    return pc.strftime(seconds, format=fmt)
+
+
+def _int_text(values):
+    return pc.cast(pa.array(values, from_pandas=True).cast(pa.int64(), safe=False), pa.string())
+
+
+def _join(*parts):
+    return pc.binary_join_element_wise(*parts, '')
+
+
+def date_text(stamps):
+    """YYYY-MM-DD。"""
+    return _series(pc.fill_null(_strftime(stamps, '%Y-%m-%d'), MISSING), stamps.index)
+
+
+def clock_text(stamps):
+    """HH:MM:SS。"""
+    return _series(pc.fill_null(_strftime(stamps, '%H:%M:%S'), MISSING), stamps.index)
+
+
+def leave_text(arrive, leave):
+    """離開時間 HH:MM:SS，跨日者加註 (+N天)。"""
+    days = (leave.dt.normalize() - arrive.dt.normalize()).dt.days
+    offset = _join(' (+', _int_text(days), '天)')
+    suffix = pc.if_else(pc.greater(pa.array(days, from_pandas=True), 0), offset, '')
+    text = _join(_strftime(leave, '%H:%M:%S'), suffix)
+    return _series(pc.fill_null(text, MISSING), leave.index)
+
+
+def _duration(seconds, hour_unit):
+    minutes = np.floor(seconds / 60)
+    hours = minutes // 60
+    long_text = _join(_int_text(hours), hour_unit, _int_text(minutes % 60), '分')
+    short_text = _join(_int_text(minutes), '分')
+    return pc.if_else(pc.greater(pa.array(hours, from_pandas=True), 0), long_text, short_text)
+
+
+def duration_text(seconds, hour_unit='小時'):
+    """停留時間：未滿一小時為「M分」，否則為「H小時M分」。"""
+    return _series(pc.fill_null(_duration(seconds, hour_unit), MISSING), seconds.index)
+
+
+def gap_text(seconds):
+    """時間差：「M分S秒」。"""
+    text = _join(_int_text(seconds // 60), '分', _int_text(seconds % 60), '秒')
+    return _series(pc.fill_null(text, MISSING), seconds.index)
+
+
+def dwell_status(seconds, alert_minutes):
+    """依停留分鐘數與警示門檻回傳 (狀態標籤 HTML, 說明)；無下一筆者視為正常。"""
+    alert = pa.array(np.floor(seconds / 60) >= alert_minutes)
+    status = pc.if_else(alert, STATUS_ALERT, STATUS_NORMAL)
+
+    text = _duration(seconds, '時')
+    note = pc.if_else(alert, _join('停留 ', text), _join('間隔 ', text))
+    return _series(status, seconds.index), _series(pc.fill_null(note, "無後續"), seconds.index)
+
+
+# --------------------------
+# 各分頁的明細表
+# --------------------------
+def detail_order(rows):
+    """明細顯示順序：日期新到舊，同日內依時間先後。"""
+    return rows.sort_values(by=['日期', '完整時間'], ascending=[False, True])
+
+
+def detail_table(rows):
+    """地點 / 過夜明細：日期、週次、抵達、離開、前往地點、停留 (地點群組另列實際監視器)。"""
+    table = pd.DataFrame({
+        '日期': date_text(rows['日期']),
+        '週次': rows['週次'],
+        '抵達時間': clock_text(rows['完整時間']),
+        '離開時間': leave_text(rows['完整時間'], rows['下筆時間']),
+        '前往地點': rows['下筆地點'].astype(object).fillna(MISSING),
+        '停留': duration_text(rows['停留秒數']),
+    })
+    if '監視器' in rows:
+        table.insert(2, '監視器', rows['監視器'].to_numpy())
+    return table
+
+
+def daily_table(rows, alert_minutes):
+    """單日行程：抵達、地點、離開與停留狀態。"""
+    status, note = dwell_status(rows['停留秒數'], alert_minutes)
+    return pd.DataFrame({
+        '抵達時間': clock_text(rows['完整時間']),
+        '地點': rows['地點'],
+        '離開時間': leave_text(rows['完整時間'], rows['下筆時間']),
+        '狀態': status,
+        '說明': note,
+    })
+
+
+def trip_table(trips):
+    """行程摘要：出發、抵達的時間與地點、站數、歷時。"""
+    return pd.DataFrame({
+        '行程': trips['行程序號'],
+        '出發時間': clock_text(trips['出發時間']),
+        '出發地點': trips['出發地點'],
+        '抵達時間': leave_text(trips['出發時間'], trips['抵達時間']),
+        '抵達地點': trips['抵達地點'],
+        '站數': trips['站數'],
+        '歷時': duration_text(trips['歷時秒數']),
+    })
+
+
+def contact_table(contacts):
+    """接觸紀錄 (find_contacts 的結果；鄰近比對另列車輛 2 的地點與距離)。"""
+    table = pd.DataFrame({
+        '地點': contacts['地點'],
+        '日期': date_text(contacts['完整時間 1']),
+        '車輛 1': contacts['車輛 1'],
+        '時間 1': clock_text(contacts['完整時間 1']),
+        '車輛 2': contacts['車輛 2'],
+        '時間 2': clock_text(contacts['完整時間 2']),
+        '誤差': gap_text(contacts['秒差']),
+    })
+    if '地點 2' in contacts:
+        table.insert(5, '地點 2', contacts['地點 2'])
+        meters = _join(_int_text(contacts['距離 (公尺)'].round()), ' 公尺')
+        table['距離'] = _series(meters, contacts.index)
+    return table
+
+
+def arrival_table(samples):
+    """預測樣本的抵達日期與時間。"""
+    return pd.DataFrame({
+        '日期': date_text(samples['抵達']),
+        '抵達時間': clock_text(samples['抵達']),
+    })
+
+
+def board_table(board):
+    """預測看板：各車最後出現的時間地點，與預測地點的機率、車程、預計抵達時間。"""
+    probability = _join(pc.cast(pa.array(board['機率'], from_pandas=True), pa.string()), '%')
+    return pd.DataFrame({
+        '車牌': board['車牌'],
+        '日期': date_text(board['最後時間']),
+        '最後時間': clock_text(board['最後時間']),
+        '最後地點': board['最後地點'],
+        '名次': board['名次'].astype(object).fillna(MISSING),
+        '預測地點': board['目標地點'].fillna(MISSING),
+        '機率': _series(pc.fill_null(probability, MISSING), board.index),
+        '預估車程': duration_text(board['平均秒數']),
+        '預計抵達': leave_text(board['最後時間'], board['預計抵達']),
+        '依據': board['層級'].map(TIER_LABELS).fillna(MISSING),
+    })
@@ -0,0 +1,184 @@
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+from .contacts import _expand_ranges
+from .ingest import detect_encoding
+
+# --------------------------
+# 監視器位置表 (地點名稱 → 緯度 / 經度) 與鄰近地點索引
+# 座標以等距圓柱投影換算為公尺，依半徑切成方格，只比對相鄰 9 格內的地點；
+# 鄰近配對、地點群組在建立時一次算好 (依半徑快取)，同夥比對 / 熱點 / 居住地判讀只查表
+# --------------------------
+EARTH_RADIUS_M = 6_371_000
+NAME_COLS = ['地點', '路口', '監視器', 'location', 'name']
+LAT_COLS = ['緯度', 'lat', 'latitude']
+LON_COLS = ['經度', 'lon', 'lng', 'longitude']
+
+
+class CatalogError(Exception):
+    """監視器位置表無法讀取或缺少欄位。"""
+
+
+def _pick(columns, candidates):
+    lowered = {str(col).strip().lower(): col for col in columns}
+    for name in candidates:
+        if name.lower() in lowered:
+            return lowered[name.lower()]
+    return None
+
+
+def read_catalog(name, data):
+    """CSV (UTF-8 / Big5) 或 Excel 位置表的位元組內容 → CameraCatalog。"""
+    try:
+        if name.endswith('.csv'):
+            frame = pd.read_csv(io.BytesIO(data), encoding=detect_encoding(data), dtype=str)
+        else:
+            frame = pd.read_excel(io.BytesIO(data), dtype=str)
+    except Exception as e:
+        raise CatalogError(f"{name}: {e}") from e
+    cols = [_pick(frame.columns, names) for names in (NAME_COLS, LAT_COLS, LON_COLS)]
+    if None in cols:
+        raise CatalogError(f"{name} 缺少欄位: 地點 / 緯度 / 經度")
+    names = frame[cols[0]].str.strip()
+    lat = pd.to_numeric(frame[cols[1]], errors='coerce')
+    lon = pd.to_numeric(frame[cols[2]], errors='coerce')
+    valid = names.notna() & (names != '') & lat.between(-90, 90) & lon.between(-180, 180)
+    if not valid.any():
+        raise CatalogError(f"{name} 沒有有效的座標")
+    catalog = CameraCatalog(names[valid], lat[valid], lon[valid])
+    catalog.skipped = int((~valid).sum())
+    return catalog
+
+
+def load_catalog(path):
+    with open(path, 'rb') as f:
+        return read_catalog(os.path.basename(path), f.read())
+
+
+class CameraCatalog:
+    """監視器位置表；名稱重複時以第一筆為準。"""
+
+    def __init__(self, names, lat, lon):
+        frame = pd.DataFrame({'名稱': np.asarray(names, dtype=object),
+                              'lat': np.asarray(lat, dtype=float), 'lon': np.asarray(lon, dtype=float)})
+        frame = frame.drop_duplicates(subset='名稱').reset_index(drop=True)
+        self.names = pd.Index(frame['名稱'])
+        self.skipped = 0
+        lat = np.deg2rad(frame['lat'].to_numpy())
+        lon = np.deg2rad(frame['lon'].to_numpy())
+        # 市區範圍內以平均緯度換算經度距離，誤差遠小於監視器間距
+        scale = np.cos(lat.mean()) if len(lat) else 1.0
+        self.xy = np.c_[lon * scale, lat] * EARTH_RADIUS_M
+        self._within = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def codes(self, locations):
+        """地點名稱 → 位置表中的序號 (不在表內為 -1)。"""
+        return self.names.get_indexer(pd.Index(np.asarray(locations, dtype=object)))
+
+    def within(self, radius_m):
+        """半徑 radius_m 公尺內的鄰近地點索引 (依半徑快取)。"""
+        if radius_m not in self._within:
+            self._within[radius_m] = Proximity(self, radius_m)
+        return self._within[radius_m]
+
+
+def _grid_pairs(xy, radius_m):
+    """距離不超過 radius_m 的所有地點配對 (i < j)，回傳 (i, j, 距離)。"""
+    cells = np.floor(xy / radius_m).astype(np.int64)
+    cells -= cells.min(axis=0) - 1
+    width = cells[:, 1].max() + 2
+    keys = cells[:, 0] * width + cells[:, 1]
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    lefts, rights = [], []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            target = keys + dx * width + dy
+            lo = np.searchsorted(sorted_keys, target, side='left')
+            hi = np.searchsorted(sorted_keys, target, side='right')
+            left, pos = _expand_ranges(lo, hi)
+            lefts.append(left)
+            rights.append(order[pos])
+    i, j = np.concatenate(lefts), np.concatenate(rights)
+    keep = i < j
+    i, j = i[keep], j[keep]
+    dist = np.hypot(*(xy[i] - xy[j]).T)
+    keep = dist <= radius_m
+    return i[keep], j[keep], dist[keep]
+
+
+def _adjacency(n, src, dst, dist):
+    """(src, dst, 距離) 配對 → 依 src 排列的鄰接表 (ptr, dst, 距離)。"""
+    order = np.lexsort((dst, src))
+    ptr = np.r_[0, np.cumsum(np.bincount(src, minlength=n))]
+    return ptr, dst[order], dist[order]
+
+
+class Proximity:
+    """位置表在固定半徑下的鄰近關係。
+
+    - lower：各地點序號較小的鄰近地點 (鄰接表)，同夥比對每筆只複製到這些地點一次
+    - components：鄰近關係的連通分量，跨地點的接觸不會跨分量 (批次比對依此分工)
+    - labels：熱點 / 居住地的地點群組；以鄰近地點最多者為中心，吸收半徑內尚未分組的地點，
+      群組不會無限串連 (直徑不超過兩倍半徑)
+    """
+
+    def __init__(self, catalog, radius_m):
+        self.catalog = catalog
+        self.radius_m = radius_m
+        n = len(catalog)
+        i, j, dist = _grid_pairs(catalog.xy, radius_m)
+        self.pairs = len(i)
+        self.lower = _adjacency(n, j, i, dist)
+        ptr, nbr, _ = _adjacency(n, np.r_[i, j], np.r_[j, i], np.r_[dist, dist])
+
+        # 連通分量：反覆取鄰居的最小序號直到不變
+        comp = np.arange(n)
+        while True:
+            low = comp.copy()
+            np.minimum.at(low, i, comp[j])
+            np.minimum.at(low, j, comp[i])
+            low = low[low]
+            if np.array_equal(low, comp):
+                break
+            comp = low
+        self.components = pd.factorize(comp)[0]
+
+        degree = np.diff(ptr)
+        names = catalog.names.to_numpy()
+        center = np.full(n, -1)
+        for c in np.lexsort((names, -degree)):
+            if center[c] >= 0:
+                continue
+            members = nbr[ptr[c]:ptr[c + 1]]
+            members = members[center[members] < 0]
+            center[c] = c
+            center[members] = c
+        sizes = np.bincount(center, minlength=n)
+        self.labels = np.array([name if sizes[c] == 1 else f"{names[c]} 等 {sizes[c]} 處"
+                                for name, c in zip(names, center)], dtype=object)
+        self._members = {}
+        for name, label in zip(names, self.labels):
+            self._members.setdefault(label, []).append(name)
+
+    def group(self, locations):
+        """各地點所屬群組名稱 (不在位置表內的地點自成一組)。"""
+        locations = np.asarray(locations, dtype=object)
+        codes = self.catalog.codes(locations)
+        return np.where(codes >= 0, self.labels[codes], locations)
+
+    def members(self, label):
+        """群組內的地點 (依名稱排序)。"""
+        return sorted(self._members.get(label, [label]))
+
+    def shares(self, locations):
+        """各地點的連通分量代號，不在位置表內的地點各自一個代號。"""
+        codes = self.catalog.codes(locations)
+        own = len(self.catalog) + np.arange(len(codes))
+        return np.where(codes >= 0, self.components[codes.clip(min=0)], own)
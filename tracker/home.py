@@ -0,0 +1,88 @@
+import pandas as pd
+
+from .cube import CountCube
+from .index import _run_bounds
+from .profiling import measured
+
+# --------------------------
+# 居住地判讀：全車隊一次計算過夜候選與各地點過夜次數
+# 依 (最小停留時數, 夜間起始時) 建立，結果可重複查詢任一車牌
+# 指定鄰近索引時，同一地點群組內的監視器合併計算 (候選列另保留原地點於 監視器 欄)
+# --------------------------
+# 夜間時段結束 (時)
+NIGHT_END_HOUR = 6
+SUMMARY_COLS = ['車牌', '推測落腳點', '過夜次數', '過夜地點數', '總過夜次數']
+
+
+def overnight_mask(df, min_stay, night_hr):
+    """夜間 (night_hr:00 ~ 06:00) 抵達且停留達 min_stay 小時的列 (與行程切分門檻無關)。"""
+    hour = df['Hour']
+    is_night = (hour >= night_hr) | (hour < NIGHT_END_HOUR)
+    is_long = df['停留秒數'].fillna(0) >= min_stay * 3600
+    return (is_night & is_long).to_numpy()
+
+
+class HomeReport:
+    """全車隊過夜分析結果。
+
+    - candidates：符合條件的列，依 (車牌, 地點, 完整時間) 排序
+    - ranking：(車牌, 地點) → 過夜次數，各車牌內依次數由多到少排列
+    """
+
+    @measured("居住地判讀", rows_in=lambda self, df, *args: len(df), rows_out=None)
+    def __init__(self, df, min_stay, night_hr, proximity=None):
+        candidates = df[overnight_mask(df, min_stay, night_hr)]
+        if proximity is not None:
+            places = candidates['地點'].astype(object)
+            candidates = candidates.assign(監視器=places, 地點=pd.Categorical(proximity.group(places)))
+        candidates = candidates.sort_values(by=['車牌', '地點', '完整時間'], kind='stable')
+        self.candidates = candidates
+
+        counts = candidates.groupby(['車牌', '地點'], observed=True, sort=True).size()
+        ranking = counts.rename('過夜次數').reset_index()
+        ranking = ranking.sort_values(by=['車牌', '過夜次數'], ascending=[True, False], kind='stable')
+        self.ranking = ranking.reset_index(drop=True)
+
+        self._plate_ranges = self._ranges(self.ranking['車牌'])
+        self._candidate_ranges = self._ranges(candidates['車牌'], candidates['地點'])
+        self._cube = None
+
+    @staticmethod
+    def _ranges(*columns):
+        codes = [c.cat.codes.to_numpy() for c in columns]
+        values = [c.to_numpy() for c in columns]
+        starts, ends = _run_bounds(*codes)
+        if len(columns) == 1:
+            return {values[0][s]: (s, e) for s, e in zip(starts, ends)}
+        return {tuple(v[s] for v in values): (s, e) for s, e in zip(starts, ends)}
+
+    def plate_ranking(self, plate):
+        """該車牌各地點過夜次數 (地點, 過夜次數)。"""
+        s, e = self._plate_ranges.get(plate, (0, 0))
+        return self.ranking.iloc[s:e][['地點', '過夜次數']].reset_index(drop=True)
+
+    def plate_place(self, plate, place):
+        """該車牌在該地點符合條件的列。"""
+        s, e = self._candidate_ranges.get((plate, place), (0, 0))
+        return self.candidates.iloc[s:e]
+
+    def cube(self):
+        """過夜候選列的筆數立方體 (規律性圖表用)。"""
+        if self._cube is None:
+            self._cube = CountCube(self.candidates)
+        return self._cube
+
+    def summary(self):
+        """每台車一列：過夜次數最多的地點為推測落腳點。"""
+        if self.ranking.empty:
+            return pd.DataFrame(columns=SUMMARY_COLS)
+        by_plate = self.ranking.groupby('車牌', observed=True, sort=False)
+        top = by_plate.head(1).set_index('車牌')
+        summary = pd.DataFrame({
+            '推測落腳點': top['地點'],
+            '過夜次數': top['過夜次數'],
+            '過夜地點數': by_plate.size(),
+            '總過夜次數': by_plate['過夜次數'].sum(),
+        }).reset_index()
+        summary = summary.sort_values(by=['過夜次數', '總過夜次數'], ascending=False, kind='stable')
+        return summary[SUMMARY_COLS].reset_index(drop=True)
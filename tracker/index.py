@@ -0,0 +1,206 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .profiling import measured
+from .trips import TRIP_RULES, TripTable
+
+# 字典每個項目 (鍵、值與雜湊表槽位) 的約略大小 (bytes)
+DICT_ENTRY_BYTES = 150
+
+
+def _run_bounds(*keys):
+    """已排序資料中，任一鍵值改變處切出的連續區段 (starts, ends)。"""
+    n = len(keys[0])
+    if n == 0:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    changed = np.zeros(n - 1, dtype=bool)
+    for key in keys:
+        changed |= key[1:] != key[:-1]
+    starts = np.r_[0, np.flatnonzero(changed) + 1]
+    ends = np.r_[starts[1:], n]
+    return starts, ends
+
+
+def approx_nbytes(value):
+    """DataFrame / numpy 陣列 / 字典 / 本套件物件 (遞迴其屬性) 的約略記憶體用量 (bytes)。"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return len(value) * DICT_ENTRY_BYTES + sum(approx_nbytes(v) for v in value.values()
+                                                   if isinstance(v, (dict, np.ndarray)))
+    if type(value).__module__.startswith(__package__ + '.'):
+        return sum(approx_nbytes(v) for v in vars(value).values())
+    return 0
+
+
+class PlateIndex:
+    """依 (車牌, 完整時間) 排序後的資料所建立的索引。
+
+    - 車牌 → 連續列範圍 (切片不複製資料)
+    - (車牌, 日期) → 車牌範圍內的連續子範圍
+    - (車牌, 地點) → 依時間排列的列位置
+    - 圖表用的筆數立方體 (首次使用時建立)
+    - 行程摘要、AI 預測用的轉移模型 (依切分門檻快取，可沿用前一版索引只重建有新資料的車牌)
+    - 居住地判讀結果 (依參數快取)
+
+    索引可由多個 session 與背景工作同時使用：衍生結果的建立以 _build_lock 依序進行，
+    快取字典的寫入與 nbytes() 的讀取以 _lock 保護 (只鎖取快照，不等待建立中的結果)。
+    """
+
+    @measured("建立索引", rows_in=lambda self, df: len(df), rows_out=None)
+    def __init__(self, df):
+        self.df = df
+        plate_codes, plate_names = pd.factorize(df['車牌'])
+        loc_codes, loc_names = pd.factorize(df['地點'])
+        # 名稱與日期先轉成一般 numpy 陣列，字典由整批取值建立，不逐筆由類別 / Arrow 索引取出純量
+        plate_names = np.asarray(plate_names.astype(object))
+        loc_names = np.asarray(loc_names.astype(object))
+        days = df['日期'].to_numpy()
+
+        # 車牌 / 地點為缺值的列 (factorize 代號 -1) 不列入索引，以免 names[-1] 誤指到最後一個車牌或地點
+        starts, ends = _run_bounds(plate_codes)
+        keep = plate_codes[starts] >= 0
+        starts, ends = starts[keep], ends[keep]
+        self._plate_ranges = dict(zip(plate_names[plate_codes[starts]], zip(starts.tolist(), ends.tolist())))
+
+        starts, ends = _run_bounds(plate_codes, days)
+        keep = plate_codes[starts] >= 0
+        starts, ends = starts[keep], ends[keep]
+        self._date_ranges = {}
+        for plate, day, s, e in zip(plate_names[plate_codes[starts]], pd.DatetimeIndex(days[starts]),
+                                    starts.tolist(), ends.tolist()):
+            self._date_ranges.setdefault(plate, {})[day] = (s, e)
+
+        # 穩定排序：同一 (車牌, 地點) 內維持時間順序
+        order = np.lexsort((loc_codes, plate_codes))
+        starts, ends = _run_bounds(plate_codes[order], loc_codes[order])
+        firsts = order[starts]
+        keep = (plate_codes[firsts] >= 0) & (loc_codes[firsts] >= 0)
+        starts, ends, firsts = starts[keep], ends[keep], firsts[keep]
+        self._loc_rows = {}
+        for plate, loc, s, e in zip(plate_names[plate_codes[firsts]], loc_names[loc_codes[firsts]],
+                                    starts.tolist(), ends.tolist()):
+            self._loc_rows.setdefault(plate, {})[loc] = order[s:e]
+        self._lock = threading.Lock()
+        self._build_lock = threading.RLock()
+        self._cube = None
+        self._trips = {}
+        self._trip_bases = {}
+        self._transitions = {}
+        self._transition_bases = {}
+        self._homes = {}
+        self._nbytes = None
+        self._derived_nbytes = {}
+
+    def nbytes(self):
+        """資料、索引與目前已建立的衍生結果 (立方體、行程摘要、轉移模型、居住地判讀) 的約略記憶體用量。
+
+        衍生結果建立後不再變動，各自只量測一次。
+        """
+        if self._nbytes is None:
+            self._nbytes = sum(approx_nbytes(part) for part in
+                               (self.df, self._plate_ranges, self._date_ranges, self._loc_rows))
+        with self._lock:
+            derived = [self._cube, *self._trips.values(), *self._transitions.values(), *self._homes.values()]
+        total = self._nbytes
+        for item in derived:
+            if item is None:
+                continue
+            if id(item) not in self._derived_nbytes:
+                self._derived_nbytes[id(item)] = approx_nbytes(item)
+            total += self._derived_nbytes[id(item)]
+        return total
+
+    def plates(self):
+        return sorted(self._plate_ranges)
+
+    def plate(self, plate):
+        s, e = self._plate_ranges.get(plate, (0, 0))
+        return self.df.iloc[s:e]
+
+    def plate_dates(self, plate):
+        return sorted(self._date_ranges.get(plate, {}))
+
+    def plate_date(self, plate, date):
+        s, e = self._date_ranges.get(plate, {}).get(pd.Timestamp(date), (0, 0))
+        return self.df.iloc[s:e]
+
+    def plate_locations(self, plate):
+        return sorted(self._loc_rows.get(plate, {}))
+
+    def plate_location(self, plate, location):
+        rows = self._loc_rows.get(plate, {}).get(location)
+        if rows is None:
+            return self.df.iloc[0:0]
+        return self.df.iloc[rows]
+
+    def _derived(self, cache, key, build):
+        """cache[key]，沒有時以 build() 建立 (同一索引的建立依序進行，不重複建立)。"""
+        with self._lock:
+            if key in cache:
+                return cache[key]
+        with self._build_lock:
+            with self._lock:
+                if key in cache:
+                    return cache[key]
+            value = build()
+            with self._lock:
+                cache[key] = value
+            return value
+
+    def cube(self):
+        if self._cube is None:
+            from .cube import CountCube
+            with self._build_lock:
+                if self._cube is None:
+                    self._cube = CountCube(self.df)
+        return self._cube
+
+    def inherit(self, base, plates):
+        """沿用前一版索引 base 的行程摘要與轉移模型，之後只重建 plates (有新資料的車牌)。
+
+        base 尚未建立、但本身也沿用更早版本者，一併沿用並合併需重建的車牌。
+        """
+        plates = set(plates)
+
+        def bases(built, pending):
+            result = {rules: (item, changed | plates) for rules, (item, changed) in pending.items()}
+            result.update((rules, (item, plates)) for rules, item in built.items())
+            return result
+
+        with base._lock:
+            self._trip_bases = bases(dict(base._trips), dict(base._trip_bases))
+            self._transition_bases = bases(dict(base._transitions), dict(base._transition_bases))
+
+    def trips(self, rules=TRIP_RULES):
+        def build():
+            with self._lock:
+                base, changed = self._trip_bases.pop(rules, (None, ()))
+            return TripTable(self.df, self._plate_ranges, rules, base, changed)
+        return self._derived(self._trips, rules, build)
+
+    def homes(self, min_stay, night_hr, proximity=None):
+        def build():
+            from .home import HomeReport
+            return HomeReport(self.df, min_stay, night_hr, proximity)
+        return self._derived(self._homes, (min_stay, night_hr, proximity), build)
+
+    def transitions(self, rules=TRIP_RULES):
+        def build():
+            from .predict import TransitionModel
+            with self._lock:
+                base, changed = self._transition_bases.pop(rules, (None, ()))
+            return TransitionModel(self.df, self.trips(rules), self._plate_ranges, base, changed)
+        return self._derived(self._transitions, rules, build)
+
+    def latest(self, plates=None):
+        """各車牌 (或 plates 中有資料的車牌) 的最後一筆紀錄，依車牌排序。"""
+        plates = self.plates() if plates is None else sorted(p for p in plates if p in self._plate_ranges)
+        ends = np.array([self._plate_ranges[plate][1] for plate in plates], dtype=np.int64)
+        return self.df.iloc[ends - 1]
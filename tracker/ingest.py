@@ -0,0 +1,207 @@
+import codecs
+import hashlib
+import io
+import itertools
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+from . import pipeline, profiling
+
+# 判斷編碼時只解碼檔頭樣本，避免整檔以錯誤編碼解析後重來
+ENCODING_SAMPLE_BYTES = 64 * 1024
+FALLBACK_ENCODING = 'big5'
+SUPPORTED_EXTENSIONS = ('.csv', '.xlsx')
+# 分塊讀取大型檔案時每塊的列數
+CHUNK_ROWS = 500_000
+
+
+class FileReadError(Exception):
+    """單一檔案無法讀取 (格式或編碼錯誤)。"""
+
+
+def detect_encoding(data, sample_bytes=ENCODING_SAMPLE_BYTES):
+    """以檔頭樣本判斷 CSV 編碼：UTF-8 (含 BOM) 或 Big5。"""
+    if data.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        # final=False：樣本截斷在多位元組字元中間時不視為錯誤
+        decoder.decode(data[:sample_bytes], final=False)
+    except UnicodeDecodeError:
+        return FALLBACK_ENCODING
+    return 'utf-8'
+
+
+def read_upload(name, data, sidecar_dir=None):
+    """將上傳檔案的位元組內容讀成全字串欄位的 DataFrame。
+
+    Excel 只讀必要欄位；指定 sidecar_dir 時解析結果存為附檔，同一工作簿不再重複解析。
+    """
+    try:
+        if name.endswith('.csv'):
+            encoding = detect_encoding(data)
+            try:
+                return pd.read_csv(io.BytesIO(data), encoding=encoding, dtype=str)
+            except UnicodeDecodeError:
+                # 樣本之後才出現非 UTF-8 內容的少數情況
+                if encoding == FALLBACK_ENCODING:
+                    raise
+                return pd.read_csv(io.BytesIO(data), encoding=FALLBACK_ENCODING, dtype=str)
+        sidecar = sidecar_path(sidecar_dir, hashlib.sha1(data).hexdigest())
+        frames = list(excel_chunks(io.BytesIO(data), name, sidecar=sidecar))
+        if not frames:
+            return pd.DataFrame(columns=pipeline.REQUIRED_COLS, dtype=object)
+        return pd.concat(frames, ignore_index=True)
+    except pipeline.MissingColumnsError:
+        raise
+    except Exception as e:
+        raise FileReadError(f"{name}: {e}") from e
+
+
+# --------------------------
+# Excel 串流讀取
+# 以 openpyxl read-only 模式逐列讀取，只取必要欄位；工作簿內所有含必要欄位的工作表都會讀入。
+# 解析結果另存為 Arrow 欄式附檔 (以工作簿內容雜湊命名)，同一工作簿再次上傳時直接讀取附檔
+# --------------------------
+SIDECAR_SCHEMA = pa.schema([(col, pa.string()) for col in pipeline.REQUIRED_COLS])
+
+
+def sidecar_path(sidecar_dir, digest):
+    return os.path.join(sidecar_dir, f"{digest}.arrow") if sidecar_dir else None
+
+
+def _cell_text(value):
+    # 與 read_excel(dtype=str) 相同：日期、時間、數字儲存格轉為其字串表示，整數值的浮點數去掉 .0
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _sheet_columns(header):
+    """表頭 → {必要欄位: 欄位位置}，欄名依 RENAME_MAP 對應，重複欄名取第一個。"""
+    positions = {}
+    for i, name in enumerate(header):
+        name = pipeline.RENAME_MAP.get(str(name).strip(), str(name).strip()) if name is not None else ''
+        if name in pipeline.REQUIRED_COLS and name not in positions:
+            positions[name] = i
+    return positions
+
+
+def _parse_excel(source, name, chunk_rows):
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        matched = False
+        for sheet in workbook.worksheets:
+            rows = sheet.iter_rows(values_only=True)
+            positions = _sheet_columns(next(rows, ()))
+            if len(positions) < len(pipeline.REQUIRED_COLS):
+                continue
+            matched = True
+            first, last = min(positions.values()), max(positions.values())
+            picks = [positions[col] - first for col in pipeline.REQUIRED_COLS]
+            # 只解析必要欄位所在的欄範圍
+            rows = sheet.iter_rows(min_row=2, min_col=first + 1, max_col=last + 1, values_only=True)
+            while True:
+                block = list(itertools.islice(rows, chunk_rows))
+                if not block:
+                    break
+                columns = {col: [_cell_text(row[i]) if i < len(row) else None for row in block]
+                           for col, i in zip(pipeline.REQUIRED_COLS, picks)}
+                frame = pd.DataFrame(columns, dtype=object)
+                # 略過整列空白 (工作表範圍常含尾端空列)
+                yield frame[frame.notna().any(axis=1)].reset_index(drop=True)
+        if not matched:
+            raise pipeline.MissingColumnsError(f"{name} 缺少欄位: {pipeline.REQUIRED_COLS}")
+    finally:
+        workbook.close()
+
+
+def excel_chunks(source, name, chunk_rows=None, sidecar=None):
+    """逐塊產生 Excel 必要欄位 (車牌 / 地點 / 日期 / 時間，全字串)。
+
+    source 為路徑或檔案物件；sidecar 為附檔路徑，已存在則直接讀取，否則邊解析邊寫入。
+    """
+    chunk_rows = chunk_rows or CHUNK_ROWS
+    if sidecar and os.path.exists(sidecar):
+        with pa.memory_map(sidecar) as stream:
+            reader = ipc.open_file(stream)
+            for i in range(reader.num_record_batches):
+                yield reader.get_batch(i).to_pandas()
+        return
+
+    if not sidecar:
+        yield from _parse_excel(source, name, chunk_rows)
+        return
+    os.makedirs(os.path.dirname(sidecar), exist_ok=True)
+    # 暫存檔名須唯一：同一行程內的多個 session (執行緒) 可能同時解析同一工作簿
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(sidecar), prefix=os.path.basename(sidecar) + '.',
+                               suffix='.tmp')
+    os.close(fd)
+    try:
+        with ipc.new_file(tmp, SIDECAR_SCHEMA) as writer:
+            for frame in _parse_excel(source, name, chunk_rows):
+                writer.write_table(pa.Table.from_pandas(frame, schema=SIDECAR_SCHEMA, preserve_index=False))
+                yield frame
+        os.replace(tmp, sidecar)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def read_chunks(path, encoding=None, chunk_rows=CHUNK_ROWS, sidecar=None):
+    """分塊讀取本機檔案，逐塊產生全字串欄位的 DataFrame (CSV 需指定編碼)。"""
+    name = os.path.basename(path)
+    try:
+        if path.endswith('.csv'):
+            yield from pd.read_csv(path, encoding=encoding, dtype=str, chunksize=chunk_rows)
+        else:
+            yield from excel_chunks(path, name, chunk_rows, sidecar)
+    except pipeline.MissingColumnsError:
+        raise
+    except Exception as e:
+        raise FileReadError(f"{name}: {e}") from e
+
+
+def load_file(name, data, sidecar_dir=None):
+    """讀取並標準化單一檔案 (可在子行程中執行)，回傳 (資料, 讀檔報告)。"""
+    # 可能在子行程執行，量測結果隨報告 (stages) 傳回主行程
+    with profiling.collect() as stages:
+        with profiling.stage("讀檔", detail=f"{name} ({len(data) / 1024 ** 2:.1f} MB)") as record:
+            raw = read_upload(name, data, sidecar_dir)
+            record['輸出筆數'] = len(raw)
+        raw_bytes = int(raw.memory_usage(index=True, deep=True).sum())
+        frame, report = pipeline.normalize_frame(raw, name)
+    return frame, dict(report, name=name, raw_bytes=raw_bytes, stages=stages)
+
+
+def _load_file_args(args):
+    return load_file(*args)
+
+
+def make_pool(max_workers=None):
+    # Streamlit 以 __main__ 身分執行頁面腳本，spawn/forkserver 的子行程會重跑整個頁面，
+    # 因此只在支援 fork 的平台使用行程池，其餘平台退回執行緒池
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return ProcessPoolExecutor(max_workers=max_workers,
+                                   mp_context=multiprocessing.get_context('fork'))
+    return ThreadPoolExecutor(max_workers=max_workers)
+
+
+def load_files(files, pool=None, sidecar_dir=None):
+    """files 為 [(檔名, 位元組內容)]，依序回傳各檔 (標準化後資料, 讀檔報告)。
+
+    每個檔案在子行程內完成讀取與標準化，原始字串表不會回傳主行程。
+    """
+    args = [(name, data, sidecar_dir) for name, data in files]
+    if pool is None or len(files) < 2:
+        return [load_file(*arg) for arg in args]
+    return list(pool.map(_load_file_args, args))
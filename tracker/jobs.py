@@ -0,0 +1,144 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# --------------------------
+# 背景工作：耗時的分析 (同夥比對、同行車探勘、全車隊報表、大型檔案匯入) 交給執行緒池
+# 工作保存在共用的 JobPool，頁面重新執行、切換分頁都不會中斷或遺失結果；
+# 工作函式的第一個參數為 Job，以 update() 回報進度，同時作為取消的檢查點
+# --------------------------
+# 同時執行的工作數
+MAX_WORKERS = 2
+# 保留的已結束工作數 (超過時淘汰最早送出者)
+KEEP_FINISHED = 100
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = '排隊中', '執行中', '完成', '失敗', '已取消'
+
+
+class JobCancelled(Exception):
+    """工作已被要求取消 (由 Job.update 丟出)。"""
+
+
+class Job:
+    """一個背景工作的狀態、進度與結果。
+
+    - params：送出時的查詢參數，頁面據此判斷結果是否仍對應目前的選項
+    - partial：執行中回報的部分結果 (例如同行車探勘目前的排名)
+    - cancellable：執行中是否會呼叫 update() 檢查取消；否則只有排隊中可以取消
+    """
+
+    def __init__(self, label, params=None, owner=None, cancellable=True):
+        self.id = uuid.uuid4().hex[:12]
+        self.label = label
+        self.params = params
+        self.owner = owner
+        self.cancellable = cancellable
+        self.state = QUEUED
+        self.progress = 0.0
+        self.message = ""
+        self.partial = None
+        self.result = None
+        self.error = None
+        self.submitted = datetime.now()
+        self._start = None
+        self._end = None
+        self._cancel = threading.Event()
+        self._finished = threading.Event()
+
+    @property
+    def done(self):
+        return self.state in (DONE, FAILED, CANCELLED)
+
+    @property
+    def can_cancel(self):
+        """目前要求取消是否有效 (尚未結束，且排隊中或執行中會檢查取消)。"""
+        return not self.done and (self.cancellable or self.state == QUEUED)
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    @property
+    def elapsed(self):
+        """已執行秒數 (尚未開始為 0)。"""
+        if self._start is None:
+            return 0.0
+        return (self._end or time.perf_counter()) - self._start
+
+    def wait(self, timeout=None):
+        """等待工作結束 (最多 timeout 秒)，回傳是否已結束。"""
+        return self._finished.wait(timeout)
+
+    def cancel(self):
+        """要求取消；執行中的工作於下一次 update() 時停止，排隊中的工作不會開始。"""
+        self._cancel.set()
+
+    def update(self, progress=None, message=None, partial=None):
+        """回報進度 (0~1)、說明與部分結果；已要求取消時丟出 JobCancelled。"""
+        if self._cancel.is_set():
+            raise JobCancelled()
+        if progress is not None:
+            self.progress = min(max(float(progress), 0.0), 1.0)
+        if message is not None:
+            self.message = message
+        if partial is not None:
+            self.partial = partial
+
+
+class JobPool:
+    """執行緒池與工作清單，可由多個 session 共用。"""
+
+    def __init__(self, workers=MAX_WORKERS, keep_finished=KEEP_FINISHED):
+        self.keep_finished = keep_finished
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tracker-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, label, func, *args, params=None, owner=None, cancellable=True, **kwargs):
+        """送出 func(job, *args, **kwargs)，回傳 Job。"""
+        job = Job(label, params, owner, cancellable)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._trim()
+        self._executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self, owner=None):
+        """工作清單 (依送出順序)；指定 owner 時只列出該 session 的工作。"""
+        with self._lock:
+            return [job for job in self._jobs.values() if owner is None or job.owner == owner]
+
+    def _trim(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(len(finished) - self.keep_finished, 0)]:
+            del self._jobs[job_id]
+
+    @staticmethod
+    def _run(job, func, args, kwargs):
+        if job.cancel_requested:
+            job.state = CANCELLED
+            job._finished.set()
+            return
+        job._start = time.perf_counter()
+        job.state = RUNNING
+        try:
+            result = func(job, *args, **kwargs)
+        except JobCancelled:
+            job.state = CANCELLED
+        except Exception as e:
+            job.error = str(e) or type(e).__name__
+            job.state = FAILED
+        else:
+            job.result = result
+            job.progress = 1.0
+            job.state = DONE
+        finally:
+            job._end = time.perf_counter()
+            job._finished.set()
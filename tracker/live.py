@@ -0,0 +1,77 @@
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from . import bulk, ingest, pipeline
+
+# --------------------------
+# 即時模式：定期檢查資料夾，將新放入 (或內容有變動) 的 CSV / Excel 檔匯入本地資料庫
+# 只以檔案大小與修改時間判斷是否需要處理，已處理過的檔案不重新讀取；
+# 資料列經指紋去重後寫入，只有收到新資料的車牌分區會改寫，
+# 查詢時這些車牌只重算軌跡尾端的衍生欄位 (TrackStore.plate_index)
+# --------------------------
+# 檔案最後修改後需經過的秒數，避免讀到尚未寫完的檔案
+SETTLE_SEC = 0.5
+# 保留的批次紀錄數
+MAX_BATCHES = 50
+
+
+class FolderWatcher:
+    """監看單一資料夾 (不含子資料夾)，可由多個 session 共用。"""
+
+    def __init__(self, folder, store, sidecar_dir=None, settle_sec=SETTLE_SEC):
+        self.folder = folder
+        self.store = store
+        self.sidecar_dir = sidecar_dir
+        self.settle_sec = settle_sec
+        self.batches = deque(maxlen=MAX_BATCHES)
+        self.last_poll = None
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def _pending(self):
+        now = time.time()
+        pending = []
+        for path in bulk.expand_paths([self.folder]):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if self._seen.get(path) != signature and now - stat.st_mtime >= self.settle_sec:
+                pending.append((path, signature))
+        return pending
+
+    def poll(self):
+        """匯入資料夾中已寫完的新檔案，回傳本批紀錄 (沒有新檔案時為 None)。
+
+        紀錄欄位：time、files、rows (寫入筆數)、removed (重複略過筆數)、plates (收到新資料的車牌)、
+        seconds (匯入耗時)、errors ([(檔名, 錯誤訊息)])。
+        """
+        with self._lock:
+            self.last_poll = datetime.now()
+            pending = self._pending()
+            if not pending:
+                return None
+            start = time.perf_counter()
+            version = self.store.version
+            batch = {'time': self.last_poll, 'files': [], 'rows': 0, 'removed': 0, 'errors': []}
+            # 逐檔匯入，單一檔案格式錯誤不影響其他檔案
+            for path, signature in pending:
+                name = os.path.basename(path)
+                try:
+                    stats = bulk.ingest_paths([path], self.store, sidecar_dir=self.sidecar_dir)
+                except (ingest.FileReadError, pipeline.MissingColumnsError) as e:
+                    batch['errors'].append((name, str(e)))
+                else:
+                    if not stats['skipped']:
+                        batch['files'].append(name)
+                    batch['rows'] += stats['rows']
+                    batch['removed'] += stats['removed']
+                self._seen[path] = signature
+            batch['plates'] = self.store.changed_plates(version) or set()
+            batch['seconds'] = time.perf_counter() - start
+            self.batches.append(batch)
+            return batch
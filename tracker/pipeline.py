@@ -0,0 +1,175 @@
+import numpy as np
+import pandas as pd
+
+from . import timeparse
+from .profiling import measured
+from .trips import TRIP_RULES, plate_firsts, trip_numbers, trip_starts
+
+# --------------------------
+# 欄位設定
+# --------------------------
+RENAME_MAP = {
+    '車號': '車牌', '路口': '地點', '監視器': '地點',
+    'location': '地點', 'plate': '車牌', 'date': '日期', 'time': '時間'
+}
+REQUIRED_COLS = ['車牌', '地點', '日期', '時間']
+KEY_COLS = ['車牌', '地點', '完整時間']
+# 解析失敗時回報的樣本筆數
+BAD_SAMPLE_ROWS = 5
+WEEK_ORDER = ['週一', '週二', '週三', '週四', '週五', '週六', '週日']
+# 由原始資料衍生、合併資料時需重算的欄位
+DERIVED_COLS = ['日期', 'Hour', '週次', '下筆時間', '下筆地點', '停留秒數', '前站停留', '新行程', '行程ID']
+
+
+class MissingColumnsError(Exception):
+    """檔案缺少必要欄位。"""
+
+
+# --------------------------
+# 標準化 (單檔)
+# --------------------------
+@measured("標準化")
+def normalize_frame(df, name="", formats=None):
+    """欄位標準化並建立 完整時間，只保留 車牌 / 地點 (類別型) 與 完整時間。
+
+    回傳 (資料, 解析報告)；日期或時間無法解析的列、車牌空白的列會被略過並記錄在報告中。
+    formats 為同一檔案先前判斷出的日期 / 時間格式，分塊讀取時沿用。
+    """
+    df.columns = df.columns.str.strip()
+    df.rename(columns=RENAME_MAP, inplace=True)
+    df = df.loc[:, ~df.columns.duplicated()]
+
+    if not set(REQUIRED_COLS).issubset(df.columns):
+        raise MissingColumnsError(f"{name} 缺少欄位: {REQUIRED_COLS}")
+
+    stamps, bad, formats = timeparse.parse_timestamps(df['日期'], df['時間'], formats)
+    report = {
+        'date_format': formats['date'],
+        'time_format': formats['time'],
+        'bad_rows': int(bad.sum()),
+        'bad_samples': df.loc[bad, ['日期', '時間']].head(BAD_SAMPLE_ROWS).astype(str).values.tolist(),
+    }
+    plates = df['車牌'].str.strip().replace('', np.nan)
+    blank = plates.isna().to_numpy() & ~bad
+    report['blank_plates'] = int(blank.sum())
+    frame = pd.DataFrame({
+        '車牌': plates.astype('category'),
+        '地點': df['地點'].str.strip().astype('category'),
+        '完整時間': stamps,
+    })
+    if report['bad_rows'] or report['blank_plates']:
+        frame = frame.loc[~(bad | blank)].reset_index(drop=True)
+    return frame, report
+
+
+def concat_frames(frames):
+    """合併多份資料，類別欄位取類別聯集，避免合併後退化成 object。"""
+    frames = list(frames)
+    for col in frames[0].columns:
+        dtypes = [f[col].dtype for f in frames]
+        if not all(isinstance(t, pd.CategoricalDtype) for t in dtypes):
+            continue
+        if all(t == dtypes[0] for t in dtypes):
+            continue
+        categories = dtypes[0].categories
+        for t in dtypes[1:]:
+            categories = categories.union(t.categories)
+        frames = [f.assign(**{col: f[col].cat.set_categories(categories)}) for f in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+# --------------------------
+# 去重與衍生欄位
+# --------------------------
+def row_hashes(df):
+    """(車牌, 地點, 完整時間) 的 64 位元雜湊，類別欄位依值計算，不受類別清單影響。"""
+    return pd.util.hash_pandas_object(df[KEY_COLS], index=False).to_numpy()
+
+
+@measured("去重")
+def dedupe(df):
+    """依 (車牌, 地點, 完整時間) 去重，回傳 (資料, 移除筆數)。"""
+    original_count = len(df)
+    df = df.drop_duplicates(subset=KEY_COLS, keep='first')
+    return df, original_count - len(df)
+
+
+@measured("行程切分 (衍生欄位)")
+def derive_columns(df, rules=TRIP_RULES):
+    """排序並計算日期、時段、下筆時間、停留、行程與週次欄位。
+
+    行程ID 為車牌內的行程序號 (依 rules 切分)，各車牌互不影響。
+    """
+    df = df.sort_values(by=['車牌', '完整時間'])
+    by_plate = df.groupby('車牌', observed=True)
+
+    df['日期'] = df['完整時間'].dt.normalize()
+    df['Hour'] = df['完整時間'].dt.hour.astype('int8')
+    df['週次'] = pd.Categorical.from_codes(
+        df['完整時間'].dt.weekday.astype('int8'), categories=WEEK_ORDER, ordered=True
+    )
+
+    df['下筆時間'] = by_plate['完整時間'].shift(-1)
+    df['下筆地點'] = by_plate['地點'].shift(-1)
+    df['停留秒數'] = (df['下筆時間'] - df['完整時間']).dt.total_seconds()
+
+    # 行程識別 (Trip Identification)
+    df['前站停留'] = df.groupby('車牌', observed=True)['停留秒數'].shift(1).fillna(0)
+    first = plate_firsts(pd.factorize(df['車牌'])[0])
+    new_trip = trip_starts(first, df['前站停留'].to_numpy(), rules)
+    df['新行程'] = new_trip
+    df['行程ID'] = trip_numbers(new_trip, first)
+    return df
+
+
+def replace_plates(base, rows, plates):
+    """以 rows (已標準化、去重) 取代 base 中 plates 的資料，只重算這些車牌的衍生欄位。"""
+    touched = derive_columns(rows)
+    merged = concat_frames([base.loc[~base['車牌'].isin(plates)], touched])
+    return merged.sort_values(by=['車牌', '完整時間'], kind='stable')
+
+
+def appended_rows(base, raw):
+    """raw (單一車牌、依時間排序的標準欄位資料) 若只是在已衍生的 base 之後追加新列，
+    回傳追加的列，否則 (有插入較早的資料) 回傳 None。"""
+    n = len(base)
+    if n == 0 or len(raw) < n:
+        return None
+    last = base['完整時間'].to_numpy()[-1]
+    # 不晚於 base 最後一筆的列數恰為 n，表示前 n 列就是 base (資料庫只增不減)
+    if np.searchsorted(raw['完整時間'].to_numpy(), last, side='right') != n:
+        return None
+    return raw.iloc[n:]
+
+
+@measured("追加軌跡尾端", rows_in=lambda base, rows: len(rows))
+def extend_tail(base, rows):
+    """單一車牌已衍生的 base 追加較晚的 rows，只重算 base 最後一筆與新列的衍生欄位。"""
+    if rows.empty:
+        return base
+    last = base.iloc[-1:]
+    tail = derive_columns(concat_frames([last.drop(columns=DERIVED_COLS), rows[KEY_COLS]]))
+    # tail 第一列即 base 最後一筆：只有與下一筆相關的欄位會改變，行程欄位沿用原值
+    updated = last.assign(**{col: tail[col].array[:1] for col in ('下筆時間', '下筆地點', '停留秒數')})
+    tail = tail.iloc[1:]
+    tail = tail.assign(行程ID=(tail['行程ID'] + (last['行程ID'].iat[0] - 1)).astype(np.int32))
+    return concat_frames([base.iloc[:-1], updated, tail])
+
+
+@measured("併入新資料", rows_in=lambda base, new_rows: len(new_rows))
+def merge_new_rows(base, new_rows):
+    """將新資料併入已衍生完成的資料集，只重算受影響車牌。"""
+    plates = new_rows['車牌'].unique()
+    affected = base['車牌'].isin(plates)
+
+    # 舊資料在前，維持「先上傳者優先」的去重規則
+    touched = concat_frames([base.loc[affected].drop(columns=DERIVED_COLS), new_rows])
+    touched, removed = dedupe(touched)
+    return replace_plates(base, touched, plates), removed
+
+
+@measured("建立資料集", rows_in=lambda frames: None)
+def build_dataset(frames):
+    """由多個已標準化的檔案資料建立完整資料集，回傳 (資料, 移除筆數)。"""
+    df, removed = dedupe(concat_frames(frames))
+    return derive_columns(df), removed
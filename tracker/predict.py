@@ -0,0 +1,218 @@
+import numpy as np
+import pandas as pd
+
+from .contacts import _expand_ranges
+from .index import _run_bounds
+from .profiling import measured
+
+# --------------------------
+# AI 預測：轉移模型
+# 整份資料向量化建立一次，以 (車牌, 地點, 星期, 時段) 為鍵統計下一站與最終目的地；
+# 預測時只查表加總，不再逐行程掃描。新增資料時只重建有新資料的車牌
+# 看板 (predict_many) 一次查詢多個 (車牌, 地點)，以列範圍展開後整批篩選、加總與排名
+# --------------------------
+NEXT_STOP = 'next'
+FINAL_DEST = 'final'
+# 造訪次數需大於此值才採用該層級 (精準 → 時段 → 全歷史)
+MIN_TIER_VISITS = 2
+TIER_EXACT = 'exact'
+TIER_HOUR = 'hour'
+TIER_ALL = 'all'
+TIER_LABELS = {TIER_EXACT: '星期+時段', TIER_HOUR: '時段', TIER_ALL: '全歷史'}
+
+
+def _ranges(df):
+    """已依 (車牌, 地點) 排序的資料 → {(車牌, 地點): (start, end)}。"""
+    # 先 factorize 成整數代號比對區段，名稱整批經 object 陣列取出，不逐筆取字串純量
+    plate_codes, plate_names = pd.factorize(df['車牌'])
+    loc_codes, loc_names = pd.factorize(df['地點'])
+    starts, ends = _run_bounds(plate_codes, loc_codes)
+    plates = np.asarray(plate_names.astype(object))[plate_codes[starts]]
+    locs = np.asarray(loc_names.astype(object))[loc_codes[starts]]
+    return dict(zip(zip(plates, locs), zip(starts.tolist(), ends.tolist())))
+
+
+def _tables(df, last, rows):
+    """列位置 rows 的 (樣本表, 轉移表, 造訪表)，各表依 (車牌, 地點) 排序。
+
+    last 為每一列所屬行程最後一筆的列位置 (與 df 對齊)。
+    """
+    plate = df['車牌'].astype(object).to_numpy()
+    loc = df['地點'].astype(object).to_numpy()
+    weekday = df['週次'].cat.codes.to_numpy()
+    hour = df['Hour'].to_numpy()
+    stamps = df['完整時間'].to_numpy()
+
+    # 行程最後一筆沒有下一站，也不計最終目的地
+    has_next = rows < last[rows]
+    src_next = rows[has_next]
+    src_final = rows[has_next & (loc[last[rows]] != loc[rows])]
+    dst_final = last[src_final]
+    src = np.r_[src_next, src_final]
+    dst = np.r_[src_next + 1, dst_final]
+
+    samples = pd.DataFrame({
+        '車牌': plate[src], '地點': loc[src], '星期': weekday[src], '時段': hour[src],
+        '種類': np.r_[np.full(len(src_next), NEXT_STOP), np.full(len(src_final), FINAL_DEST)],
+        '目標地點': loc[dst],
+        '秒數': (stamps[dst] - stamps[src]) / np.timedelta64(1, 's'),
+        '抵達': stamps[dst],
+    })
+    samples = samples.sort_values(by=['車牌', '地點'], kind='stable', ignore_index=True)
+
+    keys = ['車牌', '地點', '星期', '時段', '種類', '目標地點']
+    counts = samples.groupby(keys, sort=True).agg(樣本數=('秒數', 'size'), 總秒數=('秒數', 'sum'))
+    counts = counts.reset_index()
+
+    visits = pd.DataFrame({'車牌': plate[rows], '地點': loc[rows], '星期': weekday[rows], '時段': hour[rows]})
+    visits = visits.groupby(['車牌', '地點', '星期', '時段'], sort=True).size()
+    visits = visits.rename('造訪數').reset_index()
+    return samples, counts, visits
+
+
+def _merge_plates(kept, fresh):
+    # 兩邊各自已依車牌排序、且車牌不重疊，依車牌穩定排序即為合併結果
+    merged = pd.concat([kept, fresh], ignore_index=True)
+    order = np.argsort(pd.factorize(merged['車牌'], sort=True)[0], kind='stable')
+    return merged.iloc[order].reset_index(drop=True)
+
+
+class TransitionModel:
+    """由已衍生欄位的資料 (依 車牌, 完整時間 排序) 與其行程摘要建立的轉移模型。
+
+    - 造訪表：(車牌, 地點, 星期, 時段) → 造訪次數，用於選擇預測層級
+    - 轉移表：(車牌, 地點, 星期, 時段, 種類, 目標地點) → 樣本數、總秒數
+    - 樣本表：每筆轉移的抵達時間，供展開明細
+    - 建立時可傳入前一版資料集的模型 base，只重建 changed 內的車牌 (plate_ranges 為車牌 → 列範圍)
+    """
+
+    @measured("轉移模型", rows_in=lambda self, df, *args, **kwargs: len(df), rows_out=None)
+    def __init__(self, df, trips, plate_ranges=None, base=None, changed=()):
+        last = trips.row_ends()
+        if base is None:
+            samples, counts, visits = _tables(df, last, np.arange(len(df)))
+        else:
+            changed = set(changed)
+            rows = [np.arange(s, e) for plate, (s, e) in plate_ranges.items() if plate in changed]
+            rows = np.concatenate(rows) if rows else np.array([], dtype=np.int64)
+            fresh = _tables(df, last, rows)
+            samples, counts, visits = (
+                _merge_plates(old[~old['車牌'].isin(changed)], new)
+                for old, new in zip((base._samples, base._counts, base._visits), fresh))
+
+        self._samples, self._sample_ranges = samples, _ranges(samples)
+        self._counts, self._count_ranges = counts, _ranges(counts)
+        self._visits, self._visit_ranges = visits, _ranges(visits)
+
+    @staticmethod
+    def _slice(frame, ranges, plate, location):
+        s, e = ranges.get((plate, location), (0, 0))
+        return frame.iloc[s:e]
+
+    @staticmethod
+    def _tier_mask(frame, tier, weekday, hour, span):
+        if tier == TIER_ALL:
+            return np.ones(len(frame), dtype=bool)
+        mask = frame['時段'].between(hour - span, hour + span)
+        if tier == TIER_EXACT:
+            mask &= frame['星期'] == weekday
+        return mask.to_numpy()
+
+    @measured("預測查詢", rows_in=lambda *args, **kwargs: None, rows_out=lambda result: len(result[2]))
+    def predict(self, plate, location, weekday, hour, span=3):
+        """查詢預測結果，回傳 (層級, {種類: 統計表}, 樣本表)。
+
+        層級依序為 星期+時段 → 時段 → 全歷史，取第一個造訪次數大於 MIN_TIER_VISITS 者。
+        統計表欄位：目標地點、樣本數、平均秒數、機率 (%)，依機率高、車程短排序。
+        """
+        visits = self._slice(self._visits, self._visit_ranges, plate, location)
+        tier = TIER_ALL
+        for candidate in (TIER_EXACT, TIER_HOUR):
+            mask = self._tier_mask(visits, candidate, weekday, hour, span)
+            if visits['造訪數'].to_numpy()[mask].sum() > MIN_TIER_VISITS:
+                tier = candidate
+                break
+
+        counts = self._slice(self._counts, self._count_ranges, plate, location)
+        counts = counts[self._tier_mask(counts, tier, weekday, hour, span)]
+        stats = {}
+        for kind in (NEXT_STOP, FINAL_DEST):
+            part = counts[counts['種類'] == kind].groupby('目標地點', sort=True)[['樣本數', '總秒數']].sum()
+            part['平均秒數'] = part.pop('總秒數') / part['樣本數']
+            part['機率'] = (part['樣本數'] / part['樣本數'].sum() * 100).round(1)
+            stats[kind] = part.reset_index().sort_values(
+                by=['機率', '平均秒數'], ascending=[False, True]).reset_index(drop=True)
+
+        samples = self._slice(self._samples, self._sample_ranges, plate, location)
+        samples = samples[self._tier_mask(samples, tier, weekday, hour, span)]
+        return tier, stats, samples
+
+    def _gather(self, ranges, plates, locations):
+        # 各查詢 (車牌, 地點) 的列範圍展開為 (查詢序號, 列位置)
+        bounds = np.array([ranges.get(key, (0, 0)) for key in zip(plates, locations)], dtype=np.int64)
+        return _expand_ranges(*bounds.reshape(-1, 2).T)
+
+    @measured("看板預測", rows_in=lambda self, queries, *args, **kwargs: len(queries))
+    def predict_many(self, queries, k=3, span=3, kinds=(NEXT_STOP, FINAL_DEST)):
+        """一次查詢多筆 (車牌, 地點, 星期, 時段)，各查詢每種預測取前 k 名。
+
+        層級與統計方式同 predict；回傳欄位：查詢 (queries 的列序號)、層級、種類、名次、
+        目標地點、樣本數、平均秒數、機率 (%)，依查詢、種類、名次排列。
+        """
+        plates = queries['車牌'].to_numpy()
+        locations = queries['地點'].to_numpy()
+        weekday = queries['星期'].to_numpy()
+        hour = queries['時段'].to_numpy()
+
+        def tier_masks(frame, qi, rows):
+            row_hour = frame['時段'].to_numpy()[rows]
+            in_hour = (row_hour >= hour[qi] - span) & (row_hour <= hour[qi] + span)
+            return in_hour & (frame['星期'].to_numpy()[rows] == weekday[qi]), in_hour
+
+        # 各查詢的層級：星期+時段 → 時段 → 全歷史，取第一個造訪次數大於 MIN_TIER_VISITS 者
+        qi, rows = self._gather(self._visit_ranges, plates, locations)
+        exact, in_hour = tier_masks(self._visits, qi, rows)
+        visits = self._visits['造訪數'].to_numpy()[rows]
+        exact_visits = np.bincount(qi, weights=visits * exact, minlength=len(queries))
+        hour_visits = np.bincount(qi, weights=visits * in_hour, minlength=len(queries))
+        tier = np.where(exact_visits > MIN_TIER_VISITS, TIER_EXACT,
+                        np.where(hour_visits > MIN_TIER_VISITS, TIER_HOUR, TIER_ALL))
+
+        qi, rows = self._gather(self._count_ranges, plates, locations)
+        exact, in_hour = tier_masks(self._counts, qi, rows)
+        kind = self._counts['種類'].to_numpy()[rows]
+        keep = np.select([tier[qi] == TIER_EXACT, tier[qi] == TIER_HOUR], [exact, in_hour], True)
+        keep &= np.isin(kind, kinds)
+        qi, rows = qi[keep], rows[keep]
+
+        keys = ['查詢', '種類', '目標地點']
+        part = pd.DataFrame({
+            '查詢': qi,
+            '種類': kind[keep],
+            '目標地點': self._counts['目標地點'].to_numpy()[rows],
+            '樣本數': self._counts['樣本數'].to_numpy()[rows],
+            '總秒數': self._counts['總秒數'].to_numpy()[rows],
+        })
+        stats = part.groupby(keys, sort=True)[['樣本數', '總秒數']].sum().reset_index()
+        stats['平均秒數'] = stats.pop('總秒數') / stats['樣本數']
+        total = stats.groupby(keys[:2], sort=False)['樣本數'].transform('sum')
+        stats['機率'] = (stats['樣本數'] / total * 100).round(1)
+        stats = stats.sort_values(by=keys[:2] + ['機率', '平均秒數'], ascending=[True, True, False, True],
+                                  kind='stable', ignore_index=True)
+        stats.insert(2, '名次', stats.groupby(keys[:2], sort=False).cumcount() + 1)
+        stats = stats[stats['名次'] <= k].reset_index(drop=True)
+        stats.insert(1, '層級', tier[stats['查詢'].to_numpy()])
+        return stats
+
+    def table(self):
+        """全歷史層級的轉移統計，每個 (車牌, 地點, 種類, 目標地點) 一列。
+
+        欄位：樣本數、平均秒數、機率 (%)；同一 (車牌, 地點, 種類) 內依機率高、車程短排序。
+        """
+        keys = ['車牌', '地點', '種類', '目標地點']
+        table = self._counts.groupby(keys, sort=True)[['樣本數', '總秒數']].sum().reset_index()
+        table['平均秒數'] = table.pop('總秒數') / table['樣本數']
+        total = table.groupby(keys[:3], sort=False)['樣本數'].transform('sum')
+        table['機率'] = (table['樣本數'] / total * 100).round(1)
+        return table.sort_values(by=keys[:3] + ['機率', '平均秒數'],
+                                 ascending=[True, True, True, False, True], ignore_index=True)
@@ -0,0 +1,189 @@
+import contextvars
+import functools
+import json
+import os
+import sys
+import time
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# --------------------------
+# 各處理階段的量測 (耗時、輸入 / 輸出筆數、峰值記憶體)
+# 以 contextvar 記錄目前啟用的 StageLog；未啟用時量測點只多一次查詢，不影響效能
+# 設定環境變數 TRACKER_PROFILE=0 可完全關閉 (正式環境)
+# --------------------------
+ENABLED = os.environ.get("TRACKER_PROFILE", "1") != "0"
+# 每個 session 保留的紀錄筆數上限
+MAX_RECORDS = 2000
+RECORD_COLS = ['執行次', '階段', '層級', '秒數', '輸入筆數', '輸出筆數', '峰值記憶體 (MB)', '說明']
+
+_active = contextvars.ContextVar('stage_log', default=None)
+
+
+def _reset_peak():
+    """重設行程的常駐記憶體高水位 (Linux 的 VmHWM)，回傳是否成功。"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_mb():
+    # Linux 讀 /proc/self/status 的 VmHWM (可重設)；ru_maxrss 為整個行程的累計高水位，不受 clear_refs 影響
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 單位為 bytes，Linux 為 KB
+    return round(peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+def _max(*values):
+    values = [v for v in values if v is not None]
+    return max(values) if values else None
+
+
+def _rows(value):
+    if isinstance(value, tuple):
+        value = value[0] if value else None
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+class StageLog:
+    """一個 session 的階段量測紀錄，每次重新執行頁面以 next_run() 遞增執行次。
+
+    峰值記憶體為行程的常駐記憶體高水位 (同一行程內的其他 session 也會計入)；
+    無法重設高水位的平台只在本階段推高了累計高水位時記錄，否則為空值。
+    """
+
+    def __init__(self, max_records=MAX_RECORDS):
+        self.records = deque(maxlen=max_records)
+        self.run = 0
+        self._depth = 0
+        self._peaks = []
+
+    def next_run(self):
+        self.run += 1
+
+    @contextmanager
+    def stage(self, name, rows_in=None, detail=""):
+        """量測 with 區塊；可於區塊內設定回傳紀錄的「輸出筆數」。"""
+        record = {'執行次': self.run, '階段': name, '層級': self._depth, '秒數': None,
+                  '輸入筆數': rows_in, '輸出筆數': None, '峰值記憶體 (MB)': None, '說明': detail}
+        # 開始時即加入，紀錄依開始順序排列 (外層在子階段之前)
+        self.records.append(record)
+        self._depth += 1
+        self._peaks.append(None)
+        baseline = None if _reset_peak() else _peak_mb()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['秒數'] = round(time.perf_counter() - start, 4)
+            peak = _peak_mb()
+            # 累計高水位未被本階段推高時，無法得知本階段的峰值
+            if baseline is not None and peak is not None and peak <= baseline:
+                peak = None
+            # 子階段會重設高水位，因此取自身與子階段峰值的較大者，並回報給外層
+            record['峰值記憶體 (MB)'] = _max(self._peaks.pop(), peak)
+            if self._peaks:
+                self._peaks[-1] = _max(self._peaks[-1], record['峰值記憶體 (MB)'])
+            self._depth -= 1
+
+    def extend(self, records, detail=""):
+        """併入其他行程 (平行讀檔) 量測的紀錄，層級接在目前階段之下。"""
+        for record in records or []:
+            self.records.append(dict(record, **{
+                '執行次': self.run, '層級': record['層級'] + self._depth, '說明': record['說明'] or detail,
+            }))
+
+    def latest(self):
+        """最近一次執行的紀錄 (依開始順序)。"""
+        return [r for r in self.records if r['執行次'] == self.run]
+
+    def to_json(self):
+        return json.dumps(list(self.records), ensure_ascii=False, indent=2)
+
+
+def use(log):
+    """在目前的執行緒 (context) 啟用 log，None 表示不量測；用於整個頁面腳本。"""
+    _active.set(log if ENABLED else None)
+
+
+@contextmanager
+def activate(log):
+    """在 with 區塊內啟用 log (None 表示不量測)。"""
+    token = _active.set(log)
+    try:
+        yield log
+    finally:
+        _active.reset(token)
+
+
+@contextmanager
+def collect():
+    """在新的 StageLog 中量測 with 區塊 (供子行程使用)，產生其紀錄清單；未啟用量測時為空清單。"""
+    if not ENABLED:
+        yield []
+        return
+    log = StageLog()
+    records = []
+    with activate(log):
+        yield records
+    records.extend(log.records)
+
+
+def extend(records, detail=""):
+    """將其他行程量測的紀錄併入目前啟用的 StageLog。"""
+    log = _active.get()
+    if log is not None:
+        log.extend(records, detail)
+
+
+@contextmanager
+def stage(name, rows_in=None, detail=""):
+    """在目前啟用的 StageLog 中量測 with 區塊；未啟用時產生一個不會保存的紀錄。"""
+    log = _active.get()
+    if log is None:
+        yield {}
+        return
+    with log.stage(name, rows_in, detail) as record:
+        yield record
+
+
+def measured(name, rows_in=None, rows_out=_rows):
+    """量測函式呼叫的裝飾器。
+
+    rows_in 由呼叫參數算出輸入筆數 (預設取第一個參數的長度)，rows_out 由回傳值算出輸出筆數
+    (回傳 tuple 時取第一項；None 表示不記錄)。
+    """
+    def wrap(func):
+        @functools.wraps(func)
+        def inner(*args, **kwargs):
+            log = _active.get()
+            if log is None:
+                return func(*args, **kwargs)
+            count = rows_in(*args, **kwargs) if rows_in is not None else (_rows(args[0]) if args else None)
+            with log.stage(name, count) as record:
+                result = func(*args, **kwargs)
+                if rows_out is not None:
+                    record['輸出筆數'] = rows_out(result)
+            return result
+        return inner
+    return wrap
@@ -0,0 +1,462 @@
+import contextlib
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+from . import pipeline, profiling
+from .cache import LRUFrameCache
+from .fingerprints import FingerprintSet, save_array
+from .index import PlateIndex
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# 寫入資料庫的標準欄位 (欄位標準化 / 去重後的結果)，日期等欄位讀取時再衍生
+STORE_COLS = ['車牌', '地點', '完整時間']
+SCHEMA = pa.schema([
+    ('車牌', pa.dictionary(pa.int32(), pa.string())),
+    ('地點', pa.dictionary(pa.int32(), pa.string())),
+    ('完整時間', pa.timestamp('ns')),
+])
+MANIFEST_NAME = 'manifest.json'
+# 已寫入資料列的指紋 (跨 session 保留，新資料據此去重)；每次寫入新增的指紋另存為一個分片，
+# 分片超過 MAX_FINGERPRINT_SHARDS 個時整併回主檔
+FINGERPRINT_NAME = 'fingerprints.npy'
+MAX_FINGERPRINT_SHARDS = 32
+# 既有車牌的新資料寫成增量檔，累積超過 MAX_DELTAS 個時於下次寫入該車牌時整併回主分區
+MAX_DELTAS = 8
+# 跨行程的寫入鎖 (app 與命令列匯入可能同時寫入同一個資料庫)
+LOCK_NAME = 'store.lock'
+
+
+def _dictionary(values):
+    # 只保留本車牌實際出現的類別，避免每個分區都帶著全車隊的字典
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype('category')
+    used, codes = np.unique(values.cat.codes.to_numpy(), return_inverse=True)
+    return pa.DictionaryArray.from_arrays(
+        pa.array(codes, type=pa.int32()),
+        pa.array(values.cat.categories[used].astype(str).to_numpy(dtype=object), type=pa.string()),
+    )
+
+
+@contextlib.contextmanager
+def _file_lock(path):
+    # 獨占鎖，隨檔案關閉 (或行程結束) 釋放
+    with open(path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            # LK_LOCK 最多重試 10 秒，逾時丟出 OSError 時繼續等待
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        yield
+
+
+class TrackStore:
+    """本地欄式資料庫。
+
+    每個車牌一個 Arrow IPC 檔 (主分區)，檔內依日期切成 record batch (一天一個)，
+    manifest 記錄各車牌的檔名與日期清單。讀取時以 memory map 開檔，
+    只取出所需日期的 batch。寫入時先與已知資料列的指紋比對，
+    只有帶來新資料的車牌才會寫入；既有車牌的新資料另存為增量檔 (即時模式每批只寫新資料)，
+    讀取時與主分區合併，累積過多時才整併改寫主分區。
+
+    manifest 不就地修改：寫入時建立新的 manifest，完成後在鎖內整份換上，
+    讀取端 (其他 session、即時模式、背景工作) 只取用當下那一份，不需加鎖；
+    分區檔另在 schema metadata 記錄日期清單，檔案已改寫、manifest 尚未換上時仍以檔案為準。
+
+    其他行程也可能寫入同一個資料庫：寫入時持有跨行程的檔案鎖，並在鎖內重新讀取 manifest 與指紋
+    再合併；讀取端發現 manifest.json 已被換掉 (檔案的 inode / 修改時間 / 大小改變) 時重新載入。
+    """
+
+    def __init__(self, root, cache_bytes=256 * 1024 * 1024):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.RLock()
+        self._signature = self._manifest_signature()
+        self._manifest = self._load_manifest()
+        # 已衍生欄位的資料快取：單車以該車牌的寫入版本 (rev) 為鍵、全車隊以 version 為鍵，
+        # 資料更新後自動失效
+        self._plate_cache = LRUFrameCache(cache_bytes)
+        # 本行程內各版本寫入的車牌，全車隊索引據此只重算有變動的車牌
+        self._written = {}
+        self._fingerprints = None
+        self._write_locked = False
+
+    # --------------------------
+    # manifest
+    # --------------------------
+    def _manifest_path(self):
+        return os.path.join(self.root, MANIFEST_NAME)
+
+    def _load_manifest(self):
+        path = self._manifest_path()
+        if not os.path.exists(path):
+            return {'version': 0, 'sources': [], 'plates': {}}
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_manifest(self, manifest):
+        path = self._manifest_path()
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def _manifest_signature(self):
+        try:
+            stat = os.stat(self._manifest_path())
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _reload(self, force=False):
+        """manifest.json 已被其他行程換掉 (force 時一律重讀) 則重新載入，回傳目前的 manifest。
+
+        版本不同時已載入的指紋也一併作廢，下次取用時由檔案重新讀取。
+        """
+        if force or self._manifest_signature() != self._signature:
+            with self._lock:
+                # 先取簽章再讀檔：兩者之間檔案又被換掉時，下次呼叫會再重讀一次
+                signature = self._manifest_signature()
+                if force or signature != self._signature:
+                    manifest = self._load_manifest()
+                    if manifest['version'] != self._manifest['version']:
+                        self._manifest = manifest
+                        self._fingerprints = None
+                    self._signature = signature
+        return self._manifest
+
+    @contextlib.contextmanager
+    def _write_lock(self):
+        """寫入鎖：行程內的 RLock 加上跨行程的檔案鎖 (同一執行緒可重入)。"""
+        with self._lock:
+            if self._write_locked:
+                yield
+                return
+            with _file_lock(os.path.join(self.root, LOCK_NAME)):
+                self._write_locked = True
+                try:
+                    yield
+                finally:
+                    self._write_locked = False
+
+    @property
+    def version(self):
+        return self._reload()['version']
+
+    def is_empty(self):
+        return not self._reload()['plates']
+
+    def has_sources(self, digests):
+        return set(digests).issubset(self._reload()['sources'])
+
+    def source_stats(self, digest):
+        """該來源檔寫入時與既有資料比對的筆數 {'rows', 'new', 'known'} (未記錄則為 None)。"""
+        return self._reload().get('source_stats', {}).get(digest)
+
+    def plates(self, start=None, end=None):
+        return sorted(plate for plate, entry in self._reload()['plates'].items()
+                      if self._select_dates(entry['dates'], start, end))
+
+    def date_bounds(self):
+        dates = [d for entry in self._reload()['plates'].values() for d in entry['dates']]
+        return min(dates), max(dates)
+
+    # --------------------------
+    # 讀寫單一車牌分區
+    # --------------------------
+    def _plate_path(self, plate, delta=None):
+        name = hashlib.sha1(plate.encode('utf-8')).hexdigest()[:20]
+        # 增量檔以寫入時的版本區分
+        return os.path.join(self.root, f"{name}.arrow" if delta is None else f"{name}.{delta}.arrow")
+
+    @staticmethod
+    def _select_dates(dates, start, end):
+        return [i for i, d in enumerate(dates)
+                if (start is None or d >= start) and (end is None or d <= end)]
+
+    @classmethod
+    def _read_file(cls, path, start, end, dates=None):
+        """讀取分區檔中日期範圍內的 batch，回傳 (資料, 檔案的 schema metadata)。"""
+        with pa.memory_map(path) as source:
+            reader = ipc.open_file(source)
+            # 日期清單以開啟的分區檔為準 (舊版資料庫的分區檔沒有記錄時才用 manifest)
+            metadata = reader.schema.metadata or {}
+            if b'dates' in metadata:
+                dates = json.loads(metadata[b'dates'])
+            picked = cls._select_dates(dates, start, end)
+            table = pa.Table.from_batches([reader.get_batch(i) for i in picked], schema=reader.schema)
+            return table.to_pandas(), metadata
+
+    def _read_plate(self, plate, start=None, end=None):
+        entry = self._manifest['plates'].get(plate)
+        if entry is None:
+            return SCHEMA.empty_table().to_pandas()
+        try:
+            return self._read_entry(plate, entry, start, end)
+        except FileNotFoundError:
+            # 增量檔剛被其他寫入整併回主分區並刪除，以新的 manifest 再讀一次
+            entry = self._reload(force=True)['plates'][plate]
+            return self._read_entry(plate, entry, start, end)
+
+    def _read_entry(self, plate, entry, start, end):
+        frame, metadata = self._read_file(self._plate_path(plate), start, end, entry['dates'])
+        # 主分區記錄寫入時的版本，已整併進主分區的增量檔 (版本不大於此) 不再讀取
+        merged = int(metadata.get(b'rev', 0))
+        deltas = [v for v in entry.get('deltas', []) if v > merged]
+        if not deltas:
+            return frame
+        frames = [frame] + [self._read_file(self._plate_path(plate, v), start, end)[0] for v in deltas]
+        # 依寫入先後穩定排序，結果與整併後的主分區相同
+        return pipeline.concat_frames(frames).sort_values(by='完整時間', kind='stable', ignore_index=True)
+
+    def _write_plate(self, plate, frame, version, delta=False):
+        """寫入車牌的主分區 (delta 時為該版本的增量檔)，回傳檔內的日期清單。"""
+        # frame 已依 完整時間 排序，日期因此為遞增
+        path = self._plate_path(plate, version if delta else None)
+        table = pa.table({
+            '車牌': _dictionary(frame['車牌']),
+            '地點': _dictionary(frame['地點']),
+            '完整時間': pa.array(frame['完整時間'], type=pa.timestamp('ns')),
+        }, schema=SCHEMA)
+        day = frame['完整時間'].to_numpy().astype('datetime64[D]')
+        starts = np.flatnonzero(np.r_[True, day[1:] != day[:-1]])
+        ends = np.r_[starts[1:], len(frame)]
+        dates = [str(day[s]) for s in starts]
+        tmp = path + '.tmp'
+        batch = table.combine_chunks().to_batches()[0] if len(frame) else None
+        metadata = {'dates': json.dumps(dates)}
+        if not delta:
+            metadata['rev'] = str(version)
+        schema = SCHEMA.with_metadata(metadata)
+        with ipc.new_file(tmp, schema) as writer:
+            for s, e in zip(starts, ends):
+                writer.write_batch(batch.slice(s, e - s).replace_schema_metadata(schema.metadata))
+        os.replace(tmp, path)
+        return dates
+
+    # --------------------------
+    # 資料列指紋
+    # --------------------------
+    def _fingerprint_path(self):
+        return os.path.join(self.root, FINGERPRINT_NAME)
+
+    def _load_fingerprints(self):
+        """讀取指紋主檔與 manifest 記錄的分片；檔案不存在或筆數與 manifest 不符時為 None。"""
+        manifest = self._manifest
+        path = self._fingerprint_path()
+        shards = [os.path.join(self.root, name) for name in manifest.get('fingerprint_shards', [])]
+        try:
+            fingerprints = FingerprintSet.load(path if os.path.exists(path) else None, shards)
+        except FileNotFoundError:
+            return None
+        return fingerprints if len(fingerprints) == manifest.get('fingerprints') else None
+
+    @property
+    def fingerprints(self):
+        """已寫入資料列的指紋集合；檔案不存在或與 manifest 不符 (舊版資料庫) 時由分區重建。"""
+        self._reload()
+        if self._fingerprints is not None:
+            return self._fingerprints
+        with self._lock:
+            if self._fingerprints is None:
+                fingerprints = self._load_fingerprints()
+                if fingerprints is None:
+                    # 可能是其他行程正在寫入 (指紋檔比手上的 manifest 新)：在寫入鎖內重讀再確認
+                    with self._write_lock():
+                        self._reload(force=True)
+                        fingerprints = self._load_fingerprints()
+                        if fingerprints is None:
+                            fingerprints = self._rebuild_fingerprints()
+                self._fingerprints = fingerprints
+            return self._fingerprints
+
+    def _rebuild_fingerprints(self):
+        manifest = self._manifest
+        with profiling.stage("重建資料指紋", detail=f"{len(manifest['plates'])} 個車牌"):
+            hashes = [pipeline.row_hashes(self._read_plate(plate)) for plate in manifest['plates']]
+            fingerprints = FingerprintSet(np.unique(np.concatenate(hashes)) if hashes else None)
+            fingerprints.save(self._fingerprint_path())
+        self._manifest = dict(manifest, fingerprints=len(fingerprints), fingerprint_shards=[])
+        return fingerprints
+
+    # --------------------------
+    # 對外介面
+    # --------------------------
+    def write(self, df, sources=(), source_stats=None):
+        """將標準化後的資料併入資料庫 (既有資料優先)，回傳已存在而略過的筆數。"""
+        return self.write_plates(df[STORE_COLS].groupby('車牌', sort=False, observed=True),
+                                 sources, source_stats)
+
+    def write_sources(self, files):
+        """逐檔與已知指紋比對後併入資料庫，files 為 [(內容雜湊, 標準化資料)]，先出現的檔案優先。
+
+        回傳並記錄各檔的 {'rows': 筆數, 'new': 新資料筆數, 'known': 已存在 (含重複) 筆數}。
+        """
+        seen = FingerprintSet()
+        stats, parts = {}, []
+        for digest, frame in files:
+            hashes = pipeline.row_hashes(frame)
+            fresh = self.fingerprints.fresh_mask(hashes) & ~seen.contains(hashes)
+            seen.add(hashes[fresh])
+            new = int(fresh.sum())
+            stats[digest] = {'rows': len(frame), 'new': new, 'known': len(frame) - new}
+            parts.append(frame.loc[fresh, STORE_COLS])
+        self.write(pipeline.concat_frames(parts), list(stats), stats)
+        return stats
+
+    @profiling.measured("寫入本地資料庫", rows_in=lambda self, parts, *args: None, rows_out=None)
+    def write_plates(self, parts, sources=(), source_stats=None):
+        """逐車牌併入資料，parts 為 (車牌, 資料) 的可迭代物件 (可為產生器，
+        一次只需一個車牌在記憶體中)。回傳指紋已存在而略過的筆數。
+
+        source_stats 為 {內容雜湊: 比對筆數}，記錄於 manifest 供 source_stats() 查詢。
+        """
+        removed = 0
+        with self._write_lock():
+            # 其他行程可能在本行程載入後寫入過：鎖內以磁碟上的 manifest 與指紋為準
+            self._reload(force=True)
+            fingerprints = self.fingerprints
+            # 在副本上更新，全部寫完後才換上
+            manifest = dict(self._manifest)
+            plates = manifest['plates'] = dict(manifest['plates'])
+            version = manifest['version'] + 1
+            # obsolete：manifest 換上後即可刪除的增量檔與指紋分片
+            written, hashes, obsolete = set(), [], []
+            for plate, part in parts:
+                part_hashes = pipeline.row_hashes(part)
+                fresh = fingerprints.fresh_mask(part_hashes)
+                removed += len(part) - int(fresh.sum())
+                # 沒有新資料的車牌不改寫分區
+                if not fresh.any():
+                    continue
+                part = part.loc[fresh, STORE_COLS].sort_values(by='完整時間', kind='stable')
+                hashes.append(part_hashes[fresh])
+                entry = plates.get(plate)
+                deltas = entry.get('deltas', []) if entry is not None else []
+                if entry is not None and len(deltas) < MAX_DELTAS:
+                    # 既有車牌只把新資料寫成增量檔，不改寫主分區
+                    dates = self._write_plate(plate, part, version, delta=True)
+                    plates[plate] = dict(entry, dates=sorted(set(entry['dates']) | set(dates)), rev=version,
+                                         deltas=deltas + [version])
+                else:
+                    # 新車牌，或增量檔已累積太多：連同既有資料整併寫成主分區
+                    if entry is not None:
+                        part = pipeline.concat_frames([self._read_plate(plate), part])
+                        part = part.sort_values(by='完整時間', kind='stable')
+                        obsolete += [self._plate_path(plate, v) for v in deltas]
+                    dates = self._write_plate(plate, part, version)
+                    plates[plate] = {'file': os.path.basename(self._plate_path(plate)), 'dates': dates,
+                                     'rev': version}
+                written.add(plate)
+            if hashes:
+                new = np.concatenate(hashes)
+                fingerprints.add(new)
+                shards = manifest.get('fingerprint_shards', [])
+                if len(shards) < MAX_FINGERPRINT_SHARDS:
+                    # 只把本次新增的指紋存成一個分片，不改寫整個指紋檔
+                    name = f"fingerprints.{version}.npy"
+                    save_array(os.path.join(self.root, name), np.unique(new))
+                    manifest['fingerprint_shards'] = shards + [name]
+                else:
+                    fingerprints.save(self._fingerprint_path())
+                    manifest['fingerprint_shards'] = []
+                    obsolete += [os.path.join(self.root, name) for name in shards]
+                manifest['fingerprints'] = len(fingerprints)
+            manifest['sources'] = sorted(set(manifest['sources']) | set(sources))
+            manifest['source_stats'] = dict(manifest.get('source_stats', {}), **(source_stats or {}))
+            manifest['version'] = version
+            self._written[version] = written
+            self._save_manifest(manifest)
+            self._manifest, self._signature = manifest, self._manifest_signature()
+            for path in obsolete:
+                # 刪除失敗 (例如 Windows 上其他行程仍開著) 時保留；不在 manifest 中的檔案不會被讀取
+                with contextlib.suppress(OSError):
+                    os.remove(path)
+        return removed
+
+    def changed_plates(self, since):
+        """版本 since 之後寫入的車牌 (本行程內沒有完整的寫入紀錄時為 None)。"""
+        versions = range(since + 1, self.version + 1)
+        if any(v not in self._written for v in versions):
+            return None
+        return set().union(*(self._written[v] for v in versions))
+
+    def _older_cached(self, prefix, version):
+        """快取中鍵值前綴相同、版本早於 version 的最新項目 (版本, 內容)，沒有時為 (None, None)。"""
+        best = max((key[-1] for key in self._plate_cache.keys()
+                    if key[:-1] == prefix and key[-1] < version), default=None)
+        cached = self._plate_cache.get(prefix + (best,)) if best is not None else None
+        return (best, cached) if cached is not None else (None, None)
+
+    def plate_index(self, plate, start=None, end=None):
+        """讀取單一車牌在日期範圍內的分區，計算衍生欄位並建立索引 (結果唯讀、可共用)。
+
+        快取中有該車牌較舊版本的索引、且新資料都接在其最後一筆之後時，只重算軌跡尾端的衍生欄位。
+        """
+        rev = self._reload()['plates'].get(plate, {}).get('rev', 0)
+        prefix = ('plate', plate, start, end)
+        cached = self._plate_cache.get(prefix + (rev,))
+        if cached is None:
+            with profiling.stage("讀取本地資料庫", detail=plate) as record:
+                raw = self._read_plate(plate, start, end)
+                record['輸出筆數'] = len(raw)
+            _, previous = self._older_cached(prefix, rev)
+            tail = pipeline.appended_rows(previous.df, raw) if previous is not None else None
+            frame = pipeline.derive_columns(raw) if tail is None else pipeline.extend_tail(previous.df, tail)
+            cached = PlateIndex(frame)
+            self._plate_cache.put(prefix + (rev,), cached, cached.nbytes)
+        return cached
+
+    def _read_plates(self, plates, start, end):
+        parts = [self._read_plate(plate, start, end) for plate in plates]
+        return pipeline.concat_frames(parts or [SCHEMA.empty_table().to_pandas()])
+
+    def index(self, start=None, end=None):
+        """讀取日期範圍內所有車牌的資料，計算衍生欄位並建立索引 (結果唯讀、可共用)。
+
+        快取中有較舊版本的索引時，只重新讀取、衍生其後寫入的車牌，行程摘要與轉移模型也只重建這些車牌。
+        """
+        key = ('all', start, end, self.version)
+        # 先前取出的索引可能已建立衍生結果，先重新計入用量
+        self._plate_cache.refresh()
+        cached = self._plate_cache.get(key)
+        if cached is None:
+            since, previous = self._older_cached(key[:-1], self.version)
+            changed = self.changed_plates(since) if previous is not None else None
+            if changed is None:
+                with profiling.stage("讀取本地資料庫", detail="全部車牌") as record:
+                    raw = self._read_plates(self.plates(start, end), start, end)
+                    record['輸出筆數'] = len(raw)
+                frame = pipeline.derive_columns(raw)
+            else:
+                picked = sorted(changed & set(self.plates(start, end)))
+                with profiling.stage("讀取本地資料庫", detail=f"{len(picked)} 個有變動的車牌") as record:
+                    raw = self._read_plates(picked, start, end)
+                    record['輸出筆數'] = len(raw)
+                frame = pipeline.replace_plates(previous.df, raw, changed)
+            cached = PlateIndex(frame)
+            if changed is not None:
+                cached.inherit(previous, changed)
+            self._plate_cache.put(key, cached, cached.nbytes)
+        return cached
+
+    def frame(self, start=None, end=None):
+        """日期範圍內所有車牌、已計算衍生欄位的資料。"""
+        return self.index(start, end).df
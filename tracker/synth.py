@@ -0,0 +1,152 @@
+import numpy as np
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# --------------------------
+# 模擬車牌辨識資料 (效能測試用)
+# 每台車有住處、工作地與常去地點，依類型產生每日動線：
+#   - 通勤：早上由住處出發經數站抵達工作地，傍晚沿途返回住處過夜
+#   - 過夜：白天四處移動，晚上回到住處過夜
+#   - 遊走：全天隨機出現在各地點
+# 地點熱門程度呈 Zipf 分布；可依比例插入重複列 (模擬重疊匯出的檔案)
+# --------------------------
+# 輸出檔的欄名 (與常見匯出檔相同，讀入時經 RENAME_MAP 對應)
+OUTPUT_COLS = ['車號', '路口', '日期', '時間']
+KIND_COMMUTER, KIND_OVERNIGHT, KIND_ROAMING = 0, 1, 2
+# 每台車每天平均出現筆數
+DAILY_SIGHTINGS = 8
+# 每台車的常去地點數
+FAVOURITES = 6
+# 相鄰兩站的車程 (分鐘)
+HOP_MINUTES = (3, 15)
+# 各類型 (早段出發, 晚段出發) 的時刻範圍 (時)
+ANCHOR_HOURS = {
+    KIND_COMMUTER: ((6.5, 8.5), (17.0, 19.0)),
+    KIND_OVERNIGHT: ((9.0, 12.0), (19.0, 22.0)),
+    KIND_ROAMING: ((0.0, 12.0), (12.0, 24.0)),
+}
+# Excel 單一工作表的資料列上限 (扣除表頭)
+XLSX_SHEET_ROWS = 1_048_575
+
+
+def _plate_names(n):
+    letters = np.array(list('ABCDEFGHJKLMNPQRSTUVWXYZ'))
+    i = np.arange(n)
+    prefix = (pd.Series(letters[i // 10000 % len(letters)])
+              + letters[i // 240000 % len(letters)] + letters[i // 5760000 % len(letters)])
+    return (prefix + '-' + pd.Series(i % 10000).astype(str).str.zfill(4)).to_numpy(dtype=object)
+
+
+def _segment_offsets(segment, gaps):
+    """各列在所屬區段內的累計車程 (區段第一列為 0)。"""
+    total = np.cumsum(gaps)
+    starts = np.r_[0, np.flatnonzero(segment[1:] != segment[:-1]) + 1]
+    first = np.repeat(total[starts] - gaps[starts], np.diff(np.r_[starts, len(segment)]))
+    return total - gaps - first
+
+
+def generate(rows=10_000, plates=None, locations=200, days=30, start='2024-03-01',
+             commuter_share=0.5, overnight_share=0.3, duplicate_rate=0.01, seed=0):
+    """產生約 rows 筆 (不含重複列) 的模擬資料，欄位 車牌 / 地點 / 完整時間，依 (車牌, 時間) 排序。
+
+    plates 未指定時依 rows 與每日平均筆數推算；duplicate_rate 為額外插入的完全重複列比例。
+    """
+    rng = np.random.default_rng(seed)
+    if plates is None:
+        plates = max(rows // (days * DAILY_SIGHTINGS), 1)
+
+    # 每台車的類型、住處、工作地與常去地點
+    kind = rng.choice(3, size=plates, p=[commuter_share, overnight_share, 1 - commuter_share - overnight_share])
+    weights = 1 / np.arange(1, locations + 1)
+    weights /= weights.sum()
+    favourites = rng.choice(locations, size=(plates, FAVOURITES), p=weights)
+    home, work = favourites[:, 0], favourites[:, 1]
+
+    # 每個 (車牌, 日) 的出現筆數，平均使總數約為 rows
+    pairs = plates * days
+    counts = rng.poisson(max(rows / pairs - 2, 0), size=pairs) + 2
+    counts = np.round(counts * rows / counts.sum()).astype(np.int64).clip(min=2)
+    pair = np.repeat(np.arange(pairs), counts)
+    plate, day = pair // days, pair % days
+    pos = np.arange(len(pair)) - np.repeat(np.cumsum(counts) - counts, counts)
+    size = counts[pair]
+
+    # 前半為早段、後半為晚段，各自由出發時刻起逐站累加車程
+    morning_size = size // 2
+    evening = pos >= morning_size
+    anchors = np.empty((pairs, 2))
+    for k, (early, late) in ANCHOR_HOURS.items():
+        chosen = kind[np.arange(pairs) // days] == k
+        anchors[chosen, 0] = rng.uniform(*early, size=chosen.sum())
+        anchors[chosen, 1] = rng.uniform(*late, size=chosen.sum())
+    gaps = rng.uniform(*HOP_MINUTES, size=len(pair)) * 60
+    offsets = _segment_offsets(pair * 2 + evening, gaps)
+    seconds = anchors[pair, evening.astype(np.int64)] * 3600 + offsets
+    stamps = (np.datetime64(pd.Timestamp(start).date(), 's') + day.astype('timedelta64[D]')
+              + seconds.astype(np.int64).astype('timedelta64[s]'))
+
+    # 沿途為常去地點 (八成) 或任意地點；通勤 / 過夜者的起訖點固定
+    loc = np.where(rng.random(len(pair)) < 0.8,
+                   favourites[plate, rng.integers(0, FAVOURITES, size=len(pair))],
+                   rng.choice(locations, size=len(pair), p=weights))
+    plate_kind = kind[plate]
+    last = pos == size - 1
+    first_morning = pos == 0
+    last_morning = pos == morning_size - 1
+    anchored = plate_kind != KIND_ROAMING
+    loc = np.where(anchored & (first_morning | last), home[plate], loc)
+    loc = np.where((plate_kind == KIND_COMMUTER) & last_morning, work[plate], loc)
+
+    frame = pd.DataFrame({
+        '車牌': pd.Categorical.from_codes(plate, categories=_plate_names(plates)),
+        '地點': pd.Categorical.from_codes(loc, categories=[f"路口{i}" for i in range(locations)]),
+        '完整時間': stamps.astype('datetime64[ns]'),
+    })
+    frame = frame.sort_values(by=['車牌', '完整時間'], kind='stable', ignore_index=True)
+
+    if duplicate_rate > 0:
+        # 重複列緊接在原始列之後 (同一時段的匯出檔重疊)
+        repeats = 1 + (rng.random(len(frame)) < duplicate_rate)
+        frame = frame.iloc[np.repeat(np.arange(len(frame)), repeats)].reset_index(drop=True)
+    return frame
+
+
+# --------------------------
+# 輸出為匯出檔格式
+# --------------------------
+def to_export(frame, date_style='slash'):
+    """轉為匯出檔欄位 (車號 / 路口 / 日期 / 時間，全字串)。
+
+    date_style：'slash' (2024/03/01)、'iso' (2024-03-01) 或 'roc' (民國 113/03/01)。
+    """
+    seconds = pa.array(frame['完整時間'].to_numpy().astype('datetime64[s]'))
+    if date_style == 'roc':
+        year = pc.cast(pc.subtract(pc.year(seconds), 1911), pa.string())
+        dates = pc.binary_join_element_wise(year, pc.strftime(seconds, format='/%m/%d'), '')
+    else:
+        dates = pc.strftime(seconds, format='%Y-%m-%d' if date_style == 'iso' else '%Y/%m/%d')
+    return pd.DataFrame({
+        '車號': frame['車牌'].astype(str),
+        '路口': frame['地點'].astype(str),
+        '日期': dates.to_numpy(zero_copy_only=False),
+        '時間': pc.strftime(seconds, format='%H:%M:%S').to_numpy(zero_copy_only=False),
+    })
+
+
+def write_csv(frame, path, encoding='utf-8', date_style='slash'):
+    """寫出 CSV；encoding 可為 utf-8 / utf-8-sig / big5。"""
+    to_export(frame, date_style).to_csv(path, index=False, encoding=encoding)
+
+
+def write_xlsx(frame, path, date_style='slash'):
+    """寫出 Excel，超過單一工作表上限時分成多個工作表。"""
+    export = to_export(frame, date_style)
+    workbook = openpyxl.Workbook(write_only=True)
+    for n, start in enumerate(range(0, max(len(export), 1), XLSX_SHEET_ROWS), start=1):
+        sheet = workbook.create_sheet(f"資料{n}")
+        sheet.append(OUTPUT_COLS)
+        for row in export.iloc[start:start + XLSX_SHEET_ROWS].itertuples(index=False):
+            sheet.append(row)
+    workbook.save(path)
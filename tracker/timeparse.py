@@ -0,0 +1,170 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .profiling import measured
+
+# --------------------------
+# 日期 / 時間欄位解析
+# 每個檔案只以前幾筆樣本判斷一次格式，之後整欄以固定格式向量化解析；
+# 日期與時間分別轉成 datetime64 / timedelta 後直接相加，不經字串串接；
+# 固定格式以 Arrow strptime 解析，遠快於 pandas 的逐筆推斷
+# --------------------------
+SAMPLE_ROWS = 200
+EXCEL_EPOCH = pd.Timestamp('1899-12-30')
+# strptime 只含時間欄位時的基準日
+STRPTIME_EPOCH = pd.Timestamp('1900-01-01')
+# Excel 序號上限 (9999-12-31)
+EXCEL_MAX_SERIAL = 2958465
+
+DATE_FORMATS = [
+    '%Y-%m-%d', '%Y/%m/%d', '%Y.%m.%d', '%Y%m%d',
+    '%Y-%m-%d %H:%M:%S', '%Y/%m/%d %H:%M:%S', '%Y/%m/%d %H:%M', '%Y-%m-%dT%H:%M:%S',
+    '%m/%d/%Y',
+]
+# 民國日期：112/03/05、112-3-5、民國112年3月5日
+ROC_PATTERN = r'^(?:民國)?\s*(\d{2,3})\s*[/\-.年]\s*(\d{1,2})\s*[/\-.月]\s*(\d{1,2})\s*日?$'
+# 民國日期 (無分隔)：1120305
+ROC_COMPACT_PATTERN = r'^\d{7}$'
+NUMBER_PATTERN = r'^\d+(?:\.\d+)?$'
+HMS_PATTERN = r'^\d{1,2}:\d{2}:\d{2}$'
+HM_PATTERN = r'^\d{1,2}:\d{2}$'
+COMPACT_TIME_PATTERN = r'^\d{5,6}$'
+AMPM_PATTERN = r'^(上午|下午|AM|PM|am|pm)\s*(\d{1,2}:\d{2}(?::\d{2})?)$'
+
+
+def _sample(values):
+    return values.dropna().head(SAMPLE_ROWS)
+
+
+def _best(sample, candidates):
+    """回傳樣本中可解析比例最高的格式 (同分取先列者)；全部失敗則為 'mixed'。"""
+    best, best_ratio = 'mixed', 0.0
+    for kind, check in candidates:
+        ratio = check(sample).mean() if len(sample) else 0.0
+        if ratio > best_ratio:
+            best, best_ratio = kind, ratio
+        if ratio == 1.0:
+            break
+    return best
+
+
+def _matches(pattern):
+    return lambda sample: sample.str.match(pattern)
+
+
+def _parses(fmt):
+    if fmt == 'mixed':
+        return lambda sample: pd.to_datetime(sample, format='mixed', errors='coerce').notna()
+    return lambda sample: _strptime(sample, fmt).notna()
+
+
+def _excel_serial(sample):
+    serial = pd.to_numeric(sample.where(sample.str.match(NUMBER_PATTERN)), errors='coerce')
+    return serial.between(1, EXCEL_MAX_SERIAL) & (sample.str.len() != 8)
+
+
+# --------------------------
+# 格式判斷
+# --------------------------
+def detect_date_format(values):
+    """以樣本判斷日期格式，回傳 strftime 格式字串或 'roc' / 'roc_compact' / 'excel' / 'mixed'。"""
+    candidates = [('roc', _matches(ROC_PATTERN)),
+                  ('roc_compact', _matches(ROC_COMPACT_PATTERN)),
+                  ('excel', _excel_serial)]
+    candidates += [(fmt, _parses(fmt)) for fmt in DATE_FORMATS]
+    return _best(_sample(values), candidates)
+
+
+def detect_time_format(values):
+    """以樣本判斷時間格式，回傳 'hms' / 'hm' / 'ampm' / 'compact' / 'excel' / 'datetime' / 'mixed'。"""
+    candidates = [('hms', _matches(HMS_PATTERN)),
+                  ('hm', _matches(HM_PATTERN)),
+                  ('ampm', _matches(AMPM_PATTERN)),
+                  ('compact', _matches(COMPACT_TIME_PATTERN)),
+                  ('excel', _matches(NUMBER_PATTERN)),
+                  ('datetime', _parses('mixed'))]
+    return _best(_sample(values), candidates)
+
+
+# --------------------------
+# 向量化解析
+# --------------------------
+def _strptime(values, fmt):
+    parsed = pc.strptime(pa.array(values, type=pa.string(), from_pandas=True),
+                         format=fmt, unit='ns', error_is_null=True)
+    return pd.Series(parsed.to_numpy(zero_copy_only=False), index=values.index)
+
+
+def _time_of_day(values, fmt):
+    return _strptime(values, fmt) - STRPTIME_EPOCH
+
+
+def _assemble(year, month, day):
+    parts = pd.DataFrame({'year': year, 'month': month, 'day': day})
+    return pd.to_datetime(parts, errors='coerce')
+
+
+def parse_dates(values, fmt):
+    """將日期欄位轉為當日 00:00 的 datetime64，無法解析者為 NaT。"""
+    if fmt == 'roc':
+        parts = values.str.extract(ROC_PATTERN).apply(pd.to_numeric, errors='coerce')
+        return _assemble(parts[0] + 1911, parts[1], parts[2])
+    if fmt == 'roc_compact':
+        n = pd.to_numeric(values, errors='coerce')
+        return _assemble(n // 10000 + 1911, n // 100 % 100, n % 100)
+    if fmt == 'excel':
+        serial = pd.to_numeric(values, errors='coerce')
+        serial = serial.where(serial.between(1, EXCEL_MAX_SERIAL))
+        return (EXCEL_EPOCH + pd.to_timedelta(np.floor(serial), unit='D'))
+    if fmt == 'mixed':
+        return pd.to_datetime(values, format='mixed', errors='coerce').dt.normalize()
+    return _strptime(values, fmt).dt.normalize()
+
+
+def parse_times(values, kind):
+    """將時間欄位轉為當日經過時間 (timedelta)，無法解析者為 NaT。"""
+    if kind == 'hms':
+        return _time_of_day(values, '%H:%M:%S')
+    if kind == 'hm':
+        return _time_of_day(values, '%H:%M')
+    if kind == 'ampm':
+        parts = values.str.extract(AMPM_PATTERN)
+        clock = parts[1].where(parts[1].str.count(':') == 2, parts[1] + ':00')
+        delta = _time_of_day(clock, '%H:%M:%S')
+        hour = delta.dt.components['hours']
+        is_pm = parts[0].isin(['下午', 'PM', 'pm'])
+        # 上午 12 點為 0 點；下午 1~11 點加 12 小時
+        shift = np.where(is_pm & (hour < 12), 12, np.where(~is_pm & (hour == 12), -12, 0))
+        return delta + pd.to_timedelta(shift, unit='h')
+    if kind == 'compact':
+        n = pd.to_numeric(values, errors='coerce')
+        h, m, s = n // 10000, n // 100 % 100, n % 100
+        valid = (h < 24) & (m < 60) & (s < 60)
+        return pd.to_timedelta((h * 3600 + m * 60 + s).where(valid), unit='s')
+    if kind == 'excel':
+        # 一天的比例；若含整數部分 (日期序號) 只取小數
+        fraction = pd.to_numeric(values, errors='coerce') % 1
+        return pd.to_timedelta((fraction * 86400).round(), unit='s')
+    if kind == 'datetime':
+        stamps = pd.to_datetime(values, format='mixed', errors='coerce')
+        return stamps - stamps.dt.normalize()
+    return pd.to_timedelta(values, errors='coerce')
+
+
+@measured("日期解析")
+def parse_timestamps(dates, times, formats=None):
+    """合併日期與時間欄位，回傳 (完整時間, 無法解析的列遮罩, 判斷出的格式)。
+
+    formats 為先前判斷出的 {'date', 'time'} 格式 (同一檔案的後續分塊沿用)，未提供則以樣本判斷。
+    """
+    dates = dates.astype(str).str.strip().where(dates.notna())
+    times = times.astype(str).str.strip().where(times.notna())
+    if formats is None:
+        date_fmt, time_fmt = detect_date_format(dates), detect_time_format(times)
+    else:
+        date_fmt, time_fmt = formats['date'], formats['time']
+    stamps = parse_dates(dates, date_fmt) + parse_times(times, time_fmt)
+    stamps = stamps.astype('datetime64[ns]')
+    return stamps, stamps.isna().to_numpy(), {'date': date_fmt, 'time': time_fmt}
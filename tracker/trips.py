@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+
+from .profiling import measured
+
+# --------------------------
+# 行程切分：同一車牌相鄰兩筆相隔達停留門檻，或超過間隔門檻時切為新行程
+# 行程序號為車牌內的編號 (由 1 起)，新增資料只影響有變動的車牌，不會重新編號整個車隊
+# 行程摘要表每個行程一列，供 AI 預測、居住地判讀與每日行程查詢，不必再逐列分組
+# --------------------------
+# 預設門檻 (秒)：停留 30 分鐘以上、或間隔超過 4 小時即為新行程
+DWELL_SPLIT_SEC = 1800
+GAP_SPLIT_SEC = 14400
+# 切分門檻 (停留秒數, 間隔秒數)，行程摘要依此快取
+TRIP_RULES = (DWELL_SPLIT_SEC, GAP_SPLIT_SEC)
+TRIP_COLS = ['車牌', '行程序號', '出發時間', '出發地點', '抵達時間', '抵達地點', '站數', '歷時秒數']
+
+
+def plate_firsts(plate_codes):
+    """已依車牌排序的資料中，各車牌第一筆的位置遮罩。"""
+    first = np.ones(len(plate_codes), dtype=bool)
+    first[1:] = plate_codes[1:] != plate_codes[:-1]
+    return first
+
+
+def trip_starts(first, prev_gap, rules=TRIP_RULES):
+    """各列是否為行程起點：車牌第一筆，或與前一筆相隔達停留門檻 / 超過間隔門檻。
+
+    prev_gap 為與同車牌前一筆的相隔秒數 (車牌第一筆為 0)。
+    """
+    dwell_sec, gap_sec = rules
+    return first | (prev_gap >= dwell_sec) | (prev_gap > gap_sec)
+
+
+def trip_numbers(starts, first):
+    """車牌內的行程序號 (由 1 起)。"""
+    total = np.cumsum(starts)
+    # 車牌第一筆時的累計值，往後沿用到下一個車牌
+    base = np.maximum.accumulate(np.where(first, total, 0))
+    return (total - base + 1).astype(np.int32)
+
+
+def _summarize(df, rules):
+    """已衍生欄位的資料 (依 車牌, 完整時間 排序) → 行程摘要，順序與 df 相同。"""
+    first = plate_firsts(pd.factorize(df['車牌'])[0])
+    is_start = trip_starts(first, df['前站停留'].to_numpy(), rules)
+    starts = np.flatnonzero(is_start)
+    ends = np.r_[starts[1:], len(df)] if len(starts) else starts
+    last = ends - 1
+    stamps = df['完整時間'].to_numpy()
+    # .array 保留類別型別
+    locs = df['地點'].array
+    return pd.DataFrame({
+        '車牌': df['車牌'].array[starts],
+        '行程序號': trip_numbers(is_start, first)[starts],
+        '出發時間': stamps[starts],
+        '出發地點': locs[starts],
+        '抵達時間': stamps[last],
+        '抵達地點': locs[last],
+        '站數': ends - starts,
+        '歷時秒數': (stamps[last] - stamps[starts]) / np.timedelta64(1, 's'),
+        # 抵達後到下一個行程出發的秒數 (車牌最後一個行程為缺值)
+        '終點停留秒數': df['停留秒數'].to_numpy()[last],
+    })
+
+
+class TripTable:
+    """依門檻切分的行程摘要 (materialized)。
+
+    - trips：每個行程一列 (TRIP_COLS 加上 終點停留秒數)，順序與資料列相同
+    - 建立時可傳入前一版資料集的摘要 base，只重新切分 changed 內的車牌
+    """
+
+    @measured("行程摘要", rows_in=lambda self, df, *args, **kwargs: len(df), rows_out=None)
+    def __init__(self, df, plate_ranges, rules=TRIP_RULES, base=None, changed=()):
+        self.rules = rules
+        if base is None:
+            trips = _summarize(df, rules)
+        else:
+            changed = set(changed)
+            rows = [np.arange(s, e) for plate, (s, e) in plate_ranges.items() if plate in changed]
+            fresh = _summarize(df.iloc[np.concatenate(rows)] if rows else df.iloc[:0], rules)
+            kept = base.trips[~base.trips['車牌'].isin(changed)]
+            # 沿用的部分改用新資料集的類別清單，合併後依車牌排序即與資料列順序一致
+            kept = kept.astype({'車牌': df['車牌'].dtype,
+                                '出發地點': df['地點'].dtype, '抵達地點': df['地點'].dtype})
+            trips = pd.concat([kept, fresh], ignore_index=True)
+            trips = trips.sort_values(by=['車牌', '行程序號'], kind='stable', ignore_index=True)
+        self.trips = trips
+
+        sizes = trips['站數'].to_numpy()
+        self._ends = np.cumsum(sizes)
+        plate_codes = pd.factorize(trips['車牌'])[0]
+        starts = np.flatnonzero(plate_firsts(plate_codes))
+        ends = np.r_[starts[1:], len(trips)]
+        plates = trips['車牌'].to_numpy()
+        self._plate_ranges = {plates[s]: (s, e) for s, e in zip(starts, ends)}
+
+    def plate_trips(self, plate):
+        """該車牌的所有行程 (依出發時間排列)。"""
+        s, e = self._plate_ranges.get(plate, (0, 0))
+        return self.trips.iloc[s:e]
+
+    def plate_day(self, plate, date):
+        """該車牌在 date 當天出發的行程。"""
+        trips = self.plate_trips(plate)
+        day = pd.Timestamp(date).normalize()
+        departs = trips['出發時間'].to_numpy()
+        s, e = np.searchsorted(departs, [day.to_datetime64(), (day + pd.Timedelta(days=1)).to_datetime64()])
+        return trips.iloc[s:e]
+
+    def end_rows(self):
+        """各行程最後一筆 (抵達) 的列位置。"""
+        return self._ends - 1
+
+    def row_ends(self):
+        """每一列所屬行程最後一筆的列位置 (與資料列對齊)。"""
+        return np.repeat(self._ends - 1, self.trips['站數'].to_numpy())
@@ -0,0 +1,113 @@
+from .trips import TRIP_RULES
+
+# --------------------------
+# 分頁取用資料的統一介面 (本次上傳 / 本地資料庫)
+# 回傳的資料為共用快取的切片，呼叫端不可直接修改
+# trip_rules 為行程切分門檻 (停留秒數, 間隔秒數)，影響行程摘要、居住地判讀與 AI 預測
+# proximity 為鄰近地點索引 (geo.Proximity，None 表示地點名稱須完全相同)，影響熱點、居住地與同夥比對
+# --------------------------
+
+
+class MemoryView:
+    """本次上傳、已衍生欄位的完整資料。"""
+
+    def __init__(self, index, trip_rules=TRIP_RULES, proximity=None):
+        self.index = index
+        self.trip_rules = trip_rules
+        self.proximity = proximity
+
+    @property
+    def df(self):
+        return self.index.df
+
+    def frame(self):
+        return self.index.df
+
+    def plates(self):
+        return self.index.plates()
+
+    def plate(self, plate):
+        return self.index.plate(plate)
+
+    def plate_dates(self, plate):
+        return self.index.plate_dates(plate)
+
+    def plate_date(self, plate, date):
+        return self.index.plate_date(plate, date)
+
+    def plate_location(self, plate, location):
+        return self.index.plate_location(plate, location)
+
+    def cube(self, plate):
+        return self.index.cube()
+
+    def trips(self, plate):
+        return self.index.trips(self.trip_rules)
+
+    def homes(self, plate, min_stay, night_hr):
+        return self.index.homes(min_stay, night_hr, self.proximity)
+
+    def fleet_homes(self, min_stay, night_hr):
+        return self.index.homes(min_stay, night_hr, self.proximity)
+
+    def transitions(self, plate):
+        return self.index.transitions(self.trip_rules)
+
+    def latest(self, plates=None):
+        return self.index.latest(plates)
+
+    def fleet_transitions(self):
+        return self.index.transitions(self.trip_rules)
+
+
+class StoreView:
+    """本地資料庫：每次只讀取所選車牌在日期範圍內的分區。"""
+
+    def __init__(self, store, start=None, end=None, trip_rules=TRIP_RULES, proximity=None):
+        self.store = store
+        self.start = start
+        self.end = end
+        self.trip_rules = trip_rules
+        self.proximity = proximity
+
+    def _index(self, plate):
+        return self.store.plate_index(plate, self.start, self.end)
+
+    def frame(self):
+        return self.store.frame(self.start, self.end)
+
+    def plates(self):
+        return self.store.plates(self.start, self.end)
+
+    def plate(self, plate):
+        return self._index(plate).plate(plate)
+
+    def plate_dates(self, plate):
+        return self._index(plate).plate_dates(plate)
+
+    def plate_date(self, plate, date):
+        return self._index(plate).plate_date(plate, date)
+
+    def plate_location(self, plate, location):
+        return self._index(plate).plate_location(plate, location)
+
+    def cube(self, plate):
+        return self._index(plate).cube()
+
+    def trips(self, plate):
+        return self._index(plate).trips(self.trip_rules)
+
+    def homes(self, plate, min_stay, night_hr):
+        return self._index(plate).homes(min_stay, night_hr, self.proximity)
+
+    def fleet_homes(self, min_stay, night_hr):
+        return self.store.index(self.start, self.end).homes(min_stay, night_hr, self.proximity)
+
+    def transitions(self, plate):
+        return self._index(plate).transitions(self.trip_rules)
+
+    def latest(self, plates=None):
+        return self.store.index(self.start, self.end).latest(plates)
+
+    def fleet_transitions(self):
+        return self.store.index(self.start, self.end).transitions(self.trip_rules)